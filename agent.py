@@ -1,8 +1,8 @@
-from langgraph.prebuilt import create_react_agent
-from langchain_openai import ChatOpenAI
+import webapp_path  # noqa: F401  (clients, languages and the catalog live in webApp/)
 from dotenv import load_dotenv
 from langchain_core.tools import tool
-import os
+from languages import language_prompt
+from clients import per_process, lazy_graph, get_agent_model
 from typing import Literal
 
 # Load environment variables (for API keys)
@@ -42,11 +42,15 @@ def search(query: str):
 # Collect the tools
 tools = [search]
 
-# Initialize the language model
-model = ChatOpenAI(model="gpt-4", temperature=0)
+@per_process
+def get_graph():
+    """Create the ReAct agent on first use."""
+    from langgraph.prebuilt import create_react_agent
+    return create_react_agent(get_agent_model(), tools=tools, prompt=language_prompt(system_prompt))
 
-# Create the ReAct agent
-graph = create_react_agent(model, tools=tools, prompt=system_prompt)
+
+# `graph` (langgraph.json, examples) is compiled on first access
+__getattr__ = lazy_graph(get_graph)
 
 # Function to stream and print responses
 def print_stream(stream):
@@ -61,10 +65,10 @@ def print_stream(stream):
 if __name__ == "__main__":
     print("Example 1: Search Query")
     inputs = {"messages": [("user", "tell me about the population of New York")]}
-    print_stream(graph.stream(inputs, stream_mode="values"))
+    print_stream(get_graph().stream(inputs, stream_mode="values"))
     
     print(f"\n\n{'==='*20}\n\n")
     
     print("Example 2: Landmarks Query")
     inputs = {"messages": [("user", "what are some famous landmarks in New York?")]}
-    print_stream(graph.stream(inputs, stream_mode="values"))
\ No newline at end of file
+    print_stream(get_graph().stream(inputs, stream_mode="values"))
\ No newline at end of file
@@ -0,0 +1,141 @@
+from flask import Flask, request, jsonify, Response, stream_with_context
+from flask_cors import CORS
+import importlib
+import logging
+import os
+import threading
+
+# One process hosting every agent, each under its own assistant id:
+#   POST /assistants/<assistant_id>/query         {"message": ..., "thread_id": ...}
+#   POST /assistants/<assistant_id>/query/stream  Server-Sent Events
+#   GET  /assistants                              registered ids and whether they are compiled
+#   POST /translate                               {"text", "language", "targets"}: an answer in other languages
+# "language" on a query makes the assistant reply in that language only.
+# All graphs share one chat model, one cached search client (and its HTTP pool)
+# and one catalog; each graph is compiled on its first request.
+#   gunicorn --bind 0.0.0.0:8080 agent_server:app
+# PRELOAD_ASSISTANTS=1 compiles every graph at import (pair it with gunicorn --preload).
+
+import webapp_path  # noqa: F401  (clients, caches and the book agent live in webApp/)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+import book_agent
+from clients import per_process
+from book_agent import get_answer_cache
+from query_api import parse_query, answer_query, stream_answer, translate_body
+from streaming import SSE_HEADERS
+from metrics import install_flask, current_trace
+
+# assistant id -> module, attribute holding the graph (or a per_process factory for it), description
+ASSISTANTS = {
+    "books": ("book_agent", "get_graph", "Multilingual book search, availability, prices and recommendations"),
+    "trending": ("agent4", "router", "Trending books by title and genre"),
+    "recommendations": ("bookrecomagent", "get_graph", "Book recommendations"),
+    "availability": ("availability_agent", "router", "Opening times and appointment booking"),
+    "general": ("agent", "get_graph", "General questions"),
+}
+DEFAULT_ASSISTANT = os.getenv("DEFAULT_ASSISTANT", "books")
+
+# Only the book agent's answers go through the semantic answer cache
+ANSWER_CACHED = {"books"}
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def get_assistant_graph(assistant_id):
+    """Import the assistant's module and compile its graph on first use."""
+    graph = _graphs.get(assistant_id)
+    if graph is None:
+        module_name, attribute, _ = ASSISTANTS[assistant_id]
+        with _graphs_lock:
+            graph = _graphs.get(assistant_id)
+            if graph is None:
+                graph = getattr(importlib.import_module(module_name), attribute)
+                if isinstance(graph, per_process):
+                    graph = graph()
+                _graphs[assistant_id] = graph
+                logger.info(f"Loaded assistant {assistant_id} from {module_name}.{attribute}")
+    return graph
+
+
+def preload():
+    """Compile every assistant's graph now instead of on its first request."""
+    for assistant_id in ASSISTANTS:
+        get_assistant_graph(assistant_id)
+    book_agent.preload()
+
+
+app = Flask(__name__)
+CORS(app)
+
+# Request ids, per-request timing spans and GET /metrics
+install_flask(app, endpoints=("/query", "/query/stream",
+                              "/assistants/<assistant_id>/query", "/assistants/<assistant_id>/query/stream"))
+
+if os.getenv("PRELOAD_ASSISTANTS") in ("1", "true", "yes"):
+    preload()
+
+
+def _unknown(assistant_id):
+    return jsonify({'error': f"Unknown assistant '{assistant_id}'", 'assistants': list(ASSISTANTS)}), 404
+
+
+@app.route('/assistants', methods=['GET'])
+def list_assistants():
+    return jsonify({'assistants': [
+        {'assistant_id': assistant_id, 'description': description, 'loaded': assistant_id in _graphs}
+        for assistant_id, (_, _, description) in ASSISTANTS.items()
+    ], 'default': DEFAULT_ASSISTANT})
+
+
+def _answer_cache(assistant_id):
+    # Only the book agent's answers go through the semantic answer cache
+    return get_answer_cache() if assistant_id in ANSWER_CACHED else None
+
+
+@app.route('/query', methods=['POST'])
+@app.route('/assistants/<assistant_id>/query', methods=['POST'])
+def query_assistant(assistant_id=DEFAULT_ASSISTANT):
+    if assistant_id not in ASSISTANTS:
+        return _unknown(assistant_id)
+    try:
+        try:
+            query = parse_query(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(answer_query(get_assistant_graph(assistant_id), query, _answer_cache(assistant_id)))
+
+    except Exception as e:
+        logger.error(f"Error processing request {current_trace().request_id} for {assistant_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/query/stream', methods=['POST'])
+@app.route('/assistants/<assistant_id>/query/stream', methods=['POST'])
+def query_assistant_stream(assistant_id=DEFAULT_ASSISTANT):
+    if assistant_id not in ASSISTANTS:
+        return _unknown(assistant_id)
+    try:
+        query = parse_query(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return Response(
+        stream_with_context(stream_answer(get_assistant_graph(assistant_id), query, _answer_cache(assistant_id))),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
+
+
+@app.route('/translate', methods=['POST'])
+def translate_answer():
+    try:
+        return jsonify(translate_body(request.json))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=int(os.getenv("PORT", "5000")))
@@ -1,8 +1,11 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import logging
+import os
 import sys
 
+import webapp_path  # noqa: F401  (the agent and its helpers live in webApp/)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -13,12 +16,18 @@ CORS(app)
 
 # Import agent with error handling
 try:
-    from book_agent import graph
+    from book_agent import get_graph, get_answer_cache
+    from query_api import parse_query, answer_query, stream_answer, translate_body
+    from streaming import SSE_HEADERS
+    from metrics import install_flask, current_trace
     logger.info("Successfully imported book agent")
 except Exception as e:
     logger.error(f"Failed to import book agent: {str(e)}")
     sys.exit(1)
 
+# Request ids, per-request timing spans and GET /metrics
+install_flask(app)
+
 @app.route('/')
 def home():
     logger.info("Accessing home page")
@@ -27,34 +36,42 @@ def home():
 @app.route('/query', methods=['POST'])
 def query_agent():
     try:
-        logger.info("Received query request")
+        logger.info(f"Received query request (request_id={current_trace().request_id})")
         data = request.json
-        user_message = data.get('message', '')
-        logger.info(f"Processing message: {user_message}")
-
-        # Process with agent
-        inputs = {"messages": [("user", user_message)]}
-        responses = []
-        
-        for response in graph.stream(inputs, stream_mode="values"):
-            message = response["messages"][-1]
-            if isinstance(message, tuple):
-                responses.append({
-                    'role': message[0],
-                    'content': message[1]
-                })
-            else:
-                responses.append({
-                    'role': 'assistant',
-                    'content': message.content
-                })
-        
-        return jsonify({'responses': responses})
+        logger.info(f"Processing message: {data.get('message', '')}")
+        try:
+            query = parse_query(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(answer_query(get_graph(), query, get_answer_cache()))
 
     except Exception as e:
-        logger.error(f"Error processing request: {str(e)}")
+        logger.error(f"Error processing request {current_trace().request_id}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+
+@app.route('/query/stream', methods=['POST'])
+def query_agent_stream():
+    data = request.json or {}
+    logger.info(f"Processing streamed message: {data.get('message', '')}")
+    try:
+        query = parse_query(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return Response(
+        stream_with_context(stream_answer(get_graph(), query, get_answer_cache())),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
+
+
+@app.route('/translate', methods=['POST'])
+def translate_answer():
+    try:
+        return jsonify(translate_body(request.json))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 def main():
     try:
         # Verify environment variables
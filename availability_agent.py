@@ -1,10 +1,11 @@
-from langgraph.prebuilt import create_react_agent
-from langchain_openai import ChatOpenAI
+import webapp_path  # noqa: F401  (clients, languages and the catalog live in webApp/)
 from dotenv import load_dotenv
 from langchain_core.tools import tool
-import os
-from typing import Literal
-from datetime import datetime, timedelta
+from languages import language_prompt
+from clients import per_process, lazy_graph, get_agent_model
+from datetime import timedelta
+from availability_store import AvailabilityStore, format_time, parse_time, resolve_date
+from intent_router import IntentRouter
 
 # Load environment variables (for API keys)
 load_dotenv()
@@ -21,7 +22,7 @@ English: I am fine, thank you
 You help users check availability and find information.
 """
 
-# Mock database of availability slots
+# Weekly opening times used to seed the availability store
 availability_database = {
     "monday": ["09:00", "10:00", "14:00", "15:00", "16:00"],
     "tuesday": ["09:00", "11:00", "13:00", "15:00"],
@@ -30,45 +31,214 @@ availability_database = {
     "friday": ["09:00", "11:00", "14:00", "16:00"]
 }
 
+# Bookable rooms and how many appointments each can hold per slot; one
+# booking per listed opening, as before the store existed
+resources = {
+    "room-a": 1
+}
+
+APPOINTMENT_MINUTES = 60
+
+availability_store = AvailabilityStore.from_weekly_slots(
+    availability_database, resources, slot_minutes=APPOINTMENT_MINUTES, slot_length=APPOINTMENT_MINUTES
+)
+
+
+def _describe_day(day_date):
+    return f"{day_date.strftime('%A')} {day_date.isoformat()}"
+
+
+def _resolve_resources(resource):
+    if resource is None:
+        return list(resources)
+    if resource not in resources:
+        raise ValueError(f"Unknown room '{resource}'. Rooms are: {', '.join(resources)}")
+    return [resource]
+
+
+# Reply templates shared by the tools and the fast-path intent router
+REPLIES = {
+    "no_slots": {
+        "en": "Sorry, there are no available time slots on {label}.",
+        "ny": "Pepani, palibe nthawi yopezeka pa {label}."
+    },
+    "slots": {
+        "en": "Available time slots for {label}: {slots}",
+        "ny": "Nthawi zopezeka pa {label}: {slots}"
+    },
+    "invalid_time": {
+        "en": "Sorry, {time_slot} is not a valid time. Available slots are: {slots}",
+        "ny": "Pepani, {time_slot} si nthawi yovomerezeka. Nthawi zopezeka ndi: {slots}"
+    },
+    "slot_free": {
+        "en": "The time slot {time_slot} is available on {label} ({rooms})!",
+        "ny": "Nthawi ya {time_slot} ilipo pa {label} ({rooms})!"
+    },
+    "slot_taken": {
+        "en": "The time slot {time_slot} is not available on {label}. Available slots are: {slots}",
+        "ny": "Nthawi ya {time_slot} palibe pa {label}. Nthawi zopezeka ndi: {slots}"
+    },
+    "booked": {
+        "en": "Successfully booked appointment for {label} at {time_slot} in {room}!",
+        "ny": "Tasungitsa nthawi yanu pa {label} nthawi ya {time_slot} mu {room}!"
+    },
+    "not_booked": {
+        "en": "Cannot book appointment. Time slot {time_slot} is not available on {label}.",
+        "ny": "Sitinathe kusungitsa. Nthawi ya {time_slot} palibe pa {label}."
+    }
+}
+
+
+def render_reply(key, lang="en", **values):
+    return REPLIES[key][lang].format(**values)
+
+
+def availability_result(day, time_slot=None, resource=None):
+    """Look up availability and return (reply key, template values).
+
+    Raises ValueError for days, times or rooms that can't be understood.
+    """
+    day_date = resolve_date(day)
+    rooms = _resolve_resources(resource)
+    slots = availability_store.slots_for(APPOINTMENT_MINUTES)
+    starts = sorted({
+        start for room in rooms
+        for start in availability_store.free_starts(room, day_date, slots)
+    })
+    values = {
+        "label": _describe_day(day_date),
+        "slots": ", ".join(format_time(start * availability_store.slot_minutes) for start in starts),
+        "time_slot": time_slot
+    }
+
+    if not starts:
+        return "no_slots", values
+    if not time_slot:
+        return "slots", values
+
+    try:
+        start = availability_store.slot_index(time_slot)
+    except ValueError:
+        return "invalid_time", values
+    free_rooms = [room for room in rooms if availability_store.is_free(room, day_date, start, slots)]
+    if free_rooms:
+        return "slot_free", dict(values, rooms=", ".join(free_rooms))
+    return "slot_taken", values
+
+
+def booking_result(day, time_slot, resource=None):
+    """Book the first free room and return (reply key, template values).
+
+    Raises ValueError for days, times or rooms that can't be understood.
+    """
+    day_date = resolve_date(day)
+    rooms = _resolve_resources(resource)
+    start = availability_store.slot_index(time_slot)
+    slots = availability_store.slots_for(APPOINTMENT_MINUTES)
+    values = {"label": _describe_day(day_date), "time_slot": time_slot}
+    for room in rooms:
+        # book() checks and takes the slot atomically, so two users can't both win
+        if availability_store.book(room, day_date, start, slots):
+            return "booked", dict(values, room=room)
+    return "not_booked", values
+
+
 @tool
-def check_availability(day: str, time_slot: str = None) -> str:
+def check_availability(day: str, time_slot: str = None, resource: str = None) -> str:
     """
     Check availability for a specific day and optionally a specific time slot.
     Args:
-        day: The day to check (monday, tuesday, etc.)
+        day: The day to check (monday, tuesday, ..., today, tomorrow or YYYY-MM-DD)
         time_slot: Optional specific time to check (format: HH:MM)
+        resource: Optional room to check (room-a); any room if omitted
     """
-    day = day.lower()
-    
-    if day not in availability_database:
-        return f"Sorry, we only have availability information for weekdays (Monday-Friday)."
-    
-    if time_slot:
-        if time_slot in availability_database[day]:
-            return f"The time slot {time_slot} is available on {day.capitalize()}!"
-        else:
-            return f"The time slot {time_slot} is not available on {day.capitalize()}. Available slots are: {', '.join(availability_database[day])}"
-    
-    return f"Available time slots for {day.capitalize()}: {', '.join(availability_database[day])}"
+    try:
+        key, values = availability_result(day, time_slot, resource)
+    except ValueError as e:
+        return f"Sorry, {e}. Use a weekday name or a date like 2025-03-14."
+    return render_reply(key, **values)
 
 @tool
-def book_appointment(day: str, time_slot: str) -> str:
+def book_appointment(day: str, time_slot: str, resource: str = None) -> str:
     """
     Book an appointment for a specific day and time slot.
     Args:
-        day: The day to book (monday, tuesday, etc.)
+        day: The day to book (monday, tuesday, ..., today, tomorrow or YYYY-MM-DD)
         time_slot: The time to book (format: HH:MM)
+        resource: Optional room to book (room-a); first free room if omitted
     """
-    day = day.lower()
-    
-    if day not in availability_database:
-        return f"Cannot book appointment. We only operate on weekdays (Monday-Friday)."
-    
-    if time_slot in availability_database[day]:
-        availability_database[day].remove(time_slot)
-        return f"Successfully booked appointment for {day.capitalize()} at {time_slot}!"
-    else:
-        return f"Cannot book appointment. Time slot {time_slot} is not available on {day.capitalize()}."
+    try:
+        key, values = booking_result(day, time_slot, resource)
+    except ValueError as e:
+        return f"Cannot book appointment. {e}."
+    return render_reply(key, **values)
+
+# Named parts of the day accepted by find_available_windows
+TIME_OF_DAY = {
+    "morning": ("06:00", "12:00"),
+    "afternoon": ("12:00", "17:00"),
+    "evening": ("17:00", "22:00")
+}
+MAX_SEARCH_DAYS = 366
+
+
+@tool
+def find_available_windows(
+    start_date: str = "today",
+    end_date: str = None,
+    duration_minutes: int = 60,
+    time_of_day: str = None,
+    max_results: int = 5,
+    resource: str = None
+) -> str:
+    """
+    Find the earliest free windows of a given length across a range of dates in one call.
+    Use this instead of checking days one at a time, e.g. "earliest 2-hour opening in the next three weeks".
+    Args:
+        start_date: First day to search (today, tomorrow, a weekday name or YYYY-MM-DD)
+        end_date: Last day to search, inclusive (defaults to two weeks after start_date)
+        duration_minutes: Length of the window needed, in minutes (rounded up to whole hours)
+        time_of_day: Optional preference: morning, afternoon, evening, or a range like 09:00-13:00
+        max_results: How many windows to return
+        resource: Optional room to search (room-a); all rooms if omitted
+    """
+    try:
+        first_day = resolve_date(start_date)
+        # Weekday names in end_date count from the start of the range
+        last_day = resolve_date(end_date, today=first_day) if end_date else first_day + timedelta(days=13)
+        rooms = _resolve_resources(resource)
+        if time_of_day:
+            earliest_time, latest_time = TIME_OF_DAY.get(time_of_day.lower(), time_of_day.partition("-")[::2])
+            earliest, latest = parse_time(earliest_time), parse_time(latest_time)
+        else:
+            earliest, latest = 0, 24 * 60
+        slots = availability_store.slots_for(duration_minutes)
+    except ValueError as e:
+        return f"Sorry, {e}."
+
+    if last_day < first_day:
+        return "Sorry, the end date must not be before the start date."
+    last_day = min(last_day, first_day + timedelta(days=MAX_SEARCH_DAYS - 1))
+
+    slot_minutes = availability_store.slot_minutes
+    # The whole window has to finish by the end of the preferred time of day
+    windows = availability_store.find_windows(
+        first_day, last_day, slots,
+        earliest=-(-earliest // slot_minutes),
+        latest=latest // slot_minutes - slots,
+        resources=rooms,
+        limit=max(1, min(max_results, 50))
+    )
+    if not windows:
+        return (f"Sorry, there is no free {duration_minutes}-minute window between "
+                f"{first_day.isoformat()} and {last_day.isoformat()}.")
+
+    lines = [
+        f"- {_describe_day(day)} {format_time(start * slot_minutes)}-"
+        f"{format_time((start + slots) * slot_minutes)} ({', '.join(free_rooms)})"
+        for day, start, free_rooms in windows
+    ]
+    return f"Earliest free {duration_minutes}-minute windows:\n" + "\n".join(lines)
 
 # Keep your existing search tool
 @tool
@@ -88,13 +258,51 @@ def search(query: str):
     return f"Searched for '{query}'. [Mock search response]"
 
 # Collect all tools
-tools = [search, check_availability, book_appointment]
+tools = [search, check_availability, book_appointment, find_available_windows]
+
+@per_process
+def get_graph():
+    """Create the ReAct agent on first use."""
+    from langgraph.prebuilt import create_react_agent
+    return create_react_agent(get_agent_model(), tools=tools, prompt=language_prompt(system_prompt))
 
-# Initialize the language model
-model = ChatOpenAI(model="gpt-4", temperature=0)
 
-# Create the ReAct agent
-graph = create_react_agent(model, tools=tools, prompt=system_prompt)
+# `graph` (langgraph.json, examples) is compiled on first access
+__getattr__ = lazy_graph(get_graph)
+
+
+def _routed_reply(result):
+    # Ambiguous input (unknown day, bad time) is left for the LLM to sort out
+    try:
+        key, values = result()
+    except ValueError:
+        return None
+    return {lang: render_reply(key, lang, **values) for lang in ("ny", "en")}
+
+
+# Fast path: simple lookups and bookings are answered without calling the LLM
+DAY = r"(monday|tuesday|wednesday|thursday|friday|saturday|sunday|today|tomorrow|\d{4}-\d{2}-\d{2})"
+TIME = r"(\d{1,2}:\d{2}(?: ?[ap]m)?|\d{1,2} ?[ap]m)"
+
+router = IntentRouter(graph_factory=get_graph)
+router.add(
+    "check_availability",
+    [
+        rf"(?:what|which) (?:times|time slots|slots) are (?:available|free|open) (?:on|for) {DAY}",
+        rf"(?:show|list) (?:me )?(?:the )?(?:available|free|open) (?:times|time slots|slots) (?:on|for) {DAY}"
+    ],
+    lambda day: _routed_reply(lambda: availability_result(day))
+)
+router.add(
+    "check_time_slot",
+    [rf"is {TIME} (?:available|free|open) on {DAY}"],
+    lambda time_slot, day: _routed_reply(lambda: availability_result(day, time_slot))
+)
+router.add(
+    "book_appointment",
+    [rf"(?:please )?book (?:an |a )?(?:appointment|slot|meeting) (?:for|on) {DAY} at {TIME}"],
+    lambda day, time_slot: _routed_reply(lambda: booking_result(day, time_slot))
+)
 
 # Function to stream and print responses
 def print_stream(stream):
@@ -109,16 +317,18 @@ def print_stream(stream):
 if __name__ == "__main__":
     print("Example 1: Availability Check")
     inputs = {"messages": [("user", "what times are available on Monday?")]}
-    print_stream(graph.stream(inputs, stream_mode="values"))
+    print_stream(router.stream(inputs, stream_mode="values"))
     
     print(f"\n\n{'==='*20}\n\n")
     
     print("Example 2: Specific Time Slot Check")
     inputs = {"messages": [("user", "is 10:00 available on Tuesday?")]}
-    print_stream(graph.stream(inputs, stream_mode="values"))
+    print_stream(router.stream(inputs, stream_mode="values"))
     
     print(f"\n\n{'==='*20}\n\n")
     
     print("Example 3: Book Appointment")
     inputs = {"messages": [("user", "book an appointment for Monday at 14:00")]}
-    print_stream(graph.stream(inputs, stream_mode="values"))
\ No newline at end of file
+    print_stream(router.stream(inputs, stream_mode="values"))
+
+    print(f"\n\nRouter stats: {router.get_stats()}")
@@ -0,0 +1,212 @@
+import math
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+# Remaining capacity is stored in one byte per slot
+MAX_CAPACITY = 255
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+def parse_time(time_slot):
+    """Parse 'HH:MM' (or 'H', 'HH:MMam/pm') into minutes after midnight."""
+    text = time_slot.strip().lower().replace(" ", "")
+    suffix = None
+    if text.endswith(("am", "pm")):
+        text, suffix = text[:-2], text[-2:]
+    hours, _, minutes = text.partition(":")
+    if not hours.isdigit() or not (minutes or "0").isdigit():
+        raise ValueError(f"'{time_slot}' is not a valid time")
+    hours, minutes = int(hours), int(minutes or 0)
+    if suffix == "pm" and hours < 12:
+        hours += 12
+    if suffix == "am" and hours == 12:
+        hours = 0
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"'{time_slot}' is not a valid time")
+    return hours * 60 + minutes
+
+
+def format_time(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def resolve_date(day, today=None):
+    """Turn 'monday', 'tomorrow' or an ISO date ('2025-03-14') into a date.
+
+    Weekday names resolve to the next occurrence, counting today.
+    """
+    today = today or date.today()
+    text = day.strip().lower()
+    if text == "today":
+        return today
+    if text == "tomorrow":
+        return today + timedelta(days=1)
+    if text in WEEKDAYS:
+        return today + timedelta(days=(WEEKDAYS.index(text) - today.weekday()) % 7)
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"'{day}' is not a day I understand")
+
+
+class AvailabilityStore:
+    """Slot availability keyed by (resource, calendar date).
+
+    Each day is a bytearray with one byte per fixed-size slot holding the
+    remaining capacity (so at most MAX_CAPACITY per resource), and looking
+    up a slot is a single index operation.
+    Days nobody has booked are never stored: they are read straight from the
+    shared weekly template, which keeps thousands of days x resources cheap.
+    """
+
+    def __init__(self, weekly_template, resources, slot_minutes=60, lock_stripes=64):
+        self.slot_minutes = slot_minutes
+        self.slots_per_day = 24 * 60 // slot_minutes
+        self.resources = dict(resources)
+        for resource, capacity in self.resources.items():
+            if not 0 <= capacity <= MAX_CAPACITY:
+                raise ValueError(f"Capacity of '{resource}' must be between 0 and {MAX_CAPACITY}, got {capacity}")
+        # weekday (0 = Monday) -> bytearray of 0/1 open flags
+        self.weekly_template = {
+            weekday: bytearray(mask) for weekday, mask in weekly_template.items()
+        }
+        # (resource capacity, weekday) -> capacity-scaled template row
+        self._template_rows = {}
+        self._days = {}
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+
+    @classmethod
+    def from_weekly_slots(cls, weekly_slots, resources, slot_minutes=60, slot_length=60):
+        """Build a store from {"monday": ["09:00", ...]} style opening times.
+
+        Every listed time opens `slot_length` minutes starting at that time.
+        Keep slot_minutes equal to the appointment length so that only the
+        listed times are bookable starts and a booking takes exactly one
+        listed slot.
+        """
+        slots_per_day = 24 * 60 // slot_minutes
+        template = {}
+        for day_name, times in weekly_slots.items():
+            mask = bytearray(slots_per_day)
+            for time_slot in times:
+                start = parse_time(time_slot) // slot_minutes
+                for index in range(start, min(start + slot_length // slot_minutes, slots_per_day)):
+                    mask[index] = 1
+            template[WEEKDAYS.index(day_name.lower())] = mask
+        return cls(template, resources, slot_minutes=slot_minutes)
+
+    def _lock_for(self, resource, day):
+        return self._locks[hash((resource, day)) % len(self._locks)]
+
+    def _template_row(self, resource, day):
+        capacity = self.resources[resource]
+        key = (capacity, day.weekday())
+        row = self._template_rows.get(key)
+        if row is None:
+            mask = self.weekly_template.get(day.weekday(), bytes(self.slots_per_day))
+            row = bytes(capacity * flag for flag in mask)
+            self._template_rows[key] = row
+        return row
+
+    def day_row(self, resource, day):
+        """Remaining capacity per slot for one resource and date (read-only view)."""
+        row = self._days.get((resource, day))
+        return row if row is not None else self._template_row(resource, day)
+
+    def slot_index(self, time_slot):
+        minutes = parse_time(time_slot) if isinstance(time_slot, str) else time_slot
+        if minutes % self.slot_minutes:
+            raise ValueError(f"Times must be on a {self.slot_minutes}-minute boundary")
+        return minutes // self.slot_minutes
+
+    def slots_for(self, duration_minutes):
+        """Number of slots a booking of `duration_minutes` takes.
+
+        Durations that are not whole slots round up, so a 90-minute meeting
+        takes two 60-minute slots. Raises ValueError unless it is positive.
+        """
+        if duration_minutes <= 0:
+            raise ValueError("the duration must be a positive number of minutes")
+        return math.ceil(duration_minutes / self.slot_minutes)
+
+    def is_free(self, resource, day, start, slots=1):
+        row = self.day_row(resource, day)
+        if start < 0 or start + slots > self.slots_per_day:
+            return False
+        return all(row[start:start + slots])
+
+    def free_starts(self, resource, day, slots=1):
+        """Slot indexes where a booking of `slots` consecutive slots fits."""
+        row = self.day_row(resource, day)
+        starts = []
+        run = 0
+        for index, remaining in enumerate(row):
+            run = run + 1 if remaining else 0
+            if run >= slots:
+                starts.append(index - slots + 1)
+        return starts
+
+    def book(self, resource, day, start, slots=1):
+        """Atomically check and take one unit of capacity. Returns True on success."""
+        with self._lock_for(resource, day):
+            if not self.is_free(resource, day, start, slots):
+                return False
+            key = (resource, day)
+            if key not in self._days:
+                self._days[key] = bytearray(self._template_row(resource, day))
+            row = self._days[key]
+            for index in range(start, start + slots):
+                row[index] -= 1
+            return True
+
+    def cancel(self, resource, day, start, slots=1):
+        """Give back capacity taken by book(). Returns False, changing nothing,
+        unless every slot of the window has a booking to give back."""
+        with self._lock_for(resource, day):
+            row = self._days.get((resource, day))
+            if row is None:
+                return False
+            template = self._template_row(resource, day)
+            window = range(start, start + slots)
+            if not all(row[index] < template[index] for index in window):
+                return False
+            for index in window:
+                row[index] += 1
+            return True
+
+    def find_windows(self, first_day, last_day, slots, earliest=0, latest=None,
+                     resources=None, limit=5):
+        """Earliest windows of `slots` consecutive free slots between two dates.
+
+        All days of a resource are stacked into one (days x slots) matrix and
+        every window is tested at once with a cumulative-sum run search, so a
+        multi-week scan is a handful of NumPy operations instead of a Python
+        loop per slot. Returns (date, start slot, [resources]) tuples ordered
+        by date and time. `earliest`/`latest` bound the window start slot.
+        """
+        latest = self.slots_per_day - slots if latest is None else min(latest, self.slots_per_day - slots)
+        days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+        if not days or latest < earliest:
+            return []
+
+        found = {}
+        for resource in resources or list(self.resources):
+            matrix = np.frombuffer(
+                b"".join(bytes(self.day_row(resource, day)) for day in days), dtype=np.uint8
+            ).reshape(len(days), self.slots_per_day)
+            free = np.zeros((len(days), self.slots_per_day + 1), dtype=np.int32)
+            np.cumsum(matrix > 0, axis=1, out=free[:, 1:])
+            # window_free[d, s] is True when slots s..s+slots-1 are all free on day d
+            window_free = (free[:, slots:] - free[:, :-slots]) == slots
+            # nonzero() is row-major, i.e. already ordered by date then time
+            day_indexes, starts = np.nonzero(window_free[:, earliest:latest + 1])
+            day_indexes, starts = day_indexes[:limit], starts[:limit] + earliest
+            for day_index, start in zip(day_indexes.tolist(), starts.tolist()):
+                found.setdefault((day_index, start), []).append(resource)
+
+        return [
+            (days[day_index], start, found[(day_index, start)])
+            for day_index, start in sorted(found)[:limit]
+        ]
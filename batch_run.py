@@ -0,0 +1,310 @@
+"""Run a JSONL file of queries through any assistant graph, concurrently.
+
+    python batch_run.py queries.jsonl -o results.jsonl --concurrency 16 --rate 5
+    python batch_run.py queries.jsonl -o results.jsonl --assistant trending --async
+    python batch_run.py queries.jsonl -o results.jsonl --retry-errors   # resume, redo failures
+
+Each input line is a JSON object with the query under "message" (or "query",
+"question", "body"), an optional "id" (or "request_id"; the line number
+otherwise) and an optional "assistant" overriding --assistant. Assistant ids
+are the ones agent_server.py serves. A malformed line gets an error result
+and the run goes on; a repeated id runs once.
+
+Results are appended to the output file as each item finishes, one JSON line
+with the answer (or error), latency and token counts. The output file is also
+the checkpoint: ids already in it are skipped, so an interrupted run picks up
+where it stopped. With --retry-errors the failed lines are removed first, so
+each id keeps one line. --rate caps how many items start per second to stay
+within API quotas. The input is read as the run goes, so it can be larger than
+memory.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from agent_server import ASSISTANTS, DEFAULT_ASSISTANT, get_assistant_graph
+from checkpointer import thread_config
+from token_budget import TokenUsageTracker
+
+logger = logging.getLogger("batch_run")
+
+MESSAGE_FIELDS = ("message", "query", "question", "body")
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` acquisitions per second, bursts up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        # Take a token and return how long to wait before using it
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        if self.rate:
+            time.sleep(self._reserve())
+
+    async def aacquire(self):
+        if self.rate:
+            await asyncio.sleep(self._reserve())
+
+
+def read_items(path, default_assistant):
+    """Yield (id, assistant, message, error) for each non-empty input line.
+
+    A line that is not a JSON object becomes an item with an error (and its
+    line number as id), so it gets an error result and the run goes on. Only
+    the first line of each id runs; later lines with the same id are skipped.
+    """
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError(f"line {line_number} is not a JSON object")
+            except ValueError as e:
+                item = (str(line_number), default_assistant, line.strip(), f"{type(e).__name__}: {e}")
+            else:
+                message = next((record[field] for field in MESSAGE_FIELDS if record.get(field)), "")
+                item_id = str(record.get("id") or record.get("request_id") or line_number)
+                item = (item_id, record.get("assistant", default_assistant), message, None)
+            if item[0] in seen:
+                logger.warning(f"Skipping line {line_number}: id {item[0]!r} already appeared in {path}")
+                continue
+            seen.add(item[0])
+            yield item
+
+
+def completed_ids(path):
+    """Ids already in the output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by the interruption; that item runs again
+                continue
+            done.add(result["id"])
+    return done
+
+
+def drop_errors(path):
+    """Rewrite the output file without its failed (and cut-short) lines, so the
+    retried items' new results replace them instead of following them."""
+    if not os.path.exists(path):
+        return 0
+    dropped = 0
+    with open(path, encoding="utf-8") as src, open(path + ".tmp", "w", encoding="utf-8") as dst:
+        for line in src:
+            try:
+                failed = bool(json.loads(line).get("error"))
+            except json.JSONDecodeError:
+                failed = True
+            if failed:
+                dropped += 1
+            else:
+                dst.write(line)
+    os.replace(path + ".tmp", path)
+    return dropped
+
+
+def _prepare(item_id, assistant, message):
+    if assistant not in ASSISTANTS:
+        raise KeyError(f"Unknown assistant '{assistant}'")
+    _, config = thread_config(f"batch-{item_id}-{time.time_ns()}")
+    usage = TokenUsageTracker()
+    config["callbacks"] = [usage]
+    return get_assistant_graph(assistant), {"messages": [("user", message)]}, config, usage
+
+
+def _result(item_id, assistant, message, started, usage=None, state=None, error=None):
+    answer = None
+    if state is not None:
+        last = state["messages"][-1]
+        answer = last[1] if isinstance(last, tuple) else last.content
+    summary = usage.summary() if usage else {}
+    return {
+        "id": item_id,
+        "assistant": assistant,
+        "message": message,
+        "answer": answer,
+        "error": error,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "prompt_tokens": summary.get("prompt_tokens", 0),
+        "completion_tokens": summary.get("completion_tokens", 0),
+        "total_tokens": summary.get("total_tokens", 0),
+        "steps": len(summary.get("steps", [])),
+    }
+
+
+def run_item(item, limiter):
+    item_id, assistant, message, error = item
+    started = time.perf_counter()
+    if error:
+        return _result(item_id, assistant, message, started, error=error)
+    limiter.acquire()
+    started = time.perf_counter()
+    usage = None
+    try:
+        graph, inputs, config, usage = _prepare(item_id, assistant, message)
+        return _result(item_id, assistant, message, started, usage, state=graph.invoke(inputs, config))
+    except Exception as e:
+        return _result(item_id, assistant, message, started, usage, error=f"{type(e).__name__}: {e}")
+
+
+async def arun_item(item, limiter):
+    item_id, assistant, message, error = item
+    started = time.perf_counter()
+    if error:
+        return _result(item_id, assistant, message, started, error=error)
+    await limiter.aacquire()
+    started = time.perf_counter()
+    usage = None
+    try:
+        graph, inputs, config, usage = await asyncio.to_thread(_prepare, item_id, assistant, message)
+        return _result(item_id, assistant, message, started, usage, state=await graph.ainvoke(inputs, config))
+    except Exception as e:
+        return _result(item_id, assistant, message, started, usage, error=f"{type(e).__name__}: {e}")
+
+
+class ResultWriter:
+    """Appends results as they finish and keeps the totals for the final summary."""
+
+    def __init__(self, path, progress_every=50):
+        self.file = open(path, "a+", encoding="utf-8")
+        # Start on a fresh line after a line cut short by an interruption
+        if self.file.tell():
+            self.file.seek(self.file.tell() - 1)
+            if self.file.read(1) != "\n":
+                self.file.write("\n")
+        self.progress_every = progress_every
+        self.done = 0
+        self.errors = 0
+        self.tokens = 0
+        self.started = time.perf_counter()
+
+    def write(self, result):
+        self.file.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.done += 1
+        self.errors += result["error"] is not None
+        self.tokens += result["total_tokens"]
+        if self.done % self.progress_every == 0:
+            self.log_progress()
+
+    def log_progress(self):
+        elapsed = time.perf_counter() - self.started
+        logger.info(f"{self.done} done, {self.errors} errors, "
+                    f"{self.done / elapsed if elapsed else 0:.1f} items/s, {self.tokens} tokens")
+
+    def close(self):
+        self.file.close()
+
+
+def run_threads(items, writer, limiter, concurrency):
+    # At most `concurrency` items are in flight; results are written in completion order
+    pending = set()
+
+    def write_finished(return_when):
+        finished, _ = wait(pending, return_when=return_when)
+        for future in finished:
+            writer.write(future.result())
+            pending.discard(future)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        try:
+            for item in items:
+                pending.add(pool.submit(run_item, item, limiter))
+                if len(pending) >= concurrency:
+                    write_finished(FIRST_COMPLETED)
+        finally:
+            # On Ctrl-C too: the running items are already paid for, so keep their results
+            if pending:
+                logger.info(f"Waiting for {len(pending)} running items")
+            write_finished(ALL_COMPLETED)
+
+
+async def run_async(items, writer, limiter, concurrency):
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            writer.write(await arun_item(item, limiter))
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    for item in items:
+        await queue.put(item)
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of queries")
+    parser.add_argument("-o", "--output", required=True, help="JSONL results file (appended to; also the resume checkpoint)")
+    parser.add_argument("--assistant", default=DEFAULT_ASSISTANT, choices=sorted(ASSISTANTS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=0, help="max items started per second (0 = unlimited)")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="use graph.ainvoke on one event loop instead of threads")
+    parser.add_argument("--retry-errors", action="store_true", help="run items whose previous result was an error again")
+    parser.add_argument("--limit", type=int, default=0, help="stop after this many items (0 = all)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    # One line per request from the agents would bury the progress lines
+    for name in ("httpx", "token_budget", "metrics"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    if args.retry_errors:
+        logger.info(f"Retrying {drop_errors(args.output)} failed items")
+    done = completed_ids(args.output)
+    items = (item for item in read_items(args.input, args.assistant) if item[0] not in done)
+    if args.limit:
+        items = islice(items, args.limit)
+    logger.info(f"{len(done)} items already in {args.output}")
+
+    limiter = RateLimiter(args.rate, burst=max(1, min(args.concurrency, int(args.rate) or 1)))
+    writer = ResultWriter(args.output)
+    try:
+        if args.use_async:
+            asyncio.run(run_async(items, writer, limiter, args.concurrency))
+        else:
+            run_threads(items, writer, limiter, args.concurrency)
+    except KeyboardInterrupt:
+        logger.info(f"Interrupted after {writer.done} items; run again to resume")
+        return 130
+    finally:
+        writer.log_progress()
+        writer.close()
+    return 1 if writer.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
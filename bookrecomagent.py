@@ -1,21 +1,15 @@
-from langgraph.prebuilt import create_react_agent
-from langchain_openai import ChatOpenAI
+import webapp_path  # noqa: F401  (clients, languages and the catalog live in webApp/)
 from dotenv import load_dotenv
 from langchain_core.tools import tool
-from langchain_community.utilities import GoogleSearchAPIWrapper
-import os
 from typing import Literal
 from datetime import datetime
+from book_catalog import describe
+from languages import language_prompt
+from clients import per_process, lazy_graph, get_catalog, get_agent_model, get_search
 
 # Load environment variables (for API keys)
 load_dotenv()
 
-# Initialize Google Search
-search = GoogleSearchAPIWrapper(
-    google_api_key=os.getenv("GOOGLE_API_KEY"),
-    google_cse_id=os.getenv("GOOGLE_CSE_ID")
-)
-
 # Define system prompt for multilingual responses
 system_prompt = """
 You are a helpful bot, which only replies in Chichewa and English
@@ -32,7 +26,7 @@ You help users find information about trending books and their availability.
 def search_trending_books(query: str):
     """Search for information about trending books."""
     search_query = f"trending books {query}"
-    results = search.run(search_query)
+    results = get_search().run(search_query)
     
     if results:
         return f"Here are some trending books related to your search:\n{results}"
@@ -41,8 +35,13 @@ def search_trending_books(query: str):
 @tool
 def check_book_availability(book_title: str):
     """Check availability of a specific book."""
+    # Local catalog first (python webApp/book_catalog.py ingest <dump>); web search is the fallback
+    books = get_catalog().find_title(book_title)
+    if books:
+        return f"Here's availability information for {book_title}:\n" + "\n".join(describe(book) for book in books)
+
     search_query = f"{book_title} book availability purchase"
-    results = search.run(search_query)
+    results = get_search().run(search_query)
     
     if results:
         return f"Here's availability information for {book_title}:\n{results}"
@@ -52,7 +51,7 @@ def check_book_availability(book_title: str):
 def get_all_available_books():
     """Get a list of current trending books."""
     search_query = "current bestselling books trending now"
-    results = search.run(search_query)
+    results = get_search().run(search_query)
     
     if results:
         return f"Here are the current trending books:\n{results}"
@@ -61,11 +60,15 @@ def get_all_available_books():
 # Collect all tools
 tools = [search_trending_books, check_book_availability, get_all_available_books]
 
-# Initialize the language model
-model = ChatOpenAI(model="gpt-4", temperature=0)
+@per_process
+def get_graph():
+    """Create the ReAct agent on first use."""
+    from langgraph.prebuilt import create_react_agent
+    return create_react_agent(get_agent_model(), tools=tools, prompt=language_prompt(system_prompt))
+
 
-# Create the ReAct agent
-graph = create_react_agent(model, tools=tools, prompt=system_prompt)
+# `graph` (langgraph.json, examples) is compiled on first access
+__getattr__ = lazy_graph(get_graph)
 
 # Function to stream and print responses
 def print_stream(stream):
@@ -80,16 +83,16 @@ def print_stream(stream):
 if __name__ == "__main__":
     print("Example 1: Search Trending Books")
     inputs = {"messages": [("user", "what trending books are available?")]}
-    print_stream(graph.stream(inputs, stream_mode="values"))
+    print_stream(get_graph().stream(inputs, stream_mode="values"))
     
     print(f"\n\n{'==='*20}\n\n")
     
     print("Example 2: Check Specific Book Availability")
     inputs = {"messages": [("user", "is Tomorrow and Tomorrow available?")]}
-    print_stream(graph.stream(inputs, stream_mode="values"))
+    print_stream(get_graph().stream(inputs, stream_mode="values"))
     
     print(f"\n\n{'==='*20}\n\n")
     
     print("Example 3: Search by Author")
     inputs = {"messages": [("user", "show me books by Rebecca Yarros")]}
-    print_stream(graph.stream(inputs, stream_mode="values"))
\ No newline at end of file
+    print_stream(get_graph().stream(inputs, stream_mode="values"))
\ No newline at end of file
@@ -0,0 +1,3 @@
+# The root tests share webApp's fixtures: data_paths keeps their caches,
+# catalog and checkpoints under tmp_path too
+pytest_plugins = ["webApp.conftest"]
@@ -0,0 +1,210 @@
+import re
+import threading
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+import webapp_path  # noqa: F401  (languages lives in webApp/)
+from languages import requested_language
+
+# Stream modes the fast path can produce; for any other the graph runs
+STREAM_MODES = {"values", "updates", "messages"}
+
+
+def normalize_message(text):
+    text = text.lower().strip()
+    text = re.sub(r"[?!.,]+$", "", text)
+    return re.sub(r"\s+", " ", text)
+
+
+def bilingual_reply(chichewa, english):
+    """Format a reply the same way the system prompts ask the model to."""
+    return f"Chichewa: {chichewa}\nEnglish: {english}"
+
+
+def format_reply(replies, language=None):
+    """A handler's {language code: text} replies as the graph would answer.
+
+    With a requested language (languages.set_language) only that text, or None
+    if the handler has none so the graph answers instead; otherwise bilingual.
+    """
+    if language:
+        return replies.get(language)
+    return bilingual_reply(replies["ny"], replies["en"])
+
+
+def _chunks(history, exchange, stream_mode):
+    # What graph.stream yields, in order, for one agent turn that answers straight away
+    human, answer = exchange
+    events = [
+        ("values", {"messages": history + [human]}),
+        ("messages", (AIMessageChunk(content=answer.content, response_metadata=answer.response_metadata),
+                      {"langgraph_node": "agent"})),
+        ("updates", {"agent": {"messages": [answer]}}),
+        ("values", {"messages": history + [human, answer]}),
+    ]
+    if isinstance(stream_mode, str):
+        return [chunk for mode, chunk in events if mode == stream_mode]
+    # Several modes: (mode, chunk) pairs
+    return [(mode, chunk) for mode, chunk in events if mode in stream_mode]
+
+
+class IntentRouter:
+    """Answers high-confidence, structured questions without calling the LLM.
+
+    Each intent is a set of regexes that must match the whole (normalized)
+    user message, plus a handler that receives the regex groups and returns
+    its reply as {language code: text} (see format_reply), or None to give up.
+    Anything unmatched or refused falls through to the wrapped ReAct graph,
+    as does a request for a language the intent has no replies in; that is
+    decided before the handler runs, so handlers with side effects (bookings)
+    only run when their reply will be sent. Use it in place of the graph:
+
+        router = IntentRouter(graph)
+        router.add("availability", [r"what times are available on (\\w+)"], handler)
+        router.stream(inputs, config, stream_mode="values")
+
+    Routed exchanges are saved to the config's thread when the graph has a
+    checkpointer. Pass graph_factory instead of graph to compile the graph on
+    first use (a fallthrough, or a routed turn with a thread_id).
+    """
+
+    def __init__(self, graph=None, graph_factory=None):
+        self._graph = graph
+        self._graph_factory = graph_factory
+        self.intents = []
+        self._lock = threading.Lock()
+        # ineligible: inputs never offered to the intents (history, non-text,
+        # unsupported stream mode); they are not part of the hit rate
+        self.stats = {"routed": 0, "fallthrough": 0, "ineligible": 0, "intents": {}}
+
+    @property
+    def graph(self):
+        if self._graph is None:
+            self._graph = self._graph_factory()
+        return self._graph
+
+    def add(self, name, patterns, handler, languages=("ny", "en")):
+        """Register an intent whose handler replies in `languages`."""
+        compiled = [re.compile(pattern) for pattern in patterns]
+        self.intents.append((name, compiled, handler, frozenset(languages)))
+        self.stats["intents"].setdefault(name, 0)
+
+    def route(self, message, language=None):
+        """Return (intent name, reply) for a message, or None to fall through."""
+        text = normalize_message(message)
+        for name, patterns, handler, languages in self.intents:
+            if language and language not in languages:
+                continue
+            for pattern in patterns:
+                match = pattern.fullmatch(text)
+                if match is None:
+                    continue
+                replies = handler(*match.groups())
+                reply = format_reply(replies, language) if replies is not None else None
+                if reply is not None:
+                    with self._lock:
+                        self.stats["routed"] += 1
+                        self.stats["intents"][name] += 1
+                    return name, reply
+        with self._lock:
+            self.stats["fallthrough"] += 1
+        return None
+
+    def _route_inputs(self, inputs, config=None):
+        """Return (human message, routed answer), or None to fall through."""
+        # Only a single new user message is eligible for the fast path
+        messages = inputs.get("messages", []) if isinstance(inputs, dict) else []
+        content = None
+        if len(messages) == 1:
+            message = messages[0]
+            if isinstance(message, tuple):
+                role, content = message
+            elif isinstance(message, dict):
+                role, content = message.get("role"), message.get("content")
+            else:
+                role, content = message.type, message.content
+            if role not in ("user", "human"):
+                content = None
+        if not isinstance(content, str):
+            with self._lock:
+                self.stats["ineligible"] += 1
+            return None
+
+        routed = self.route(content, requested_language(config))
+        if routed is None:
+            return None
+        human = HumanMessage(content=content)
+        return human, AIMessage(content=routed[1], response_metadata={"intent": routed[0]})
+
+    def _thread_graph(self, config):
+        # With a thread_id and a checkpointer, a routed exchange is saved to the
+        # thread like any other turn, so a later LLM turn sees it
+        if not (config or {}).get("configurable", {}).get("thread_id"):
+            return None
+        graph = self.graph
+        return graph if graph.checkpointer is not None else None
+
+    def _routed(self, inputs, config, stream_mode):
+        modes = [stream_mode] if isinstance(stream_mode, str) else list(stream_mode)
+        if not set(modes) <= STREAM_MODES:
+            with self._lock:
+                self.stats["ineligible"] += 1
+            return None, None
+        return self._route_inputs(inputs, config), self._thread_graph(config)
+
+    def _answer(self, exchange, graph, config, stream_mode):
+        history = []
+        if graph is not None:
+            history = graph.get_state(config).values.get("messages", [])
+            graph.update_state(config, {"messages": list(exchange)}, as_node="agent")
+        return _chunks(history, exchange, stream_mode)
+
+    async def _aanswer(self, exchange, graph, config, stream_mode):
+        history = []
+        if graph is not None:
+            history = (await graph.aget_state(config)).values.get("messages", [])
+            await graph.aupdate_state(config, {"messages": list(exchange)}, as_node="agent")
+        return _chunks(history, exchange, stream_mode)
+
+    def stream(self, inputs, config=None, stream_mode="values", **kwargs):
+        """Same as graph.stream. The fast path serves the "values", "updates" and
+        "messages" stream modes; any other mode (debug, custom, ...) goes to the graph."""
+        exchange, graph = self._routed(inputs, config, stream_mode)
+        if exchange is None:
+            yield from self.graph.stream(inputs, config=config, stream_mode=stream_mode, **kwargs)
+            return
+        yield from self._answer(exchange, graph, config, stream_mode)
+
+    async def astream(self, inputs, config=None, stream_mode="values", **kwargs):
+        exchange, graph = self._routed(inputs, config, stream_mode)
+        if exchange is None:
+            async for chunk in self.graph.astream(inputs, config=config, stream_mode=stream_mode, **kwargs):
+                yield chunk
+            return
+        for chunk in await self._aanswer(exchange, graph, config, stream_mode):
+            yield chunk
+
+    def invoke(self, inputs, config=None, **kwargs):
+        exchange, graph = self._routed(inputs, config, "values")
+        if exchange is None:
+            return self.graph.invoke(inputs, config=config, **kwargs)
+        return self._answer(exchange, graph, config, "values")[-1]
+
+    async def ainvoke(self, inputs, config=None, **kwargs):
+        exchange, graph = self._routed(inputs, config, "values")
+        if exchange is None:
+            return await self.graph.ainvoke(inputs, config=config, **kwargs)
+        return (await self._aanswer(exchange, graph, config, "values"))[-1]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats, intents=dict(self.stats["intents"]))
+        total = stats["routed"] + stats["fallthrough"]
+        stats["hit_rate"] = stats["routed"] / total if total else 0.0
+        stats["intent_hit_rates"] = {
+            name: count / total if total else 0.0 for name, count in stats["intents"].items()
+        }
+        return stats
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
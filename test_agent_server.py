@@ -0,0 +1,70 @@
+import pytest
+
+import agent4
+import agent_server
+import availability_agent
+import bookrecomagent
+from clients import get_agent_model, get_search
+from loadtest import make_fake_model
+
+
+class FakeSearch:
+    def __init__(self):
+        self.queries = []
+
+    def results(self, query, num_results, tool=None):
+        self.queries.append(query)
+        return [{"title": "Fourth Wing"}, {"title": "Iron Flame"}][:num_results]
+
+
+@pytest.fixture
+def search():
+    # The server still compiles each assistant's graph, so give it a model that needs no API key
+    built = get_search.peek(), get_agent_model.peek()
+    fake = FakeSearch()
+    get_search.set(fake)
+    get_agent_model.set(make_fake_model(0))
+    yield fake
+    get_search.set(built[0])
+    get_agent_model.set(built[1])
+
+
+@pytest.fixture
+def client():
+    return agent_server.app.test_client()
+
+
+def ask(client, assistant_id, message):
+    response = client.post(f"/assistants/{assistant_id}/query", json={"message": message, "language": "en"})
+    assert response.status_code == 200
+    return response.get_json()["responses"][-1]["content"]
+
+
+def test_assistant_ids_map_to_their_agents():
+    assert agent_server.get_assistant_graph("trending") is agent4.router
+    assert agent_server.get_assistant_graph("availability") is availability_agent.router
+
+
+def test_every_agent_shares_the_cached_search_client():
+    # No module replaces another's search; they all import the one in clients
+    assert agent4.get_search is bookrecomagent.get_search is get_search
+
+
+def test_trending_questions_reach_the_trending_agent(client, search):
+    answer = ask(client, "trending", "what are the trending books right now")
+    assert answer.splitlines() == [agent4.TRENDING_HEADERS["en"], "- Fourth Wing", "- Iron Flame"]
+    assert search.queries == ["current bestselling books trending now"]
+
+
+def test_availability_questions_reach_the_availability_agent(client, search):
+    routed = availability_agent.router.stats["intents"]["check_availability"]
+    answer = ask(client, "availability", "what times are available on monday")
+    assert answer.startswith("Available time slots for Monday")
+    assert availability_agent.router.stats["intents"]["check_availability"] == routed + 1
+    assert search.queries == []
+
+
+def test_unknown_assistant_is_a_404(client):
+    response = client.post("/assistants/nope/query", json={"message": "hi"})
+    assert response.status_code == 404
+    assert set(response.get_json()["assistants"]) == set(agent_server.ASSISTANTS)
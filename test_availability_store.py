@@ -0,0 +1,92 @@
+from datetime import date
+
+import pytest
+
+from availability_store import AvailabilityStore, format_time
+
+WEEKLY = {"monday": ["09:00", "10:00", "14:00", "15:00", "16:00"]}
+MONDAY = date(2025, 3, 10)
+
+
+def make_store(resources=None):
+    return AvailabilityStore.from_weekly_slots(WEEKLY, resources or {"room-a": 1})
+
+
+def starts(store, resource="room-a"):
+    return [format_time(start * store.slot_minutes) for start in store.free_starts(resource, MONDAY)]
+
+
+def test_only_template_times_are_offered():
+    assert starts(make_store()) == WEEKLY["monday"]
+
+
+def test_half_hour_starts_are_rejected():
+    store = make_store()
+    with pytest.raises(ValueError):
+        store.slot_index("09:30")
+
+
+def test_booking_takes_only_its_own_slot():
+    store = make_store()
+    assert store.book("room-a", MONDAY, store.slot_index("09:00"))
+    assert starts(store) == ["10:00", "14:00", "15:00", "16:00"]
+
+
+def test_one_booking_per_slot():
+    store = make_store()
+    start = store.slot_index("14:00")
+    assert store.book("room-a", MONDAY, start)
+    assert not store.book("room-a", MONDAY, start)
+    assert store.cancel("room-a", MONDAY, start)
+    assert store.book("room-a", MONDAY, start)
+
+
+
+def test_cancel_without_a_booking_changes_nothing():
+    store = make_store({"room-a": 2})
+    nine, ten = store.slot_index("09:00"), store.slot_index("10:00")
+    # Nothing booked that day yet
+    assert not store.cancel("room-a", MONDAY, nine)
+    assert store.book("room-a", MONDAY, nine)
+    before = bytes(store.day_row("room-a", MONDAY))
+    # Another slot of the same day, and a window only partly booked
+    assert not store.cancel("room-a", MONDAY, ten)
+    assert not store.cancel("room-a", MONDAY, nine, slots=2)
+    assert bytes(store.day_row("room-a", MONDAY)) == before
+    assert store.cancel("room-a", MONDAY, nine)
+    assert not store.cancel("room-a", MONDAY, nine)
+
+def test_find_windows_spans_consecutive_slots():
+    store = make_store()
+    windows = store.find_windows(MONDAY, MONDAY, slots=2)
+    assert [format_time(start * 60) for _, start, _ in windows] == ["09:00", "14:00", "15:00"]
+
+
+@pytest.mark.parametrize("minutes", [0, -60])
+def test_durations_must_be_positive(minutes):
+    with pytest.raises(ValueError):
+        make_store().slots_for(minutes)
+
+
+@pytest.mark.parametrize("minutes, slots", [(30, 1), (60, 1), (90, 2), (120, 2)])
+def test_durations_round_up_to_whole_slots(minutes, slots):
+    assert make_store().slots_for(minutes) == slots
+
+
+def test_find_available_windows_fits_90_minutes_in_two_slots():
+    from availability_agent import find_available_windows
+    reply = find_available_windows.invoke({"start_date": "monday", "end_date": "monday", "duration_minutes": 90})
+    assert reply.splitlines()[0] == "Earliest free 90-minute windows:"
+    assert reply.splitlines()[1].endswith("09:00-11:00 (room-a)")
+
+
+def test_find_available_windows_rejects_empty_duration():
+    from availability_agent import find_available_windows
+    reply = find_available_windows.invoke({"start_date": "monday", "duration_minutes": 0})
+    assert reply == "Sorry, the duration must be a positive number of minutes."
+
+
+def test_capacity_above_a_byte_is_rejected():
+    assert starts(make_store({"room-a": 255}))
+    with pytest.raises(ValueError, match="between 0 and 255"):
+        make_store({"hall": 256})
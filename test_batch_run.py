@@ -0,0 +1,147 @@
+import json
+import threading
+
+import pytest
+
+import batch_run
+from batch_run import RateLimiter, ResultWriter, run_threads
+
+
+class EchoGraph:
+    """Answers with the question; fails on questions containing "fail"."""
+
+    def __init__(self):
+        self.questions = []
+
+    def invoke(self, inputs, config=None):
+        question = inputs["messages"][0][1]
+        self.questions.append(question)
+        if "fail" in question:
+            raise RuntimeError("upstream down")
+        return {"messages": inputs["messages"] + [("assistant", question.upper())]}
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    graph = EchoGraph()
+    monkeypatch.setattr(batch_run, "get_assistant_graph", lambda assistant: graph)
+    return graph
+
+
+def write_lines(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+
+def read_results(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_resume_skips_ids_already_in_the_output(tmp_path, graph):
+    queries, output = tmp_path / "queries.jsonl", tmp_path / "results.jsonl"
+    write_lines(queries, [{"id": n, "message": f"question {n}"} for n in range(1, 5)])
+    write_lines(output, [{"id": "1", "answer": "QUESTION 1", "error": None}])
+    # A line cut short by an earlier interruption
+    with open(output, "a") as f:
+        f.write('{"id": "2", "ans')
+
+    assert batch_run.main([str(queries), "-o", str(output), "--concurrency", "2"]) == 0
+    assert sorted(graph.questions) == ["question 2", "question 3", "question 4"]
+    results = [line for line in output.read_text().splitlines() if line.endswith("}")]
+    assert sorted(json.loads(line)["id"] for line in results) == ["1", "2", "3", "4"]
+
+
+def test_retry_errors_replaces_the_failed_line(tmp_path, graph):
+    queries, output = tmp_path / "queries.jsonl", tmp_path / "results.jsonl"
+    write_lines(queries, [{"id": "a", "message": "fine"}, {"id": "b", "message": "fail once"}])
+    assert batch_run.main([str(queries), "-o", str(output)]) == 1
+    assert {result["id"]: result["error"] for result in read_results(output)} == {
+        "a": None, "b": "RuntimeError: upstream down"}
+
+    write_lines(queries, [{"id": "a", "message": "fine"}, {"id": "b", "message": "works now"}])
+    assert batch_run.main([str(queries), "-o", str(output), "--retry-errors"]) == 0
+    results = {result["id"]: result for result in read_results(output)}
+    assert len(read_results(output)) == 2
+    assert results["b"]["answer"] == "WORKS NOW" and results["b"]["error"] is None
+    assert graph.questions.count("fine") == 1
+
+
+def test_limit_reads_only_what_it_runs(tmp_path, graph):
+    queries, output = tmp_path / "queries.jsonl", tmp_path / "results.jsonl"
+    queries.write_text('{"id": 1, "message": "first"}\n{"id": 2, "message": "second"}\nnot json\n')
+    assert batch_run.main([str(queries), "-o", str(output), "--limit", "2"]) == 0
+    assert sorted(result["id"] for result in read_results(output)) == ["1", "2"]
+
+
+def test_malformed_line_becomes_an_error_result(tmp_path, graph):
+    queries, output = tmp_path / "queries.jsonl", tmp_path / "results.jsonl"
+    queries.write_text('{"id": "a", "message": "first"}\n{"id": "b", "mess\n["a list"]\n{"id": "c", "message": "last"}\n')
+    assert batch_run.main([str(queries), "-o", str(output)]) == 1
+    results = {result["id"]: result for result in read_results(output)}
+    assert sorted(results) == ["2", "3", "a", "c"]
+    assert results["2"]["error"].startswith("JSONDecodeError") and results["2"]["message"] == '{"id": "b", "mess'
+    assert results["3"]["error"] == "ValueError: line 3 is not a JSON object"
+    assert sorted(graph.questions) == ["first", "last"]
+
+
+def test_repeated_ids_run_once(tmp_path, graph):
+    queries, output = tmp_path / "queries.jsonl", tmp_path / "results.jsonl"
+    write_lines(queries, [{"id": 1, "message": "first"}, {"id": 2, "message": "second"}, {"id": "1", "message": "again"}])
+    assert batch_run.main([str(queries), "-o", str(output)]) == 0
+    assert sorted(result["id"] for result in read_results(output)) == ["1", "2"]
+    assert sorted(graph.questions) == ["first", "second"]
+
+
+def test_interrupt_keeps_results_of_running_items(tmp_path, monkeypatch):
+    started, release = threading.Barrier(3), threading.Event()
+
+    def run_item(item, limiter):
+        started.wait()
+        release.wait(5)
+        return {"id": item, "error": None, "total_tokens": 0}
+
+    def items():
+        yield "1"
+        yield "2"
+        started.wait()
+        release.set()
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(batch_run, "run_item", run_item)
+    writer = ResultWriter(str(tmp_path / "results.jsonl"))
+    with pytest.raises(KeyboardInterrupt):
+        run_threads(items(), writer, RateLimiter(0), concurrency=4)
+    writer.close()
+    assert sorted(result["id"] for result in read_results(tmp_path / "results.jsonl")) == ["1", "2"]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(batch_run.time, "monotonic", clock)
+    return clock
+
+
+def test_rate_limiter_spaces_acquisitions(clock):
+    limiter = RateLimiter(rate=10)
+    assert [limiter._reserve() for _ in range(3)] == pytest.approx([0, 0.1, 0.2])
+
+
+def test_rate_limiter_allows_a_burst_then_refills(clock):
+    limiter = RateLimiter(rate=2, burst=3)
+    assert [limiter._reserve() for _ in range(4)] == pytest.approx([0, 0, 0, 0.5])
+    clock.now += 2.5
+    # 2.5s at 2/s refills 5 tokens, the one owed and the bucket's 3; no more
+    assert [limiter._reserve() for _ in range(4)] == pytest.approx([0, 0, 0, 0.5])
+
+
+def test_zero_rate_never_waits(monkeypatch):
+    monkeypatch.setattr(batch_run.time, "sleep", lambda seconds: pytest.fail("slept"))
+    RateLimiter(rate=0).acquire()
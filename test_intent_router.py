@@ -0,0 +1,121 @@
+import asyncio
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.prebuilt import create_react_agent
+
+import availability_agent
+from intent_router import IntentRouter, format_reply
+from languages import set_language
+from loadtest import make_fake_model
+
+
+class FallbackGraph:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, inputs, config=None, **kwargs):
+        self.calls += 1
+        return {"messages": inputs["messages"] + [("assistant", "from the graph")]}
+
+
+def make_router():
+    graph = FallbackGraph()
+    router = IntentRouter(graph)
+    router.add("greeting", [r"hello"], lambda: {"ny": "Moni", "en": "Hi"})
+    return router, graph
+
+
+def answer(state):
+    message = state["messages"][-1]
+    return message[1] if isinstance(message, tuple) else message.content
+
+
+def test_format_reply():
+    replies = {"ny": "Moni", "en": "Hi"}
+    assert format_reply(replies) == "Chichewa: Moni\nEnglish: Hi"
+    assert format_reply(replies, "en") == "Hi"
+    assert format_reply(replies, "fr") is None
+
+
+def test_requested_language_only():
+    router, graph = make_router()
+    inputs = {"messages": [("user", "Hello!")]}
+    assert answer(router.invoke(inputs)) == "Chichewa: Moni\nEnglish: Hi"
+    assert answer(router.invoke(inputs, set_language({}, "ny"))) == "Moni"
+    assert graph.calls == 0
+
+
+def test_language_without_a_template_falls_through():
+    router, graph = make_router()
+    state = router.invoke({"messages": [("user", "hello")]}, set_language({}, "fr"))
+    assert answer(state) == "from the graph"
+    assert graph.calls == 1
+
+
+def test_availability_reply_in_english_only():
+    state = availability_agent.router.invoke(
+        {"messages": [("user", "What times are available on Monday?")]}, set_language({}, "en"))
+    reply = answer(state)
+    assert reply.startswith("Available time slots for")
+    assert "Chichewa" not in reply and "Nthawi" not in reply
+
+
+def test_unsupported_language_skips_the_handler():
+    calls = []
+    router, graph = make_router()
+    router.add("book", [r"book it"], lambda: calls.append(1) or {"ny": "Tasungitsa", "en": "Booked"})
+    state = router.invoke({"messages": [("user", "book it")]}, set_language({}, "fr"))
+    assert answer(state) == "from the graph"
+    assert calls == []
+
+
+def test_booking_in_unsupported_language_does_not_book(monkeypatch):
+    graph = FallbackGraph()
+    monkeypatch.setattr(availability_agent.router, "_graph", graph)
+    store = availability_agent.availability_store
+    monday = availability_agent.resolve_date("2030-01-07")
+    start = store.slot_index("15:00")
+
+    state = availability_agent.router.invoke(
+        {"messages": [("user", "Book an appointment for 2030-01-07 at 15:00")]}, set_language({}, "fr"))
+    assert answer(state) == "from the graph"
+    assert graph.calls == 1
+    assert store.is_free("room-a", monday, start)
+
+
+def test_routed_exchange_is_saved_to_the_thread():
+    graph = create_react_agent(make_fake_model(0), tools=[], checkpointer=MemorySaver())
+    router = IntentRouter(graph)
+    router.add("greeting", [r"hello"], lambda: {"ny": "Moni", "en": "Hi"})
+    config = set_language({"configurable": {"thread_id": "t1"}}, "en")
+    router.invoke({"messages": [("user", "hello")]}, config)
+    state = asyncio.run(router.ainvoke({"messages": [("user", "hello")]}, config))
+    # The second turn is answered with the first one in its history, as the graph would
+    assert [m.content for m in state["messages"]] == ["hello", "Hi", "hello", "Hi"]
+    saved = graph.get_state(config)
+    assert [m.content for m in saved.values["messages"]] == ["hello", "Hi", "hello", "Hi"]
+    assert saved.next == ()
+
+
+def test_updates_and_messages_stream_modes():
+    router, graph = make_router()
+    inputs = {"messages": [("user", "hello")]}
+    chunks = list(router.stream(inputs, set_language({}, "en"), stream_mode=["messages", "updates"]))
+    assert [mode for mode, _ in chunks] == ["messages", "updates"]
+    token, metadata = chunks[0][1]
+    assert (token.content, metadata["langgraph_node"]) == ("Hi", "agent")
+    assert chunks[1][1]["agent"]["messages"][-1].content == "Hi"
+    [update] = list(router.stream(inputs, set_language({}, "en"), stream_mode="updates"))
+    assert update["agent"]["messages"][-1].content == "Hi"
+    assert graph.calls == 0
+
+
+def test_ineligible_inputs_are_counted():
+    router, graph = make_router()
+    graph.stream = lambda inputs, config=None, stream_mode=None, **kwargs: iter([])
+    router.invoke({"messages": [("user", "hi"), ("assistant", "Hi"), ("user", "hello")]})
+    list(router.stream({"messages": [("user", "hello")]}, stream_mode="debug"))
+    router.invoke({"messages": [("user", "hello")]})
+    stats = router.get_stats()
+    assert (stats["ineligible"], stats["routed"], stats["fallthrough"]) == (2, 1, 0)
+    assert stats["hit_rate"] == 1.0
@@ -0,0 +1,298 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+DEFAULT_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.85"))
+DEFAULT_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(60 * 60)))
+# Upper edges of the best-match similarity histogram
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)
+
+
+# Question framing that does not change what is asked
+STOPWORDS = frozenset(
+    "a an the and or of to in on at by about like from for with what which who whom whose is are was were be "
+    "some any me my i you your can could would will please tell give show list find get want need "
+    "recommend suggest do does there this that these those s t "
+    "book novel read title right now currently moment today lately day week".split()
+)
+
+# Words folded onto one spelling before questions are compared
+SYNONYMS = {
+    "popular": "trending", "hot": "trending", "hyped": "trending",
+    "top": "best", "greatest": "best", "finest": "best",
+    "child": "kid", "children": "kid", "young": "kid",
+    "latest": "new", "recent": "new", "newest": "new",
+    "don": "not", "doesn": "not", "didn": "not", "isn": "not", "aren": "not", "wasn": "not",
+    "weren": "not", "no": "not", "never": "not", "without": "not"
+}
+
+# Content words that change what a question asks when only one side has them:
+# negation, opposite superlatives, audiences, genres and formats
+QUALIFIERS = frozenset(
+    "not best worst good bad great terrible new old classic modern short long easy hard "
+    "trending underrated overrated cheap free kid teen adult beginner "
+    "fantasy romance mystery thriller horror crime fiction nonfiction science scifi history "
+    "historical biography memoir poetry comic manga graphic literary dystopian fairy "
+    "audiobook ebook paperback hardcover series".split()
+)
+
+# The word after these in a question names an author, title or topic
+ENTITY_MARKERS = ("by", "about", "like", "from")
+WORD = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def normalize_question(text):
+    text = text.lower().strip()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _fold(word):
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    return SYNONYMS.get(word, word)
+
+
+def content_words(normalized):
+    """Words of a normalized question that carry its meaning, in order.
+
+    Plurals and synonyms are folded and framing words dropped, so "what's
+    popular right now?" and "show me trending books" both become ["trending"].
+    """
+    folded = (_fold(word) for word in normalized.split())
+    return [word for word in folded if word not in STOPWORDS]
+
+
+def embedding_text(normalized):
+    """What gets embedded: the sorted content words, so word order and framing don't count."""
+    return " ".join(sorted(content_words(normalized)))
+
+
+def veto_words(question):
+    """Content words that, if only one of two questions has them, make them differ:
+    qualifiers, numbers ("Harry Potter 2") and title or author words, i.e.
+    capitalized words past the first and the word after "by", "about", ..."""
+    normalized = normalize_question(question)
+    words = normalized.split()
+    vetoes = {word for word in content_words(normalized) if word in QUALIFIERS or word.isdigit()}
+    vetoes.update(_fold(after) for before, after in zip(words, words[1:]) if before in ENTITY_MARKERS)
+    vetoes.update(_fold(word.lower()) for word in WORD.findall(question)[1:] if word[:1].isupper())
+    return frozenset(vetoes - STOPWORDS)
+
+
+def changes_meaning(question, other):
+    """True if two questions differ by a negation, an opposite, an added qualifier,
+    a number or a title/author word.
+
+    Content words are compared as multisets, so "Tomorrow and Tomorrow" is
+    not "Tomorrow". Other wording differences ("really", "great reads") are
+    left to the embedding similarity.
+    """
+    words = Counter(content_words(normalize_question(question)))
+    other_words = Counter(content_words(normalize_question(other)))
+    difference = set((words - other_words) + (other_words - words))
+    return bool(difference & (veto_words(question) | veto_words(other)))
+
+
+class HashingEmbedder:
+    """Dependency-free embedding: signed feature hashing of words and char n-grams."""
+
+    def __init__(self, dim=1024, ngram_range=(3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def _features(self, text):
+        words = text.split()
+        features = list(words)
+        features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        padded = f" {text} "
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            features += [padded[i:i + n] for i in range(len(padded) - n + 1)]
+        return features
+
+    def embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dim] += 1.0 if (digest >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SentenceTransformerEmbedder:
+    """Small on-CPU model (optional dependency: sentence-transformers)."""
+
+    def __init__(self, model_name="all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, text):
+        return self.model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+
+def make_embedder(name=None):
+    """ANSWER_CACHE_EMBEDDER=hashing (default) or sentence-transformers[:model]."""
+    name = name or os.getenv("ANSWER_CACHE_EMBEDDER", "hashing")
+    if name.startswith("sentence-transformers"):
+        _, _, model_name = name.partition(":")
+        return SentenceTransformerEmbedder(model_name or "all-MiniLM-L6-v2")
+    return HashingEmbedder()
+
+
+class AnswerCache:
+    """Final-answer cache looked up by question similarity.
+
+    Questions are embedded by their content words (see embedding_text), so
+    rephrasings score close to 1, and embeddings live in a preallocated NumPy
+    matrix, so a lookup is one matrix-vector product. Similarity alone cannot
+    tell "best" from "worst" or notice an added "for kids", so a match is
+    vetoed when the two questions differ by such a word (see changes_meaning).
+    Entries are persisted to SQLite and rows written by other worker
+    processes are picked up every `sync_interval` seconds. The least
+    recently used entry is evicted once `max_entries` is reached.
+    """
+
+    def __init__(self, path=None, embedder=None, threshold=DEFAULT_THRESHOLD,
+                 ttl=DEFAULT_TTL, max_entries=5000, sync_interval=30):
+        self.path = path
+        self.embedder = embedder or make_embedder()
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.sync_interval = sync_interval
+        self._vectors = np.zeros((max_entries, self.embedder.dim), dtype=np.float32)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        # Answers in different reply languages never match each other; "" is the default
+        self._namespaces = np.zeros(max_entries, dtype=np.int32)
+        self._namespace_ids = {"": 0}
+        self._entries = [None] * max_entries
+        self._slots = {}
+        self._lock = threading.Lock()
+        self._last_rowid = 0
+        self._last_sync = 0.0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "similarity_sum": 0.0,
+                      "similarity_histogram": {bucket: 0 for bucket in SIMILARITY_BUCKETS}}
+        if self.path:
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS answer_cache ("
+                " key TEXT PRIMARY KEY, question TEXT, answer TEXT,"
+                " embedding BLOB, expires_at REAL)"
+            )
+            self._sync()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _sync(self):
+        # Load rows added since the last sync (including other workers' writes)
+        now = time.time()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT rowid, key, question, answer, embedding, expires_at FROM answer_cache"
+                " WHERE rowid > ? AND expires_at > ? ORDER BY rowid",
+                (self._last_rowid, now)
+            ).fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            for rowid, key, question, answer, embedding, expires_at in rows:
+                vector = np.frombuffer(embedding, dtype=np.float32)
+                if vector.shape[0] == self.embedder.dim:
+                    self._put(key, question, answer, vector, expires_at)
+                self._last_rowid = max(self._last_rowid, rowid)
+            self._last_sync = now
+
+    def _put(self, key, question, answer, vector, expires_at):
+        slot = self._slots.get(key)
+        if slot is None:
+            # Empty and expired slots score 0, so they are reused before live entries
+            now = time.time()
+            slot = int(np.argmin(np.where(self._expires <= now, 0.0, self._last_used)))
+            if self._entries[slot] is not None:
+                self._slots.pop(self._entries[slot]["key"], None)
+                if self._expires[slot] > now:
+                    self.stats["evictions"] += 1
+            self._slots[key] = slot
+        self._vectors[slot] = vector
+        # Keys are "<namespace>:<hash>", or just the hash in the default namespace
+        namespace = key.split(":", 1)[0] if ":" in key else ""
+        self._namespaces[slot] = self._namespace_ids.setdefault(namespace, len(self._namespace_ids))
+        self._expires[slot] = expires_at
+        self._last_used[slot] = time.time()
+        self._entries[slot] = {"key": key, "question": question, "answer": answer}
+
+    def lookup(self, question, namespace=""):
+        """Return the cached answer for a similar question in `namespace`, or None."""
+        if self.path and time.time() - self._last_sync > self.sync_interval:
+            self._sync()
+        normalized = normalize_question(question)
+        query = self.embedder.embed(embedding_text(normalized))
+        now = time.time()
+        with self._lock:
+            similarities = self._vectors @ query
+            similarities[self._expires <= now] = -1.0
+            similarities[self._namespaces != self._namespace_ids.get(namespace, -1)] = -1.0
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity >= 0:
+                bucket = next(b for b in SIMILARITY_BUCKETS if similarity <= b + 1e-6)
+                self.stats["similarity_histogram"][bucket] += 1
+            # The most similar entry above the threshold that asks the same thing
+            best = None
+            for slot in np.flatnonzero(similarities >= self.threshold):
+                if not changes_meaning(self._entries[slot]["question"], question) and (
+                        best is None or similarities[slot] > similarities[best]):
+                    best = int(slot)
+            if best is None:
+                self.stats["misses"] += 1
+                return None
+            similarity = float(similarities[best])
+            self.stats["hits"] += 1
+            self.stats["similarity_sum"] += similarity
+            self._last_used[best] = now
+            return self._entries[best]["answer"]
+
+    def store(self, question, answer, namespace=""):
+        normalized = normalize_question(question)
+        if not normalized or not answer:
+            return
+        key = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        if namespace:
+            key = f"{namespace}:{key}"
+        vector = self.embedder.embed(embedding_text(normalized))
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            # The question as asked: its capitals mark titles and authors for changes_meaning
+            self._put(key, question, answer, vector, expires_at)
+            self.stats["stores"] += 1
+        if self.path:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO answer_cache VALUES (?, ?, ?, ?, ?)",
+                    (key, question, answer, vector.tobytes(), expires_at)
+                )
+                conn.execute("DELETE FROM answer_cache WHERE expires_at <= ?", (time.time(),))
+            finally:
+                conn.close()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["similarity_histogram"] = dict(self.stats["similarity_histogram"])
+            stats["size"] = len(self._slots)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["mean_hit_similarity"] = stats.pop("similarity_sum") / stats["hits"] if stats["hits"] else 0.0
+        return stats
@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import json
 
@@ -9,7 +9,13 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 
 # Import the agent and tools from the previous code
 # Assuming the previous code is saved in a file named 'book_agent.py'
-from book_agent import graph
+from book_agent import get_graph, get_answer_cache
+from query_api import parse_query, answer_query, stream_answer, translate_body
+from streaming import SSE_HEADERS
+from metrics import install_flask
+
+# Request ids, per-request timing spans and GET /metrics
+install_flask(app)
 
 @app.route('/')
 def home():
@@ -18,32 +24,36 @@ def home():
 @app.route('/query', methods=['POST'])
 def query_agent():
     try:
-        data = request.json
-        user_message = data.get('message', '')
-        
-        # Prepare input for the agent
-        inputs = {"messages": [("user", user_message)]}
-        
-        # Get response from agent
-        responses = []
-        for response in graph.stream(inputs, stream_mode="values"):
-            message = response["messages"][-1]
-            if isinstance(message, tuple):
-                responses.append({
-                    'role': message[0],
-                    'content': message[1]
-                })
-            else:
-                responses.append({
-                    'role': 'assistant',
-                    'content': message.content
-                })
-        
-        return jsonify({'responses': responses})
+        try:
+            query = parse_query(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(answer_query(get_graph(), query, get_answer_cache()))
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+@app.route('/query/stream', methods=['POST'])
+def query_agent_stream():
+    try:
+        query = parse_query(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return Response(
+        stream_with_context(stream_answer(get_graph(), query, get_answer_cache())),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
+
+
+@app.route('/translate', methods=['POST'])
+def translate_answer():
+    try:
+        return jsonify(translate_body(request.json))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 # Add this section at the end of the file
 if __name__ == '__main__':
     print("Starting Flask application...")
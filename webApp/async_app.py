@@ -0,0 +1,83 @@
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.templating import Jinja2Templates
+import asyncio
+import os
+
+# Import the agent; its search-backed tools carry async variants for astream
+from book_agent import get_graph, get_answer_cache, preload
+from query_api import parse_query, aanswer_query, astream_answer, translate_body
+from streaming import SSE_HEADERS
+from metrics import install_fastapi
+import transport
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Build the graph and clients off the event loop before the first request needs them
+    await asyncio.to_thread(preload)
+    yield
+    await transport.aclose_clients()
+
+
+# ASGI counterpart of app2.py. Every conversation runs on the event loop with
+# graph.astream, so concurrency is bounded by open sockets, not worker threads.
+#   uvicorn async_app:app --host 0.0.0.0 --port 8000
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), "templates"))
+
+# Request ids, per-request timing spans and GET /metrics
+install_fastapi(app)
+
+
+@app.get('/')
+async def home(request: Request):
+    return templates.TemplateResponse(request, 'index.html')
+
+
+@app.post('/query')
+async def query_agent(request: Request):
+    try:
+        try:
+            query = parse_query(await request.json())
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+        # Same response shape as the Flask /query endpoint
+        return await aanswer_query(get_graph(), query, get_answer_cache())
+
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+@app.post('/query/stream')
+async def query_agent_stream(request: Request):
+    try:
+        query = parse_query(await request.json())
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    return StreamingResponse(
+        astream_answer(get_graph(), query, get_answer_cache()),
+        media_type='text/event-stream',
+        headers=SSE_HEADERS
+    )
+
+
+@app.post('/translate')
+async def translate_answer(request: Request):
+    data = await request.json()
+    try:
+        # The translation backends are blocking
+        return await asyncio.to_thread(translate_body, data)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("Starting async server...")
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv("PORT", "8000")))
@@ -1,21 +1,63 @@
-from langgraph.prebuilt import create_react_agent
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 from langchain_core.tools import tool
-from langchain_google_community import GoogleSearchAPIWrapper
-from googletrans import Translator
+from translation import TranslationService, print_stream
+from fanout import fan_out
+from answer_cache import AnswerCache
+from checkpointer import SqliteCheckpointSaver, thread_config
+from languages import normalize_language
+from token_budget import limit_tool_output, make_prompt
+from book_records import MAX_RECORDS, extract_records, format_records, from_catalog
+from clients import per_process, get_catalog, get_model, get_agent_model, get_search
+from similarity_index import SimilarityIndex
+from refresher import BackgroundRefresher
+from metrics import register_stats
+from typing import Callable, NamedTuple, Optional
+import transport
+import model_tiers
+import asyncio
+import gc
 import os
+import re
 
 # Load environment variables (for API keys)
 load_dotenv()
 
-# Initialize Google Search
-search = GoogleSearchAPIWrapper(
-    google_api_key=os.getenv("GOOGLE_API_KEY"),  # Correct usage: os.getenv
-    google_cse_id=os.getenv("GOOGLE_CSE_ID")
-)
+# Memoized translation; TRANSLATION_BACKEND=phrases runs it offline
+translator = TranslationService()
 
-translator = Translator()
+# The search cache, refresher, checkpointer and local catalog (clients.get_search,
+# clients.get_catalog) open their SQLite files on first use, so importing this
+# module touches no files; preload() opens them before gunicorn forks.
+
+
+@per_process
+def get_similarity_index():
+    """Embeddings of the catalog for find_similar_books; embeds only books added since last run."""
+    index = SimilarityIndex(get_catalog())
+    index.sync()
+    return index
+
+
+@per_process
+def get_answer_cache():
+    """Final answers reused for near-duplicate questions, skipping the whole ReAct loop."""
+    cache = AnswerCache(path=os.getenv("ANSWER_CACHE_PATH", "answer_cache.sqlite3"))
+    register_stats("answer_cache", cache.get_stats,
+                   {"hits": "counter", "misses": "counter", "stores": "counter", "size": "gauge"})
+    return cache
+
+
+register_stats("translation_cache", translator.get_stats,
+               {"hits": "counter", "misses": "counter", "skipped": "counter", "size": "gauge"})
+# Router/answer model calls, latency, tokens and escalations (ROUTER_MODEL)
+register_stats("model_tiers", lambda: model_tiers.get_stats(get_agent_model.peek()),
+               dict.fromkeys(model_tiers.STAT_KEYS, "counter"))
+# Connection reuse, retries and circuit breaker state per upstream API
+for upstream in transport.UPSTREAMS:
+    register_stats(f"upstream_{upstream}", lambda upstream=upstream: transport.get_stats(upstream),
+                   {"requests": "counter", "attempts": "counter", "retries": "counter", "failures": "counter",
+                    "connections_opened": "counter", "connections_reused": "counter",
+                    "opened": "counter", "short_circuits": "counter", "breaker_state": "gauge"})
 
 # Define system prompt for multilingual responses
 system_prompt = """
@@ -38,94 +80,256 @@ You can search for books by:
 """
 
 
-@tool
+# Number of search results parsed into book records per tool call
+SEARCH_NUM_RESULTS = int(os.getenv("SEARCH_NUM_RESULTS", "10"))
+
+
+def find_books(search_query, tool_name):
+    """Search and reduce the results to merged, ranked book records."""
+    results = get_search().results(search_query, SEARCH_NUM_RESULTS, tool=tool_name)
+    return extract_records(results, search_query)
+
+
+async def afind_books(search_query, tool_name):
+    results = await get_search().aresults(search_query, SEARCH_NUM_RESULTS, tool=tool_name)
+    return extract_records(results, search_query)
+
+
+def _snippets_response(results, search_query, header, empty=None):
+    # Biographies and other prose live in the snippets, which book records drop
+    snippets = [result["snippet"] for result in results or [] if result.get("snippet")]
+    if not snippets:
+        return (empty or f"{header}\nNo results found."), []
+    return f"{header}\n" + "\n".join(f"- {snippet}" for snippet in snippets), extract_records(results, search_query)
+
+
+def _books_response(records, header, empty=None):
+    # Tools return (text for the model, records for caches and the frontend)
+    if records:
+        return f"{header}\n{format_records(records)}", records
+    return (empty or f"{header}\nNo results found."), []
+
+
+class BookLookup(NamedTuple):
+    """How a search-backed tool answers: local books first, then a web search."""
+    local: Optional[Callable[[], list]]
+    search_query: str
+    tool_name: str
+    header: str
+    empty: Optional[str] = None
+    # Answer from the search snippets rather than book records
+    snippets: bool = False
+
+
+def run_lookup(lookup):
+    if lookup.local is not None:
+        books = lookup.local()
+        if books:
+            return _books_response([from_catalog(book) for book in books], lookup.header)
+    if lookup.snippets:
+        results = get_search().results(lookup.search_query, SEARCH_NUM_RESULTS, tool=lookup.tool_name)
+        return _snippets_response(results, lookup.search_query, lookup.header, lookup.empty)
+    return _books_response(find_books(lookup.search_query, lookup.tool_name), lookup.header, lookup.empty)
+
+
+async def arun_lookup(lookup):
+    # Catalog and similarity lookups read SQLite and NumPy arrays, so they run
+    # on a thread rather than blocking the event loop
+    if lookup.local is not None:
+        books = await asyncio.to_thread(lookup.local)
+        if books:
+            return _books_response([from_catalog(book) for book in books], lookup.header)
+    if lookup.snippets:
+        results = await get_search().aresults(lookup.search_query, SEARCH_NUM_RESULTS, tool=lookup.tool_name)
+        return _snippets_response(results, lookup.search_query, lookup.header, lookup.empty)
+    return _books_response(await afind_books(lookup.search_query, lookup.tool_name), lookup.header, lookup.empty)
+
+
+def trending_lookup(query):
+    return BookLookup(None, f"trending books {query}", "search_trending_books",
+                      "Here are some trending books related to your search:",
+                      "No trending books found matching your search criteria.")
+
+
+def availability_lookup(book_title):
+    return BookLookup(lambda: get_catalog().find_title(book_title),
+                      f"{book_title} book availability purchase", "check_book_availability",
+                      f"Here's availability information for {book_title}:",
+                      "Could not find availability information for this book.")
+
+
+def genre_lookup(genre):
+    return BookLookup(lambda: get_catalog().find_genre(genre, limit=MAX_RECORDS),
+                      f"best selling {genre} books current trending", "search_books_by_genre",
+                      f"Here are popular books in the {genre} genre:",
+                      f"No trending books found in the {genre} genre.")
+
+
+def similar_lookup(book_title):
+    return BookLookup(lambda: get_similarity_index().similar(book_title, limit=MAX_RECORDS, known_only=True),
+                      f"books similar to {book_title} recommendations", "find_similar_books",
+                      f"If you liked {book_title}, you might enjoy:")
+
+
+def author_lookup(author_name):
+    return BookLookup(lambda: get_catalog().find_author(author_name, limit=MAX_RECORDS),
+                      f"{author_name} author biography books written", "get_author_info",
+                      f"Information about {author_name}:", snippets=True)
+
+
+def price_lookup(book_title):
+    return BookLookup(None, f"{book_title} book price comparison amazon barnes noble", "compare_book_prices",
+                      f"Price comparison for {book_title}:")
+
+
+@tool(response_format="content_and_artifact")
 def search_trending_books(query: str):
     """Search for information about trending books based on the given query."""
-    search_query = f"trending books {query}"
-    results = search.run(search_query)
-    
-    if results:
-        return f"Here are some trending books related to your search:\n{results}"
-    return "No trending books found matching your search criteria."
-
-@tool
+    return run_lookup(trending_lookup(query))
+
+@tool(response_format="content_and_artifact")
 def check_book_availability(book_title: str):
     """Check the availability of a specific book."""
-    search_query = f"{book_title} book availability purchase"
-    results = search.run(search_query)
+    return run_lookup(availability_lookup(book_title))
 
-    if results:
-        return f"Here's availability information for {book_title}:\n{results}"
-    return "Could not find availability information for this book."
+def all_available_books():
+    records = find_books("current bestselling books trending now", "get_all_available_books")
+    return _books_response(records, "Here are the current trending books:",
+                           "Could not fetch trending books at the moment.")
 
-@tool
+
+@tool(response_format="content_and_artifact")
 def get_all_available_books():
     """Get a list of all currently available trending books."""
-    search_query = "current bestselling books trending now"
-    results = search.run(search_query)
-
-    if results:
-        return f"Here are the current trending books:\n{results}"
-    return "Could not fetch trending books at the moment."
+    # Same for every user, so it is precomputed by the refresher instead of searched per request
+    return tuple(get_refresher().get("get_all_available_books"))
 
-@tool
+@tool(response_format="content_and_artifact")
 def search_books_by_genre(genre: str):
     """Search for trending books in a specific genre."""
-    search_query = f"best selling {genre} books current trending"
-    results = search.run(search_query)
+    return run_lookup(genre_lookup(genre))
 
-    if results:
-        return f"Here are popular books in the {genre} genre:\n{results}"
-    return f"No trending books found in the {genre} genre."
 
-
-@tool
+@tool(response_format="content_and_artifact")
 def find_similar_books(book_title: str):
     """Find books similar to a given title."""
-    search_query = f"books similar to {book_title} recommendations"
-    results = search.run(search_query)
-    return f"If you liked {book_title}, you might enjoy:\n{results}"
+    return run_lookup(similar_lookup(book_title))
 
-@tool
+@tool(response_format="content_and_artifact")
 def get_author_info(author_name: str):
     """Get information about an author and their works."""
-    search_query = f"{author_name} author biography books written"
-    results = search.run(search_query)
-    return f"Information about {author_name}:\n{results}"
-
-@tool
-def get_book_club_suggestions():
-    """Get book recommendations suitable for book clubs."""
-    search_query = "best book club books discussion worthy current"
-    results = search.run(search_query)
-    return f"Recommended books for book clubs:\n{results}"
-@tool
+    return run_lookup(author_lookup(author_name))
+
+# Trusted sources queried by the aggregated book club mode
+BOOK_CLUB_SOURCES = [
+    "Oprah's Book Club latest selections",
+    "Reese Witherspoon Book Club picks",
+    "NY Times Book Review editor's choices for book clubs",
+    "Goodreads Choice Awards for Fiction"
+]
+BOOK_CLUB_MAX_CONCURRENCY = int(os.getenv("BOOK_CLUB_MAX_CONCURRENCY", "4"))
+BOOK_CLUB_SOURCE_DEADLINE = float(os.getenv("BOOK_CLUB_SOURCE_DEADLINE", "4.0"))
+
+
+def _dedup_key(text):
+    # Collapse case, punctuation and trailing " - Goodreads" style site names
+    text = re.split(r"\s[-|–]\s", text.lower())[0]
+    return re.sub(r"[^a-z0-9]+", " ", text).strip()
+
+
+def _search_source(source):
+    return get_search().results(f"{source} 2023 OR 2024", 3, tool="get_book_club_suggestions")
+
+
+def aggregate_book_club_suggestions(sources=BOOK_CLUB_SOURCES):
+    """Query every source concurrently and merge the results without duplicates."""
+    per_source = fan_out(
+        _search_source,
+        [(source,) for source in sources],
+        max_concurrency=BOOK_CLUB_MAX_CONCURRENCY,
+        deadline=BOOK_CLUB_SOURCE_DEADLINE,
+        names=sources
+    )
+
+    return merge_book_club_results(sources, per_source)
+
+
+def merge_book_club_results(sources, per_source):
+    """Merge per-source result lists, dropping duplicate titles/snippets."""
+    seen = set()
+    lines = []
+    for source, results in zip(sources, per_source):
+        # Sources that failed or missed the deadline are dropped
+        for result in results or []:
+            keys = {_dedup_key(result["title"]), _dedup_key(result.get("snippet", ""))}
+            keys.discard("")
+            if keys & seen:
+                continue
+            seen.update(keys)
+            lines.append(f"- {result['title']} ({source}): {result.get('snippet', '')}")
+    return lines
+
+
+def book_club_suggestions(aggregated=False):
+    if aggregated:
+        lines = aggregate_book_club_suggestions()
+        if lines:
+            return "Curated Book Club Selections from Trusted Sources:\n" + "\n".join(lines), []
+
+    records = find_books("best book club books discussion worthy current", "get_book_club_suggestions")
+    return _books_response(records, "Recommended books for book clubs:")
+
+
+@per_process
+def get_refresher():
+    """Results of the parameterless tools, recomputed every REFRESH_INTERVAL seconds
+    in the background and shared by all workers through REFRESH_CACHE_PATH.
+
+    Refreshes go through the search cache, so each job costs at most one CSE
+    query per search TTL, and only jobs read in the last REFRESH_IDLE_AFTER
+    seconds are refreshed at all."""
+    refresher = BackgroundRefresher(path=os.getenv("REFRESH_CACHE_PATH", "refresh_cache.sqlite3"))
+    refresher.add("get_all_available_books", all_available_books)
+    refresher.add("get_book_club_suggestions", book_club_suggestions)
+    refresher.add("get_book_club_suggestions:aggregated", lambda: book_club_suggestions(aggregated=True))
+    register_stats("refresher", refresher.get_stats,
+                   {"hits": "counter", "stale_hits": "counter", "misses": "counter", "refreshes": "counter",
+                    "refresh_failures": "counter", "max_age_seconds": "gauge"})
+    return refresher
+
+
+@tool(response_format="content_and_artifact")
+def get_book_club_suggestions(aggregated: bool = False):
+    """Get book recommendations suitable for book clubs.
+    Set aggregated=True to combine picks from several trusted book clubs."""
+    return tuple(get_refresher().get("get_book_club_suggestions:aggregated" if aggregated else "get_book_club_suggestions"))
+
+@tool(response_format="content_and_artifact")
 def compare_book_prices(book_title: str):
     """Compare book prices across different platforms."""
-    search_query = f"{book_title} book price comparison amazon barnes noble"
-    results = search.run(search_query)
-    return f"Price comparison for {book_title}:\n{results}"
-
-
-# @tool
-# def get_book_club_suggestions():
-#     """Get aggregated book club suggestions from multiple trusted sources"""
-#     sources = [
-#         "Oprah's Book Club latest selections",
-#         "Reese Witherspoon Book Club picks",
-#         "NY Times Book Review editor's choices for book clubs",
-#         "Goodreads Choice Awards for Fiction"
-#     ]
-    
-    all_results = []
-    for source in sources:
-        # Get top 1 result from each source (GoogleSearchAPIWrapper doesn't support max_results)
-        results = search.run(f"{source} 2023 OR 2024")
-        all_results.append(results)
-    
-    # Remove duplicates and format
-    unique_results = list(set(all_results))
-    return "Curated Book Club Selections from Trusted Sources:\n" + "\n".join(unique_results)
+    return run_lookup(price_lookup(book_title))
+
+# Async variants of the search-backed tools. graph.astream/ainvoke use these
+# (via each tool's coroutine) so a conversation never blocks the event loop.
+def _async_lookup(make_lookup):
+    async def coroutine(*args, **kwargs):
+        return await arun_lookup(make_lookup(*args, **kwargs))
+    return coroutine
+
+async def _aget_all_available_books():
+    return tuple(await get_refresher().aget("get_all_available_books"))
+
+async def _aget_book_club_suggestions(aggregated: bool = False):
+    return tuple(await get_refresher().aget("get_book_club_suggestions:aggregated" if aggregated else "get_book_club_suggestions"))
+
+search_trending_books.coroutine = _async_lookup(trending_lookup)
+check_book_availability.coroutine = _async_lookup(availability_lookup)
+get_all_available_books.coroutine = _aget_all_available_books
+search_books_by_genre.coroutine = _async_lookup(genre_lookup)
+find_similar_books.coroutine = _async_lookup(similar_lookup)
+get_author_info.coroutine = _async_lookup(author_lookup)
+get_book_club_suggestions.coroutine = _aget_book_club_suggestions
+compare_book_prices.coroutine = _async_lookup(price_lookup)
 
 # Collect all tools
 tools = [
@@ -133,31 +337,98 @@ tools = [
     check_book_availability,
     get_all_available_books,
     search_books_by_genre,
+    find_similar_books,
     get_author_info,
     get_book_club_suggestions,
     compare_book_prices
 ]
 
-# Initialize the language model
-model = ChatOpenAI(model="gpt-4", temperature=0)
+# Keep raw search output from flooding the prompt (TOOL_OUTPUT_TOKEN_BUDGET)
+for search_tool in tools:
+    limit_tool_output(search_tool)
+
+@per_process
+def get_checkpointer():
+    """Conversation state per thread_id; each step only writes the channels it changed."""
+    return SqliteCheckpointSaver(os.getenv("CHECKPOINT_DB_PATH", "checkpoints.sqlite3"))
+
+
+@per_process
+def get_graph():
+    """Create the ReAct agent, compiled once per process.
+
+    Only recent history within HISTORY_TOKEN_BUDGET is resent on each ReAct step;
+    the tool calls of one step run concurrently (TOOL_MAX_CONCURRENCY, TOOL_STEP_DEADLINE).
+    """
+    from langgraph.prebuilt import create_react_agent
+    from parallel_tools import ParallelToolNode
+    return create_react_agent(get_agent_model(), tools=ParallelToolNode(tools), prompt=make_prompt(system_prompt),
+                              checkpointer=get_checkpointer())
+
+
+def preload():
+    """Build everything a request needs now instead of on the first request.
 
-# Create the ReAct agent
-graph = create_react_agent(model, tools=tools, prompt=system_prompt)
+    Call it in the parent before forking workers (gunicorn preload_app, see
+    gunicorn.conf.py) so every worker starts with the warmed graph and indexes.
+    """
+    get_graph()
+    get_answer_cache()
+    get_similarity_index()
+    # Touching the lazy properties builds the Google and translation clients
+    get_search().wrapper
+    translator.backend
+    get_catalog().refresh()
+    get_refresher().warm()
+    # Keep the warmed objects out of GC passes so their pages stay shared after fork
+    gc.freeze()
+
+
+def _after_fork_in_child():
+    # SQLite connections and HTTP connection pools cannot cross a fork
+    transport.after_fork()
+    # Objects never built in the parent have nothing to reopen
+    for accessor in (get_search, get_refresher, get_catalog, get_checkpointer):
+        built = accessor.peek()
+        if built is not None:
+            built.after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+_LAZY_ATTRIBUTES = {
+    "graph": get_graph,
+    "model": get_model,
+    "answer_cache": get_answer_cache,
+    "similarity_index": get_similarity_index,
+    "search": get_search,
+    "catalog": get_catalog,
+    "refresher": get_refresher,
+    "checkpointer": get_checkpointer,
+}
+
+
+def __getattr__(name):
+    # `from book_agent import graph` (or search, catalog, ...) keeps working; it builds the object on access
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Function to handle language translation
 def translate_text(text, target_lang):
-    return translator.translate(text, dest=target_lang).text
-
-# Function to stream and print responses
-def print_stream(stream, target_lang='en'):
-    for s in stream:
-        message = s["messages"][-1]
-        if isinstance(message, tuple):
-            translated_message = translate_text(message[1], target_lang)
-            print((message[0], translated_message))
-        else:
-            translated_message = translate_text(message.content, target_lang)
-            print(translated_message)
+    return translator.translate(text, target_lang)
+
+# Other languages of an answer generated in one language ("alternates" on
+# /query), translated on demand through the memoized translator
+def translate_alternates(text, language, targets):
+    alternates = {}
+    for target in targets:
+        target = normalize_language(target)
+        if target and target != language:
+            alternates[target] = translator.translate(text, target, source_lang=language)
+    return alternates
 
 # Example usage demonstrating multilingual support
 if __name__ == "__main__":
@@ -166,10 +437,10 @@ if __name__ == "__main__":
 
     print("Example 1: Search Trending Books")
     inputs = {"messages": [("user", "what trending books are available?")]}
-    print_stream(graph.stream(inputs, stream_mode="values"), target_language)
+    print_stream(get_graph().stream(inputs, thread_config()[1], stream_mode="values"), translator, target_language)
 
     print(f"\n\n{'==='*20}\n\n")
 
     print("Example 2: Check Specific Book Availability")
     inputs = {"messages": [("user", "is Tomorrow and Tomorrow available?")]}
-    print_stream(graph.stream(inputs, stream_mode="values"), target_language)
\ No newline at end of file
+    print_stream(get_graph().stream(inputs, thread_config()[1], stream_mode="values"), translator, target_language)
\ No newline at end of file
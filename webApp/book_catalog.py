@@ -0,0 +1,517 @@
+import argparse
+import csv
+import gzip
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import groupby
+
+import numpy as np
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Term-frequency boost per field; each field is also indexed as "<field>:<term>"
+FIELD_WEIGHTS = {"title": 3, "author": 2, "genres": 2, "description": 1}
+FIELD_PREFIXES = {"title": "title", "author": "author", "genres": "genre"}
+# Documents buffered in memory before a segment is written
+FLUSH_EVERY = int(os.getenv("BOOK_CATALOG_FLUSH_EVERY", "50000"))
+
+# Column names used by common book dumps (Goodreads, Open Library, Kaggle CSVs)
+FIELD_ALIASES = {
+    "title": ("title", "name", "book_title", "original_title"),
+    "author": ("author", "authors", "author_name", "book_author", "authors_names"),
+    "genres": ("genres", "genre", "categories", "subjects", "shelves"),
+    "description": ("description", "desc", "summary", "blurb"),
+    "isbn": ("isbn", "isbn13", "isbn10", "isbn_13"),
+}
+
+STOPWORDS = frozenset("a an and are as at be by for from in is it of on or the to with".split())
+TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc_id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    title TEXT,
+    author TEXT,
+    genres TEXT,
+    description TEXT,
+    extra TEXT,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS live_docs (key TEXT PRIMARY KEY, doc_id INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS deleted (seq INTEGER PRIMARY KEY AUTOINCREMENT, doc_id INTEGER UNIQUE);
+CREATE TABLE IF NOT EXISTS segments (id INTEGER PRIMARY KEY, docs INTEGER, created_at REAL);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    segment INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (term, segment)
+) WITHOUT ROWID;
+"""
+
+
+def tokenize(text):
+    return [t for t in TOKEN.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def _split_list(value):
+    # Genres/authors arrive as lists, JSON lists or "a, b | c" strings
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    value = str(value).strip()
+    if value.startswith("["):
+        try:
+            return _split_list(json.loads(value.replace("'", '"')))
+        except ValueError:
+            value = value.strip("[]")
+    return [part.strip(" '\"") for part in re.split(r"[,;|]", value) if part.strip(" '\"")]
+
+
+def normalize_book(raw):
+    """Map one raw dump row onto the catalog fields; other columns go to `extra`."""
+    book = {"extra": {}}
+    used = set()
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            if raw.get(alias) not in (None, ""):
+                book[field] = raw[alias]
+                used.add(alias)
+                break
+    if not book.get("title"):
+        return None
+    book["title"] = str(book["title"]).strip()
+    book["author"] = ", ".join(_split_list(book.get("author")))
+    book["genres"] = _split_list(book.get("genres"))
+    book["description"] = str(book.get("description") or "").strip()
+    book["isbn"] = str(book.get("isbn") or "").strip()
+    book["extra"] = {k: v for k, v in raw.items() if k not in used and v not in (None, "")}
+    return book
+
+
+def book_key(book):
+    """Identity used for updates: ISBN when known, else title + author."""
+    if book.get("isbn"):
+        return f"isbn:{book['isbn']}"
+    return "tk:" + " ".join(tokenize(book["title"])) + "|" + " ".join(tokenize(book.get("author")))
+
+
+def iter_books(path):
+    """Stream books from a CSV/TSV or JSONL file (optionally .gz) without loading it."""
+    opener = gzip.open if path.endswith(".gz") else open
+    name = path[:-3] if path.endswith(".gz") else path
+    with opener(path, "rt", encoding="utf-8", newline="") as f:
+        if name.endswith((".csv", ".tsv")):
+            reader = csv.DictReader(f, delimiter="\t" if name.endswith(".tsv") else ",")
+            rows = reader
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            book = normalize_book(row)
+            if book is not None:
+                yield book
+
+
+def _index_terms(book):
+    # Weighted bag of words plus field-prefixed terms for fielded queries
+    counts = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        value = book.get(field)
+        text = " ".join(value) if isinstance(value, list) else value
+        tokens = tokenize(text)
+        for token in tokens:
+            counts[token] += weight
+        prefix = FIELD_PREFIXES.get(field)
+        if prefix:
+            for token in tokens:
+                counts[f"{prefix}:{token}"] += 1
+    length = sum(c for t, c in counts.items() if ":" not in t)
+    return counts, length
+
+
+def describe(book):
+    """One line per book for tool output."""
+    line = book["title"]
+    if book["author"]:
+        line += f" by {book['author']}"
+    if book["genres"]:
+        line += f" ({', '.join(book['genres'][:3])})"
+    details = ", ".join(f"{k}: {v}" for k, v in list(book["extra"].items())[:6] if not isinstance(v, (dict, list)))
+    return f"- {line} | {details}" if details else f"- {line}"
+
+
+class BookCatalog:
+    """Local book catalog searched with BM25 over an inverted index.
+
+    The index is a list of immutable segments. Each segment is a pair of
+    .npy arrays (doc ids, term frequencies) memory-mapped at search time;
+    the term -> (segment, offset, count) lexicon and the documents live in
+    SQLite. Adding books writes a new segment; a book re-added with the same
+    key (ISBN, else title + author) tombstones its old version, so updates
+    never rebuild the index. compact() merges segments and drops tombstones.
+    """
+
+    def __init__(self, path="book_catalog"):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._segments = {}
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._deleted = np.zeros(0, dtype=bool)
+        self._last_doc = 0
+        self._last_deleted = 0
+        self._n_live = 0
+        self._avgdl = 1.0
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.path, "catalog.sqlite3"), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def after_fork(self):
+        # A forked worker must not reuse the parent's connection
+        self._local = threading.local()
+
+    def _segment_file(self, segment_id, kind):
+        return os.path.join(self.path, f"seg-{segment_id:06d}.{kind}.npy")
+
+    def refresh(self):
+        """Pick up segments, documents and tombstones written since the last call."""
+        conn = self._connect()
+        segment_ids = [row[0] for row in conn.execute("SELECT id FROM segments ORDER BY id")]
+        # Tombstones before documents, so no tombstone can refer to a document not yet loaded
+        deleted = conn.execute(
+            "SELECT seq, doc_id FROM deleted WHERE seq > ? ORDER BY seq", (self._last_deleted,)
+        ).fetchall()
+        docs = conn.execute(
+            "SELECT doc_id, length FROM docs WHERE doc_id > ? ORDER BY doc_id", (self._last_doc,)
+        ).fetchall()
+        with self._lock:
+            if list(self._segments) != segment_ids:
+                self._segments = {
+                    sid: self._segments.get(sid) or (
+                        np.load(self._segment_file(sid, "docs"), mmap_mode="r"),
+                        np.load(self._segment_file(sid, "tfs"), mmap_mode="r"),
+                    )
+                    for sid in segment_ids
+                }
+            if docs:
+                size = docs[-1][0] + 1
+                lengths = np.zeros(size, dtype=np.float32)
+                lengths[:self._lengths.size] = self._lengths
+                removed = np.ones(size, dtype=bool)
+                removed[:self._deleted.size] = self._deleted
+                ids = np.fromiter((d for d, _ in docs), dtype=np.int64, count=len(docs))
+                lengths[ids] = [length for _, length in docs]
+                removed[ids] = False
+                self._lengths, self._deleted = lengths, removed
+                self._last_doc = docs[-1][0]
+            if deleted:
+                self._deleted[[d for _, d in deleted if d < self._deleted.size]] = True
+                self._last_deleted = deleted[-1][0]
+            if docs or deleted:
+                # Corpus statistics used by every BM25 query
+                live = ~self._deleted
+                self._n_live = int(live.sum())
+                self._avgdl = float(self._lengths[live].mean()) if self._n_live else 1.0
+
+    def __len__(self):
+        self.refresh()
+        return self._n_live
+
+    def add_books(self, books, flush_every=FLUSH_EVERY):
+        """Index an iterable of normalized books, one segment per `flush_every` books."""
+        batch = []
+        added = 0
+        for book in books:
+            batch.append(book)
+            if len(batch) >= flush_every:
+                added += self._write_segment(batch)
+                batch = []
+        if batch:
+            added += self._write_segment(batch)
+        self.refresh()
+        return added
+
+    def ingest(self, path, flush_every=FLUSH_EVERY):
+        """Stream a CSV/JSONL dump into the catalog."""
+        return self.add_books(iter_books(path), flush_every)
+
+    def _write_segment(self, books):
+        # Last version of a key within the batch wins
+        latest = {book_key(book): book for book in books}
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            next_id = conn.execute("SELECT COALESCE(MAX(doc_id), 0) + 1 FROM docs").fetchone()[0]
+            segment_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM segments").fetchone()[0]
+            postings = defaultdict(list)
+            doc_rows, live_rows, tombstones = [], [], []
+            for offset, (key, book) in enumerate(latest.items()):
+                doc_id = next_id + offset
+                counts, length = _index_terms(book)
+                for term, tf in counts.items():
+                    postings[term].append((doc_id, tf))
+                doc_rows.append((
+                    doc_id, key, book["title"], book["author"], json.dumps(book["genres"]),
+                    book["description"], json.dumps(book["extra"]), length
+                ))
+                live_rows.append((key, doc_id))
+                old = conn.execute("SELECT doc_id FROM live_docs WHERE key = ?", (key,)).fetchone()
+                if old:
+                    tombstones.append(old)
+
+            doc_ids, tfs, lexicon = [], [], []
+            for term in sorted(postings):
+                entries = postings[term]
+                lexicon.append((term, segment_id, len(doc_ids), len(entries)))
+                doc_ids.extend(d for d, _ in entries)
+                tfs.extend(tf for _, tf in entries)
+            # Files first; the segment only becomes visible when the transaction commits
+            np.save(self._segment_file(segment_id, "docs"), np.asarray(doc_ids, dtype=np.int32))
+            np.save(self._segment_file(segment_id, "tfs"), np.asarray(tfs, dtype=np.float32))
+
+            conn.executemany("INSERT INTO docs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", doc_rows)
+            conn.executemany("INSERT OR REPLACE INTO live_docs VALUES (?, ?)", live_rows)
+            conn.executemany("INSERT OR IGNORE INTO deleted (doc_id) VALUES (?)", tombstones)
+            conn.executemany("INSERT INTO postings VALUES (?, ?, ?, ?)", lexicon)
+            conn.execute("INSERT INTO segments VALUES (?, ?, ?)", (segment_id, len(doc_rows), time.time()))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(doc_rows)
+
+    def remove(self, book):
+        """Tombstone a book (matched by key)."""
+        conn = self._connect()
+        with conn:
+            row = conn.execute("SELECT doc_id FROM live_docs WHERE key = ?", (book_key(book),)).fetchone()
+            if row:
+                conn.execute("INSERT OR IGNORE INTO deleted (doc_id) VALUES (?)", row)
+                conn.execute("DELETE FROM live_docs WHERE key = ?", (book_key(book),))
+        return bool(row)
+
+    def compact(self):
+        """Merge all segments into one and drop tombstoned documents."""
+        conn = self._connect()
+        # Holding the write lock first means no segment can appear mid-merge
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.refresh()
+            old_segments = dict(self._segments)
+            deleted = self._deleted
+            if len(old_segments) < 2 and not conn.execute("SELECT 1 FROM docs JOIN deleted USING (doc_id)").fetchone():
+                conn.execute("ROLLBACK")
+                return
+            segment_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM segments").fetchone()[0]
+            doc_ids, tfs, lexicon = [], [], []
+            offset = 0
+            rows = conn.execute("SELECT term, segment, start, count FROM postings ORDER BY term")
+            for term, group in groupby(rows, key=lambda row: row[0]):
+                blocks = [row[1:] for row in group]
+                ids = np.concatenate([old_segments[s][0][start:start + n] for s, start, n in blocks])
+                freqs = np.concatenate([old_segments[s][1][start:start + n] for s, start, n in blocks])
+                keep = ~deleted[ids]
+                if not keep.any():
+                    continue
+                lexicon.append((term, segment_id, offset, int(keep.sum())))
+                offset += int(keep.sum())
+                doc_ids.append(ids[keep])
+                tfs.append(freqs[keep])
+            np.save(self._segment_file(segment_id, "docs"),
+                    np.concatenate(doc_ids).astype(np.int32) if doc_ids else np.zeros(0, np.int32))
+            np.save(self._segment_file(segment_id, "tfs"),
+                    np.concatenate(tfs).astype(np.float32) if tfs else np.zeros(0, np.float32))
+            conn.execute("DELETE FROM postings")
+            conn.executemany("INSERT INTO postings VALUES (?, ?, ?, ?)", lexicon)
+            conn.execute("DELETE FROM segments")
+            conn.execute("INSERT INTO segments VALUES (?, ?, ?)", (segment_id, int((~deleted).sum()), time.time()))
+            conn.execute("DELETE FROM docs WHERE doc_id IN (SELECT doc_id FROM deleted)")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.refresh()
+        for sid in old_segments:
+            for kind in ("docs", "tfs"):
+                # Open memory maps in other processes stay valid after unlink
+                try:
+                    os.remove(self._segment_file(sid, kind))
+                except OSError:
+                    pass
+
+    def search(self, query, field=None, limit=10):
+        """BM25 search; field restricts matching to "title", "author" or "genre"."""
+        self.refresh()
+        terms = tokenize(query)
+        if field:
+            terms = [f"{field}:{term}" for term in terms]
+        terms = list(dict.fromkeys(terms))
+        if not terms or not self._segments:
+            return []
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT term, segment, start, count FROM postings WHERE term IN ({','.join('?' * len(terms))})",
+            terms
+        ).fetchall()
+        blocks = defaultdict(list)
+        for term, segment, start, count in rows:
+            blocks[term].append((segment, start, count))
+
+        with self._lock:
+            segments, lengths, deleted = self._segments, self._lengths, self._deleted
+            n_docs, avgdl = self._n_live, self._avgdl or 1.0
+        if not n_docs:
+            return []
+        scores = np.zeros(lengths.size, dtype=np.float32)
+        for term, term_blocks in blocks.items():
+            df = sum(count for _, _, count in term_blocks)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for segment, start, count in term_blocks:
+                if segment not in segments:
+                    continue
+                ids = np.asarray(segments[segment][0][start:start + count])
+                tf = np.asarray(segments[segment][1][start:start + count])
+                ids_ok = ids < lengths.size
+                ids, tf = ids[ids_ok], tf[ids_ok]
+                norm = K1 * (1 - B + B * lengths[ids] / avgdl)
+                # A doc appears at most once per term per segment
+                scores[ids] += idf * tf * (K1 + 1) / (tf + norm)
+        candidates = np.flatnonzero(scores)
+        candidates = candidates[~deleted[candidates]]
+        if not candidates.size:
+            return []
+        if candidates.size > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return self.get_books([int(doc_id) for doc_id in candidates], scores)
+
+    def get_books(self, doc_ids, scores=None):
+        """Books by doc id, in the given order; unknown ids are skipped."""
+        if not doc_ids:
+            return []
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT doc_id, title, author, genres, description, extra FROM docs"
+            f" WHERE doc_id IN ({','.join('?' * len(doc_ids))})",
+            doc_ids
+        ).fetchall()
+        by_id = {row[0]: row for row in rows}
+        results = []
+        for doc_id in doc_ids:
+            if doc_id not in by_id:
+                continue
+            _, title, author, genres, description, extra = by_id[doc_id]
+            book = {
+                "doc_id": doc_id,
+                "title": title,
+                "author": author,
+                "genres": json.loads(genres or "[]"),
+                "description": description,
+                "extra": json.loads(extra or "{}"),
+            }
+            if scores is not None:
+                book["score"] = float(scores[doc_id])
+            results.append(book)
+        return results
+
+    def iter_docs(self, after=0, batch_size=1000):
+        """Yield live books with doc_id > after, in doc id order."""
+        self.refresh()
+        conn = self._connect()
+        while True:
+            ids = [row[0] for row in conn.execute(
+                "SELECT doc_id FROM docs WHERE doc_id > ? ORDER BY doc_id LIMIT ?", (after, batch_size)
+            )]
+            if not ids:
+                return
+            after = ids[-1]
+            yield from (book for book in self.get_books(ids) if self.is_live(book["doc_id"]))
+
+    def is_live(self, doc_ids):
+        """True where a doc id is a current (not replaced or removed) book; arrays allowed."""
+        ids = np.asarray(doc_ids)
+        known = ids < self._deleted.size
+        return known & ~self._deleted[np.where(known, ids, 0)]
+
+    def _find_all_words(self, text, field, key, limit):
+        wanted = set(tokenize(text))
+        if not wanted:
+            return []
+        return [
+            book for book in self.search(text, field=field, limit=limit * 3)
+            if wanted <= set(tokenize(" ".join(book[key]) if isinstance(book[key], list) else book[key]))
+        ][:limit]
+
+    def find_title(self, title, limit=3):
+        """Books whose title contains every word of `title`, best match first."""
+        return self._find_all_words(title, "title", "title", limit)
+
+    def find_author(self, name, limit=10):
+        """Books by an author whose name contains every word of `name`."""
+        return self._find_all_words(name, "author", "author", limit)
+
+    def find_genre(self, genre, limit=10):
+        return self._find_all_words(genre, "genre", "genres", limit)
+
+    def get_stats(self):
+        self.refresh()
+        return {
+            "documents": len(self),
+            "segments": len(self._segments),
+            # Replaced or removed books still taking space until compact()
+            "tombstones": self._connect().execute(
+                "SELECT COUNT(*) FROM docs JOIN deleted USING (doc_id)"
+            ).fetchone()[0],
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query the local book catalog.")
+    parser.add_argument("--catalog", default=os.getenv("BOOK_CATALOG_PATH", "book_catalog"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="add or update books from CSV/TSV/JSONL dumps")
+    ingest.add_argument("files", nargs="+")
+    commands.add_parser("compact", help="merge segments and drop replaced books")
+    search = commands.add_parser("search", help="run a BM25 query")
+    search.add_argument("query")
+    search.add_argument("--field", choices=sorted(FIELD_PREFIXES.values()))
+    search.add_argument("--limit", type=int, default=10)
+    commands.add_parser("stats")
+    args = parser.parse_args(argv)
+
+    catalog = BookCatalog(args.catalog)
+    if args.command == "ingest":
+        for path in args.files:
+            started = time.perf_counter()
+            added = catalog.ingest(path)
+            print(f"{path}: {added} books in {time.perf_counter() - started:.1f}s")
+    elif args.command == "compact":
+        catalog.compact()
+    elif args.command == "search":
+        started = time.perf_counter()
+        results = catalog.search(args.query, field=args.field, limit=args.limit)
+        for book in results:
+            print(f"{book['score']:.2f}  {book['title']} - {book['author']}")
+        print(f"{len(results)} results in {(time.perf_counter() - started) * 1000:.1f}ms", file=sys.stderr)
+    print(json.dumps(catalog.get_stats()))
+
+
+if __name__ == "__main__":
+    main()
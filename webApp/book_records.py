@@ -0,0 +1,207 @@
+import os
+import re
+from urllib.parse import urlparse
+
+# Most records handed to the model per tool call
+MAX_RECORDS = int(os.getenv("BOOK_RECORDS_MAX", "6"))
+# Longest snippet kept on a record, in characters
+SNIPPET_CHARS = 160
+
+RETAILERS = {
+    "amazon": "Amazon",
+    "barnesandnoble": "Barnes & Noble",
+    "bookshop": "Bookshop.org",
+    "booksamillion": "Books-A-Million",
+    "waterstones": "Waterstones",
+    "target": "Target",
+    "walmart": "Walmart",
+    "thriftbooks": "ThriftBooks",
+    "abebooks": "AbeBooks",
+    "ebay": "eBay",
+    "apple": "Apple Books",
+    "kobo": "Kobo",
+    "audible": "Audible",
+    "goodreads": "Goodreads",
+    "nytimes": "NY Times",
+    "penguinrandomhouse": "Penguin Random House",
+}
+
+# " - Goodreads", " | Amazon.com", ": Books" and similar site suffixes
+SITE_SUFFIX = re.compile(r"\s*(?:[-|–:]\s*)?(?:" + "|".join(RETAILERS) + r")(?:\.\w+)*\s*$", re.IGNORECASE)
+# "Amazon.com: ", "Amazon.co.uk : " and similar site prefixes
+SITE_PREFIX = re.compile(r"^\s*(?:www\.)?(?:" + "|".join(RETAILERS) + r")(?:\.\w+)+\s*:\s*", re.IGNORECASE)
+TITLE_SEPARATOR = re.compile(r"\s+[|–]\s+|\s+-\s+")
+# Initials ("J. K.") or capitalised names, up to four of them
+AUTHOR = re.compile(r"\bby\s+((?:[A-Z]\.|[A-Z][\w'-]+)(?:\s+(?:[A-Z]\.|[A-Z][\w'-]+)){0,3})")
+# "by Rebecca Yarros" right after a title in a snippet
+AUTHOR_AFTER_TITLE = re.compile(r"\s*(?:\([^)]*\)\s*)?,?\s*" + AUTHOR.pattern)
+# List and category pages ("The 10 Best Books of 2024", "Fantasy Books | Waterstones")
+LISTICLE = re.compile(
+    r"^(?:the\s+)?\d+\s+(?:best|top|great|greatest|most|new|must|essential|popular|books|novels)\b"
+    r"|\b(?:best|top|new|popular|trending|bestselling)\s+(?:[\w-]+\s+){0,2}(?:books|novels|reads)\b"
+    r"|\bbooks\s+(?:of\s+(?:\d{4}|all time|the year)|like|to read)\b"
+    r"|\bbest ?sellers?\b|\breading list\b|\bnew releases\b|^(?:[\w&'-]+\s+){1,2}books$",
+    re.IGNORECASE
+)
+# Amazon titles list "Yarros, Rebecca" next to the ISBN, between colons
+ISBN = re.compile(r"^(?:\d{13}|\d{9}[\dX])$")
+LAST_FIRST = re.compile(r"^([A-Z][\w'-]+(?: [A-Z][\w'-]+)?), ((?:[A-Z]\.|[A-Z][\w'-]+)(?: (?:[A-Z]\.|[A-Z][\w'-]+)){0,2})$")
+PRICE = re.compile(r"(?:[$£€]\s?\d{1,4}(?:[.,]\d{2})?|\d{1,4}[.,]\d{2}\s?(?:USD|GBP|EUR))")
+WHITESPACE = re.compile(r"\s+")
+
+
+def retailer_for(url):
+    """Human name of the site a result came from (its domain if unknown)."""
+    host = urlparse(url or "").netloc.lower()
+    host = host[4:] if host.startswith("www.") else host
+    for key, name in RETAILERS.items():
+        if key in host.split("."):
+            return name
+    return host or None
+
+
+def _has_isbn(title):
+    """True for Amazon's "Title: Subtitle: Author: ISBN" shape."""
+    return any(ISBN.match(part.strip()) for part in title.split(":"))
+
+
+def _isbn_author(title):
+    """"Rebecca Yarros" from Amazon's "Title: 9781649374042: Yarros, Rebecca: Books"."""
+    parts = [part.strip() for part in title.split(":")]
+    for index, part in enumerate(parts):
+        if ISBN.match(part):
+            for neighbour in parts[max(index - 1, 0):index] + parts[index + 1:index + 2]:
+                name = LAST_FIRST.match(neighbour)
+                if name:
+                    return f"{name.group(2)} {name.group(1)}"
+    return None
+
+
+def clean_title(title):
+    title = re.sub(r"\s*:\s*Books?\s*$", "", title.strip(), flags=re.IGNORECASE)
+    title = SITE_SUFFIX.sub("", SITE_PREFIX.sub("", title))
+    # "Tomorrow, and Tomorrow - Gabrielle Zevin" keeps only the first part, and
+    # so does Amazon's "Title: A novel: Author: ISBN"; other subtitles stay
+    title = TITLE_SEPARATOR.split(title)[0]
+    if _has_isbn(title):
+        title = title.split(": ")[0]
+    return title.strip(" :-|")
+
+
+def title_key(title):
+    """Case/punctuation-insensitive key used to merge records of the same book."""
+    title = re.sub(r"^(?:the|a|an)\s+", "", title.lower())
+    title = re.sub(r"\s*\(.*?\)", "", title)
+    return re.sub(r"[^a-z0-9]+", " ", title).strip()
+
+
+def _shorten(text, limit=SNIPPET_CHARS):
+    text = WHITESPACE.sub(" ", text or "").strip()
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + "..."
+
+
+def _snippet_author(title, snippet):
+    start = snippet.lower().find(title.lower())
+    return AUTHOR_AFTER_TITLE.match(snippet, start + len(title)) if start >= 0 else None
+
+
+def extract_record(result):
+    """Turn one search result (title/link/snippet dict) into a book record."""
+    raw_title = result.get("title", "")
+    snippet = result.get("snippet", "")
+    title = clean_title(raw_title)
+    if not title or LISTICLE.search(title):
+        return None
+    book_title = AUTHOR.split(title)[0].strip(" ,:-") or title
+    # Snippets often name other books' authors, so only "<title> by <author>" counts there
+    author = AUTHOR.search(raw_title) or _snippet_author(book_title, snippet)
+    author = author.group(1).strip() if author else _isbn_author(raw_title)
+    price = PRICE.search(snippet) or PRICE.search(raw_title)
+    url = result.get("link")
+    retailer = retailer_for(url)
+    return {
+        "title": book_title,
+        "author": author,
+        "prices": {retailer or "unknown": price.group(0).replace(" ", "")} if price else {},
+        "url": url,
+        "sources": [retailer] if retailer else [],
+        "snippet": _shorten(snippet),
+    }
+
+
+def from_catalog(book):
+    """Book record for a local catalog entry (see book_catalog.BookCatalog)."""
+    extra = book.get("extra") or {}
+    price = extra.get("price")
+    details = [", ".join(book.get("genres") or [])]
+    details += [f"{k}: {v}" for k, v in extra.items() if k not in ("price", "url", "link") and not isinstance(v, (dict, list))]
+    return {
+        "title": book["title"],
+        "author": book.get("author") or None,
+        "prices": {"catalog": str(price)} if price else {},
+        "url": extra.get("url") or extra.get("link"),
+        "sources": ["catalog"],
+        "snippet": _shorten("; ".join(d for d in details if d)),
+    }
+
+
+def merge_records(records):
+    """Merge records describing the same book; keeps first-seen order."""
+    merged = {}
+    for record in records:
+        if record is None:
+            continue
+        key = title_key(record["title"])
+        if not key:
+            continue
+        existing = merged.get(key)
+        if existing is None:
+            merged[key] = dict(record, prices=dict(record["prices"]), sources=list(record["sources"]), hits=1)
+            continue
+        existing["hits"] += 1
+        existing["author"] = existing["author"] or record["author"]
+        for retailer, price in record["prices"].items():
+            existing["prices"].setdefault(retailer, price)
+        for source in record["sources"]:
+            if source not in existing["sources"]:
+                existing["sources"].append(source)
+        if not existing["snippet"]:
+            existing["snippet"] = record["snippet"]
+    return list(merged.values())
+
+
+def rank_records(records, query=""):
+    """Books seen in more results first, then by overlap with the query words."""
+    terms = set(title_key(query).split())
+
+    def score(item):
+        position, record = item
+        words = set(title_key(f"{record['title']} {record['author'] or ''}").split())
+        return (-record["hits"], -len(terms & words), -len(record["prices"]), position)
+
+    return [record for _, record in sorted(enumerate(records), key=score)]
+
+
+def extract_records(results, query="", limit=MAX_RECORDS):
+    """Search results -> merged, ranked and capped list of book records."""
+    records = merge_records(extract_record(result) for result in results or [])
+    return rank_records(records, query)[:limit]
+
+
+def format_records(records):
+    """Dense one-line-per-book text for the model."""
+    lines = []
+    for record in records:
+        line = f"- {record['title']}"
+        if record["author"]:
+            line += f" by {record['author']}"
+        if record["prices"]:
+            line += " | " + ", ".join(f"{retailer} {price}" for retailer, price in record["prices"].items())
+        if record["snippet"]:
+            line += f" | {record['snippet']}"
+        if record["url"]:
+            line += f" <{record['url']}>"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,454 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import closing
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.types import TASKS
+
+# Checkpoints kept per conversation
+CHECKPOINT_KEEP = int(os.getenv("CHECKPOINT_KEEP", "5"))
+# List channels stored one item per row, so a step writes only the items it added
+APPEND_CHANNELS = ("messages",)
+# A list version is rewritten in full once it spans this many earlier versions' rows
+MAX_SEGMENTS = 64
+# Threads whose latest list this process remembers, to diff the next step against
+LIST_CACHE_THREADS = 256
+
+def thread_config(thread_id=None):
+    """Return (thread_id, config) for a conversation, starting a new one if needed."""
+    thread_id = thread_id or str(uuid.uuid4())
+    return thread_id, {"configurable": {"thread_id": thread_id}}
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS list_items (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version, idx)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[str]):
+    """LangGraph checkpointer backed by one SQLite file in WAL mode.
+
+    Channel values are stored per (channel, version), the same layout the
+    in-memory saver uses, so each step only writes the channels it changed.
+    List channels (`append_channels`, the conversation's messages) are stored
+    one item per row instead: a version's blob lists the (run, start, end)
+    row ranges it is made of, and a step that only appends extends the last
+    run, so it writes only the messages it added or changed, however long
+    the conversation. Checkpoint ids sort by time, so
+    the latest checkpoint of a thread is a single primary-key lookup. WAL lets
+    many worker processes read while one writes; every thread gets its own
+    connection.
+
+    Only the newest `keep` checkpoints of a thread are kept (None keeps all),
+    along with the channel versions and writes they still use. The async
+    methods run the SQLite work on a thread so the event loop never blocks.
+    """
+
+    def __init__(self, path="checkpoints.sqlite3", *, serde=None, keep=CHECKPOINT_KEEP,
+                 append_channels=APPEND_CHANNELS):
+        super().__init__(serde=serde)
+        self.path = path
+        self.keep = keep
+        self.append_channels = frozenset(append_channels)
+        self._local = threading.local()
+        # (thread_id, checkpoint_ns, channel) -> (version, items, segments) last read or written
+        self._lists = OrderedDict()
+        self._lists_lock = threading.Lock()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def after_fork(self):
+        # A forked worker must not reuse the parent's connection
+        self._local = threading.local()
+
+    def _load_blobs(self, conn, thread_id, checkpoint_ns, versions):
+        channel_values = {}
+        for channel, version in versions.items():
+            row = conn.execute(
+                "SELECT type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?"
+                " AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version))
+            ).fetchone()
+            if row is None or row[0] == "empty":
+                continue
+            if row[0] == "segments":
+                channel_values[channel] = self._load_list(
+                    conn, (thread_id, checkpoint_ns, channel), str(version), json.loads(row[1])
+                )
+            else:
+                channel_values[channel] = self.serde.loads_typed((row[0], row[1]))
+        return channel_values
+
+    def _remember_list(self, key, version, items, segments, newer_only=False):
+        with self._lists_lock:
+            if newer_only and key in self._lists and self._lists[key][0] > version:
+                return
+            self._lists[key] = (version, list(items), segments)
+            self._lists.move_to_end(key)
+            while len(self._lists) > LIST_CACHE_THREADS:
+                self._lists.popitem(last=False)
+
+    def _load_list(self, conn, key, version, segments):
+        items = []
+        for segment_version, start, end in segments:
+            rows = conn.execute(
+                "SELECT type, blob FROM list_items WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ?"
+                " AND version = ? AND idx >= ? AND idx < ? ORDER BY idx",
+                (*key, segment_version, start, end)
+            ).fetchall()
+            items.extend(self.serde.loads_typed(row) for row in rows)
+        # Reading history must not make an old version the next step's base
+        self._remember_list(key, version, items, segments, newer_only=True)
+        return items
+
+    def _base_list(self, conn, key):
+        # The list this step most likely extends: the one last seen here, else the newest stored
+        with self._lists_lock:
+            base = self._lists.get(key)
+        if base is not None:
+            return base
+        row = conn.execute(
+            "SELECT version, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ?"
+            " AND type = 'segments' ORDER BY version DESC LIMIT 1",
+            key
+        ).fetchone()
+        if row is None:
+            return None, [], []
+        segments = json.loads(row[1])
+        return row[0], self._load_list(conn, key, row[0], segments), segments
+
+    def _put_list(self, conn, key, version, items):
+        """Write the items of a list version that differ from the base list; returns the blob row."""
+        _, base_items, base_segments = self._base_list(conn, key)
+        start, common = 0, min(len(base_items), len(items))
+        while start < common and (base_items[start] is items[start] or base_items[start] == items[start]):
+            start += 1
+        # The unchanged prefix is read from the rows that already hold it
+        segments = [[v, a, min(b, start)] for v, a, b in base_segments if a < start]
+        if len(segments) >= MAX_SEGMENTS:
+            start, segments = 0, []
+        run = version
+        if start < len(items):
+            if segments and segments[-1][2] == start and self._run_end(conn, key, segments[-1][0]) == start:
+                # A plain append continues the last run, so the segment list does not grow
+                run = segments[-1][0]
+                segments[-1] = [run, segments[-1][1], len(items)]
+            else:
+                segments.append([version, start, len(items)])
+        conn.executemany(
+            "INSERT OR REPLACE INTO list_items VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(*key, run, index, *self.serde.dumps_typed(items[index])) for index in range(start, len(items))]
+        )
+        return (*key, version, "segments", json.dumps(segments).encode()), segments
+
+    def _run_end(self, conn, key, run):
+        # Rows past a segment's end belong to another branch, which must not be overwritten
+        end = conn.execute(
+            "SELECT MAX(idx) FROM list_items WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            (*key, run)
+        ).fetchone()[0]
+        return -1 if end is None else end + 1
+
+    def _make_tuple(self, conn, thread_id, checkpoint_ns, row):
+        checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata_type, metadata = row
+        writes = conn.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ?"
+            " AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        sends = []
+        if parent_checkpoint_id:
+            sends = conn.execute(
+                "SELECT type, value FROM writes WHERE thread_id = ? AND checkpoint_ns = ?"
+                " AND checkpoint_id = ? AND channel = ? ORDER BY task_path, task_id, idx",
+                (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS)
+            ).fetchall()
+
+        checkpoint_ = self.serde.loads_typed((type_, checkpoint))
+        return (
+            {
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            {
+                **checkpoint_,
+                "channel_values": self._load_blobs(
+                    conn, thread_id, checkpoint_ns, checkpoint_["channel_versions"]
+                ),
+                "pending_sends": [self.serde.loads_typed(send) for send in sends],
+            },
+            self.serde.loads_typed((metadata_type, metadata)),
+            (
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            [
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        conn = self._connect()
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        if checkpoint_id := get_checkpoint_id(config):
+            row = conn.execute(
+                f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                " AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id)
+            ).fetchone()
+        else:
+            # Only the newest checkpoint is read, however long the thread is
+            row = conn.execute(
+                f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                " ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id, checkpoint_ns)
+            ).fetchone()
+        if row is None:
+            return None
+        return CheckpointTuple(*self._make_tuple(conn, thread_id, checkpoint_ns, row))
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type,"
+            " checkpoint, metadata_type, metadata FROM checkpoints"
+        )
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        conn = self._connect()
+        with closing(conn.execute(query, params)) as cursor:
+            rows = cursor.fetchall()
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+            item = CheckpointTuple(*self._make_tuple(conn, thread_id, checkpoint_ns, row))
+            if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield item
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        c = checkpoint.copy()
+        c.pop("pending_sends", None)
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        values = c.pop("channel_values")
+        conn = self._connect()
+        lists = []
+        with conn:
+            # Only channels whose version moved in this step are written
+            rows = []
+            for channel, version in new_versions.items():
+                value = values.get(channel)
+                if channel in self.append_channels and isinstance(value, list):
+                    key = (thread_id, checkpoint_ns, channel)
+                    row, segments = self._put_list(conn, key, str(version), value)
+                    lists.append((key, str(version), value, segments))
+                    rows.append(row)
+                elif channel in values:
+                    rows.append((thread_id, checkpoint_ns, channel, str(version), *self.serde.dumps_typed(value)))
+                else:
+                    rows.append((thread_id, checkpoint_ns, channel, str(version), "empty", b""))
+            conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    *self.serde.dumps_typed(c),
+                    *self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+                )
+            )
+            if self.keep:
+                self._prune(conn, thread_id, checkpoint_ns)
+        # Only once committed is a list the base for the next step's diff
+        for key, version, items, segments in lists:
+            self._remember_list(key, version, items, segments)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def _prune(self, conn, thread_id, checkpoint_ns):
+        """Drop checkpoints older than the newest `keep` and what only they used."""
+        key = (thread_id, checkpoint_ns)
+        oldest = conn.execute(
+            "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint FROM checkpoints"
+            " WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (*key, self.keep - 1)
+        ).fetchone()
+        if oldest is None:
+            return
+        oldest_id, parent_id, type_, checkpoint = oldest
+        conn.execute(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+            (*key, oldest_id)
+        )
+        # The oldest kept checkpoint still reads its parent's pending sends
+        conn.execute(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+            (*key, parent_id or oldest_id)
+        )
+        # Versions only grow, so everything below the oldest kept checkpoint's
+        # version of a channel is unreachable
+        versions = self.serde.loads_typed((type_, checkpoint))["channel_versions"]
+        conn.executemany(
+            "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version < ?",
+            [(*key, channel, str(version)) for channel, version in versions.items()]
+        )
+        # List rows stay while a remaining version's segments still read them
+        used = {
+            (channel, segment[0])
+            for channel, blob in conn.execute(
+                "SELECT channel, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND type = 'segments'", key
+            )
+            for segment in json.loads(blob)
+        }
+        stored = conn.execute(
+            "SELECT DISTINCT channel, version FROM list_items WHERE thread_id = ? AND checkpoint_ns = ?", key
+        ).fetchall()
+        conn.executemany(
+            "DELETE FROM list_items WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            [(*key, channel, version) for channel, version in stored if (channel, version) not in used]
+        )
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = [
+            (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+             channel, *self.serde.dumps_typed(value), task_path)
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        conn = self._connect()
+        with conn:
+            # Special writes (errors, interrupts) overwrite; regular writes are kept once
+            conn.executemany(
+                "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row for row in rows if row[4] < 0]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row for row in rows if row[4] >= 0]
+            )
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    def get_next_version(self, current, channel):
+        # Same version format as the in-memory saver: zero-padded counter + random suffix
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
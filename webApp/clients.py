@@ -0,0 +1,138 @@
+"""Per-process clients shared by every agent in a process: the chat models, one
+search client and one catalog, each built on first use.
+
+The standalone agents in the repository root import this module from webApp/
+too, so they and the web apps share the same instances in one server.
+"""
+import functools
+import logging
+import os
+import threading
+import time
+
+import transport
+
+logger = logging.getLogger(__name__)
+
+
+class per_process:
+    """Decorator: build the object on first call and reuse it in this process.
+
+    Clients, indexes and compiled graphs are created lazily so importing an
+    agent stays cheap; preload() functions build them before workers fork.
+    set() swaps in a replacement (e.g. a fake model) before first use.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        # __name__, __doc__, ... of the factory, so accessors can stand in for one another
+        functools.update_wrapper(self, factory)
+        self._value = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    started = time.perf_counter()
+                    self._value = self.factory()
+                    logger.info(f"{self.factory.__module__}.{self.factory.__name__}() built in {time.perf_counter() - started:.2f}s")
+        return self._value
+
+    def set(self, value):
+        self._value = value
+
+    def peek(self):
+        """The object if it has been built, else None (without building it)."""
+        return self._value
+
+
+def lazy_graph(get_graph):
+    """Module-level __getattr__ that compiles the module's `graph` on first access.
+
+    langgraph.json and the examples read `<agent module>.graph`; assigning
+    `__getattr__ = lazy_graph(get_graph)` keeps importing the module cheap.
+    """
+    def __getattr__(name):
+        if name == "graph":
+            return get_graph()
+        raise AttributeError(f"module {get_graph.__module__!r} has no attribute {name!r}")
+    return __getattr__
+
+
+def chat_model(name):
+    """ChatOpenAI on the shared, retrying OpenAI transport."""
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=name,
+        temperature=0,
+        http_client=transport.get_client("openai"),
+        http_async_client=transport.get_async_client("openai"),
+        timeout=transport.timeout_for("openai"),
+        # Retries happen in the transport, where the circuit breaker sees them
+        max_retries=0
+    )
+
+
+@per_process
+def get_model():
+    """Initialize the main language model (OPENAI_MODEL)."""
+    return chat_model(os.getenv("OPENAI_MODEL", "gpt-4"))
+
+
+@per_process
+def get_router_model():
+    """Small, fast model for the tool-selecting steps (ROUTER_MODEL, e.g. gpt-4o-mini).
+
+    Without ROUTER_MODEL it is the main model, which turns tiering off.
+    """
+    name = os.getenv("ROUTER_MODEL")
+    return chat_model(name) if name else get_model()
+
+
+@per_process
+def get_agent_model():
+    """Model the agents' graphs run: tiered (model_tiers.py) when a router model is set."""
+    router, answerer = get_router_model(), get_model()
+    if router is answerer:
+        return answerer
+    from model_tiers import TieredChatModel
+    return TieredChatModel(router, answerer)
+
+
+@per_process
+def get_search_wrapper():
+    """Google Custom Search client."""
+    # langchain_google_community imports every Google integration; load it on first search
+    try:
+        from langchain_google_community import GoogleSearchAPIWrapper
+    except ImportError:
+        from langchain_community.utilities import GoogleSearchAPIWrapper
+    return GoogleSearchAPIWrapper(
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+        google_cse_id=os.getenv("GOOGLE_CSE_ID")
+    )
+
+
+@per_process
+def get_search():
+    """Google Search behind the search cache, the one client every agent's tools call,
+    so repeated queries skip the CSE round trip."""
+    from metrics import register_stats
+    from search_cache import CachedSearch, SearchCache
+    search = CachedSearch(wrapper_factory=get_search_wrapper,
+                          cache=SearchCache(path=os.getenv("SEARCH_CACHE_PATH", "search_cache.sqlite3")))
+    # Cache effectiveness on /metrics
+    register_stats("search_cache", search.cache.get_stats,
+                   {"hits": "counter", "misses": "counter", "negative_hits": "counter", "stale_hits": "counter",
+                    "evictions": "counter", "purged": "counter", "size": "gauge"})
+    register_stats("search_singleflight", search.flights.get_stats,
+                   {"calls": "counter", "coalesced": "counter", "in_flight": "gauge"})
+    return search
+
+
+@per_process
+def get_catalog():
+    """Local catalog (python book_catalog.py ingest <dump>)."""
+    from book_catalog import BookCatalog
+    return BookCatalog(os.getenv("BOOK_CATALOG_PATH", "book_catalog"))
@@ -0,0 +1,61 @@
+import pytest
+
+# Every file the agents and caches write, by the variable that names it
+DATA_PATHS = {
+    "SEARCH_CACHE_PATH": "search_cache.sqlite3",
+    "ANSWER_CACHE_PATH": "answer_cache.sqlite3",
+    "CHECKPOINT_DB_PATH": "checkpoints.sqlite3",
+    "BOOK_CATALOG_PATH": "book_catalog",
+    "REFRESH_CACHE_PATH": "refresh_cache.sqlite3",
+}
+
+BOOK_RESULTS = [
+    {"title": "Fourth Wing (The Empyrean, #1) by Rebecca Yarros | Goodreads",
+     "link": "https://www.goodreads.com/book/show/61431922-fourth-wing",
+     "snippet": "Fourth Wing by Rebecca Yarros, $17.99"},
+]
+
+
+@pytest.fixture(autouse=True)
+def data_paths(tmp_path, monkeypatch):
+    """Point every cache, catalog and checkpoint file at tmp_path so no test writes into the tree."""
+    for var, name in DATA_PATHS.items():
+        monkeypatch.setenv(var, str(tmp_path / name))
+    return tmp_path
+
+
+@pytest.fixture
+def fake_agent(monkeypatch):
+    """book_agent with a scripted model that calls search_trending_books once and
+    canned search results; data_paths keeps every SQLite file under tmp_path."""
+    import book_agent
+    import clients
+    from book_records import extract_records
+    from loadtest import FAKE_ANSWER, make_fake_model
+    from translation import PhraseTableBackend
+
+    monkeypatch.delenv("ROUTER_MODEL", raising=False)
+
+    accessors = [clients.get_model, clients.get_router_model, clients.get_agent_model,
+                 book_agent.get_graph, book_agent.get_checkpointer, book_agent.get_answer_cache,
+                 book_agent.get_refresher, clients.get_catalog, book_agent.get_similarity_index]
+    built = [accessor.peek() for accessor in accessors]
+    for accessor in accessors:
+        accessor.set(None)
+    clients.get_model.set(make_fake_model(0, tool_script=[("search_trending_books", {"query": "fantasy"})]))
+
+    searches = []
+
+    def find_books(search_query, tool_name):
+        searches.append(search_query)
+        return extract_records(BOOK_RESULTS, search_query)
+
+    async def afind_books(search_query, tool_name):
+        return find_books(search_query, tool_name)
+
+    monkeypatch.setattr(book_agent, "find_books", find_books)
+    monkeypatch.setattr(book_agent, "afind_books", afind_books)
+    monkeypatch.setattr(book_agent.translator, "_backend", PhraseTableBackend({"fr": {FAKE_ANSWER: "Voici les livres"}}))
+    yield searches
+    for accessor, value in zip(accessors, built):
+        accessor.set(value)
@@ -0,0 +1,77 @@
+import contextvars
+import logging
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# Shared pool so a slow source never blocks the caller on executor shutdown
+MAX_WORKERS = int(os.getenv("FANOUT_MAX_WORKERS", "16"))
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="fanout")
+
+
+def fan_out(func, args_list, max_concurrency=4, deadline=5.0, names=None):
+    """Call func(*args) for every args tuple concurrently.
+
+    At most max_concurrency calls are in flight at once and every call must
+    finish within `deadline` seconds of being started. Returns a list aligned
+    with args_list where late or failed calls are None, so callers can use
+    whatever partial result arrived in time. `names` labels the calls in the
+    warnings logged for failures and missed deadlines.
+
+    A call past its deadline cannot be stopped: its result is dropped, but it
+    keeps its concurrency slot until its pool thread returns, so one fan-out
+    never holds more than max_concurrency threads. Calls that still have no
+    slot once every call could have used its full deadline are skipped.
+    """
+    names = names or [repr(args) for args in args_list]
+    results = [None] * len(args_list)
+    pending = {}
+    abandoned = set()
+    queue = list(enumerate(args_list))
+    started = {}
+    give_up_at = time.monotonic() + deadline * math.ceil(len(args_list) / max_concurrency)
+
+    while queue or pending:
+        while queue and len(pending) + len(abandoned) < max_concurrency:
+            index, args = queue.pop(0)
+            # Each call gets a copy of the context so request tracing follows it
+            context = contextvars.copy_context()
+            future = _executor.submit(context.run, func, *args)
+            pending[future] = index
+            started[future] = time.monotonic()
+
+        now = time.monotonic()
+        if pending:
+            timeout = max(0.0, min(started[f] + deadline for f in pending) - now)
+        elif now < give_up_at:
+            # Every slot is held by an abandoned call; wait for one to return
+            timeout = give_up_at - now
+        else:
+            break
+        done, _ = wait(set(pending) | abandoned, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        abandoned -= done
+        for future in done:
+            if future not in pending:
+                continue
+            index = pending.pop(future)
+            error = future.exception()
+            if error is None:
+                results[index] = future.result()
+            else:
+                logger.warning(f"{names[index]} failed: {error!r}")
+
+        # Give up on anything past its deadline
+        now = time.monotonic()
+        for future in [f for f in pending if started[f] + deadline <= now]:
+            index = pending.pop(future)
+            if not future.cancel():
+                abandoned.add(future)
+            logger.warning(f"{names[index]} did not finish within {deadline:g}s")
+
+    for index, _ in queue:
+        logger.warning(f"{names[index]} skipped: no free slot within {deadline:g}s per call")
+    return results
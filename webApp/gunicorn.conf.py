@@ -0,0 +1,15 @@
+# gunicorn --config gunicorn.conf.py app:app
+# The app (and with it the compiled graph, caches and indexes) is loaded once in
+# the master and shared copy-on-write by every forked worker, so adding workers
+# does not repeat the startup work. book_agent reopens its SQLite connections
+# in each child after the fork.
+import os
+
+preload_app = True
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+timeout = 300
+
+
+def on_starting(server):
+    import book_agent
+    book_agent.preload()
@@ -0,0 +1,65 @@
+"""Reply-language handling shared by the agents and the web apps.
+
+The agents' system prompts ask for every answer in several languages at once.
+A request can instead name one language ("language": "en" on /query); the
+graph then writes only that language, and other languages are translated on
+demand.
+"""
+from langchain_core.messages import SystemMessage
+
+# Codes are the ones the translation backends use
+LANGUAGES = {"ny": "Chichewa", "en": "English", "fr": "French"}
+
+
+def normalize_language(value):
+    """Language code for a request's "language" value (a code or a name), None if not given.
+
+    Raises ValueError for languages the agents do not support.
+    """
+    if not value:
+        return None
+    value = str(value).strip().lower()
+    for code, name in LANGUAGES.items():
+        if value in (code, name.lower()):
+            return code
+    raise ValueError(f"Unsupported language '{value}'; use one of {', '.join(LANGUAGES)}")
+
+
+def set_language(config, language):
+    """Ask the graph run with `config` to reply in `language` only (None keeps every language)."""
+    if language:
+        config.setdefault("configurable", {})["language"] = language
+    return config
+
+
+def requested_language(config):
+    return ((config or {}).get("configurable") or {}).get("language")
+
+
+def single_language_prompt(system_prompt, language):
+    """The system prompt with its multilingual preamble replaced by `language` only.
+
+    The agents' prompts open with the reply-language rules and an example, up
+    to the first blank line; the rest describes the task and is kept.
+    """
+    _, _, task = system_prompt.strip("\n").partition("\n\n")
+    return (f"You are a helpful bot, which only replies in {LANGUAGES[language]}.\n"
+            f"Do not add translations into other languages.\n\n{task}\n")
+
+
+def system_messages(system_prompt):
+    """{language code or None: SystemMessage}, built once per prompt."""
+    messages = {None: SystemMessage(content=system_prompt)}
+    for code in LANGUAGES:
+        messages[code] = SystemMessage(content=single_language_prompt(system_prompt, code))
+    return messages
+
+
+def language_prompt(system_prompt):
+    """create_react_agent prompt that follows the request's language (see set_language)."""
+    messages = system_messages(system_prompt)
+
+    def prompt(state, config):
+        return [messages.get(requested_language(config), messages[None])] + state["messages"]
+
+    return prompt
@@ -0,0 +1,366 @@
+"""Offline load test for the Flask /query endpoints.
+
+The real Flask app and LangGraph agent are driven by a concurrent load
+generator. The chat model and Google search are replaced by scripted fakes
+with configurable latency, so no API keys or network access are needed:
+
+    python loadtest.py --app app2.py --concurrency 16 --requests 400
+    python loadtest.py --app ../app.py --endpoint /query/stream --model-latency 0.2
+    python loadtest.py --compare loadtest-results/baseline.json
+    python loadtest.py --router-latency 0.01       # tiered: fast fake router, slower main model
+
+Results (throughput, latency percentiles, error rate, memory growth) are
+printed and saved as JSON for comparison between commits.
+"""
+import argparse
+import asyncio
+import importlib.util
+import itertools
+import json
+import logging
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+QUESTIONS = [
+    "What trending books are available?",
+    "Is Tomorrow, and Tomorrow, and Tomorrow available?",
+    "Recommend some fantasy books",
+    "Which books are good for a book club?",
+    "Tell me about Gabrielle Zevin",
+    "Muli ndi mabuku ati atsopano?",
+]
+
+# (tool name, args) the fake model calls, picked by question
+TOOL_SCRIPT = [
+    ("get_all_available_books", {}),
+    ("check_book_availability", {"book_title": "Tomorrow, and Tomorrow, and Tomorrow"}),
+    ("search_books_by_genre", {"genre": "fantasy"}),
+    ("get_book_club_suggestions", {}),
+    ("get_author_info", {"author_name": "Gabrielle Zevin"}),
+    ("search_trending_books", {"query": "new releases"}),
+]
+
+# What the fake model answers once its tool has run
+FAKE_ANSWER = "Chichewa: Nawa mabuku omwe alipo\nEnglish: Here are the books I found"
+
+
+def make_fake_model(latency=0.05, tool_script=TOOL_SCRIPT):
+    """Chat model that calls one tool per question, then answers."""
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    class ScriptedChatModel(BaseChatModel):
+        latency: float = 0.05
+
+        @property
+        def _llm_type(self):
+            return "scripted-fake"
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _reply(self, messages):
+            prompt_tokens = sum(len(str(m.content)) // 4 for m in messages)
+            usage = {"input_tokens": prompt_tokens, "output_tokens": 20, "total_tokens": prompt_tokens + 20}
+            if messages[-1].type == "tool":
+                return AIMessage(content=FAKE_ANSWER, usage_metadata=usage)
+            question = next((m.content for m in reversed(messages) if m.type == "human"), "")
+            name, args = tool_script[sum(map(ord, question)) % len(tool_script)]
+            call_id = f"call_{len(messages)}_{abs(hash(question)) % 10 ** 8}"
+            return AIMessage(content="", tool_calls=[{"id": call_id, "name": name, "args": args}], usage_metadata=usage)
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            time.sleep(self.latency)
+            return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            await asyncio.sleep(self.latency)
+            return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    return ScriptedChatModel(latency=latency)
+
+
+class FakeSearchWrapper:
+    """Stands in for GoogleSearchAPIWrapper and the Custom Search API behind it.
+
+    handle() answers CSE requests with fixed, realistic-looking results; it is
+    mounted with httpx.MockTransport so the pooled, retrying transport is exercised.
+    """
+
+    k = 10
+    google_api_key = "fake"
+    google_cse_id = "fake"
+    siterestrict = False
+
+    def __init__(self, latency=0.1):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def handle(self, request):
+        import httpx
+
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        query = request.url.params["q"]
+        num = int(request.url.params.get("num", self.k))
+        items = [
+            {"title": f"{title} by {author} | {site}", "link": f"https://www.{site.lower()}.com/{i}", "snippet": f"{title} by {author}, ${i + 10}.99"}
+            for i, (title, author, site) in enumerate(self._books(query)[:num])
+        ]
+        return httpx.Response(200, json={"items": items})
+
+    @staticmethod
+    def _books(query):
+        words = [w for w in query.split() if w.isalpha()][:2] or ["Book"]
+        return [
+            (f"{' '.join(words).title()} Volume {i}", f"Author {i % 4}", ("Amazon", "Goodreads", "Bookshop")[i % 3])
+            for i in range(10)
+        ]
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def load_app(path, model_latency, search_latency, answer_cache=False, router_latency=None):
+    """Import a Flask app module with the fakes swapped into book_agent."""
+    sys.path.insert(0, HERE)
+    # Everything the agent persists goes to a throwaway directory
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    for var, name in [("SEARCH_CACHE_PATH", "search_cache.sqlite3"), ("ANSWER_CACHE_PATH", "answer_cache.sqlite3"),
+                      ("CHECKPOINT_DB_PATH", "checkpoints.sqlite3"), ("BOOK_CATALOG_PATH", "book_catalog"),
+                      ("REFRESH_CACHE_PATH", "refresh_cache.sqlite3")]:
+        os.environ[var] = os.path.join(workdir, name)
+    for var in ("OPENAI_API_KEY", "GOOGLE_API_KEY", "GOOGLE_CSE_ID"):
+        os.environ.setdefault(var, "fake")
+
+    import httpx
+    import transport
+    import book_agent
+    from clients import get_model, get_router_model
+
+    wrapper = FakeSearchWrapper(search_latency)
+    book_agent.get_search().wrapper = wrapper
+    transport.use_transport("google_cse", httpx.MockTransport(wrapper.handle))
+    # The graph is built lazily, so it picks up the fake model; build it before timing starts
+    get_model.set(make_fake_model(model_latency))
+    if router_latency is not None:
+        # A second fake as the router model turns on model tiering
+        get_router_model.set(make_fake_model(router_latency))
+    book_agent.get_graph()
+    if not answer_cache:
+        book_agent.get_answer_cache().threshold = 2.0
+
+    spec = importlib.util.spec_from_file_location("loadtest_target_app", os.path.abspath(path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app, wrapper
+
+
+def run_load(app, endpoint, concurrency, total_requests, duration, questions, warmup):
+    """Send requests from `concurrency` threads; returns per-request samples."""
+    from werkzeug.serving import make_server
+    import httpx
+
+    # Per-request access logs would dominate the output
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}{endpoint}"
+
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration if duration else None
+    samples = []
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        with httpx.Client(timeout=60) as client:
+            while True:
+                n = next(counter)
+                if (total_requests and n >= total_requests + warmup) or (deadline and time.perf_counter() > deadline):
+                    return
+                payload = {"message": questions[n % len(questions)]}
+                started = time.perf_counter()
+                try:
+                    response = client.post(url, json=payload)
+                    ok = response.status_code == 200 and (
+                        endpoint.endswith("/stream") and "event: done" in response.text
+                        or not endpoint.endswith("/stream") and "error" not in response.json()
+                    )
+                    error = None if ok else f"HTTP {response.status_code}: {response.text[:200]}"
+                except Exception as e:
+                    error = str(e)
+                elapsed = time.perf_counter() - started
+                if n >= warmup:
+                    with lock:
+                        samples.append({"latency": elapsed, "error": error, "finished": time.perf_counter()})
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+    finally:
+        server.shutdown()
+    return samples
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+def summarize(samples, elapsed, rss_before, rss_peak, rss_after):
+    latencies = [s["latency"] * 1000 for s in samples if s["error"] is None]
+    errors = [s["error"] for s in samples if s["error"] is not None]
+    return {
+        "requests": len(samples),
+        "errors": len(errors),
+        "error_rate": len(errors) / len(samples) if samples else 0.0,
+        "throughput_rps": len(samples) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": statistics.fmean(latencies) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else None,
+        },
+        "memory_mb": {
+            "rss_before": rss_before,
+            "rss_peak": rss_peak,
+            "rss_after": rss_after,
+            "growth": rss_after - rss_before,
+        },
+        "sample_errors": sorted(set(errors))[:5],
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    """Print how the key numbers moved against a saved baseline."""
+    rows = [
+        ("throughput_rps", current["throughput_rps"], baseline["throughput_rps"]),
+        ("error_rate", current["error_rate"], baseline["error_rate"]),
+        ("memory growth MB", current["memory_mb"]["growth"], baseline["memory_mb"]["growth"]),
+    ] + [
+        (f"latency {key} ms", current["latency_ms"][key], baseline["latency_ms"][key])
+        for key in ("p50", "p95", "p99")
+    ]
+    print(f"\nvs baseline {baseline.get('revision')} ({baseline.get('timestamp')}):")
+    for name, now, before in rows:
+        if now is None or before is None:
+            continue
+        change = f"{(now - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"  {name:<18} {before:>10.2f} -> {now:>10.2f}  ({change})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default=os.path.join(HERE, "app2.py"), help="Flask app file (default: app2.py)")
+    parser.add_argument("--endpoint", default="/query", choices=["/query", "/query/stream"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="total requests (0 = use --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="seconds to run instead of a request count")
+    parser.add_argument("--warmup", type=int, default=5, help="requests excluded from the results")
+    parser.add_argument("--model-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--router-latency", type=float, help="seconds per fake router model call (enables model tiering)")
+    parser.add_argument("--search-latency", type=float, default=0.1, help="seconds per fake search call")
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="keep the semantic answer cache on (off by default so every request runs the agent)")
+    parser.add_argument("--output", help="result file (default: loadtest-results/<time>-<revision>.json)")
+    parser.add_argument("--compare", help="baseline result file to compare against")
+    args = parser.parse_args(argv)
+
+    app, wrapper = load_app(args.app, args.model_latency, args.search_latency, args.answer_cache, args.router_latency)
+
+    rss_before = rss_mb()
+    rss_peak = rss_before
+    sampling = threading.Event()
+
+    def sample_memory():
+        nonlocal rss_peak
+        while not sampling.wait(0.2):
+            rss_peak = max(rss_peak, rss_mb())
+
+    threading.Thread(target=sample_memory, daemon=True).start()
+    started = time.perf_counter()
+    samples = run_load(app, args.endpoint, args.concurrency, args.requests, args.duration, QUESTIONS, args.warmup)
+    elapsed = time.perf_counter() - started
+    sampling.set()
+    rss_after = rss_mb()
+
+    if samples:
+        # Warmup requests are excluded, so measure from the first counted request
+        elapsed = max(s["finished"] for s in samples) - min(s["finished"] - s["latency"] for s in samples)
+    result = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "config": {
+            "app": os.path.relpath(os.path.abspath(args.app), HERE),
+            "endpoint": args.endpoint,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "duration": args.duration,
+            "model_latency": args.model_latency,
+            "router_latency": args.router_latency,
+            "search_latency": args.search_latency,
+            "answer_cache": args.answer_cache,
+        },
+        **summarize(samples, elapsed, rss_before, max(rss_peak, rss_after), rss_after),
+        "search_calls": wrapper.calls,
+    }
+
+    output = args.output or os.path.join(
+        "loadtest-results", f"{time.strftime('%Y%m%d-%H%M%S')}-{result['revision'] or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+
+    latency = result["latency_ms"]
+    print(f"{result['requests']} requests, {result['errors']} errors ({result['error_rate']:.1%}), "
+          f"{result['throughput_rps']:.1f} req/s")
+    if latency["p50"] is not None:
+        print(f"latency ms: p50 {latency['p50']:.1f}  p95 {latency['p95']:.1f}  p99 {latency['p99']:.1f}")
+    print(f"memory MB: {rss_before:.1f} -> {rss_after:.1f} (peak {result['memory_mb']['rss_peak']:.1f})")
+    for error in result["sample_errors"]:
+        print(f"error: {error}")
+    print(f"saved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
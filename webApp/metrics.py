@@ -0,0 +1,382 @@
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger("trace")
+
+# TRACE_LOG=1 logs one JSON trace per request; TRACE_LOG=<path> appends them to a file
+TRACE_LOG = os.getenv("TRACE_LOG", "")
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+class Registry:
+    """In-process counters and histograms rendered in Prometheus text format.
+
+    Each worker process keeps its own numbers; scrape every worker (or run
+    one) to get the full picture.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def register_collector(self, collector):
+        """collector() returns [(name, kind, help, labels dict, value)], read at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        seen = set()
+
+        def header(name, kind, help_text):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, ([*h[0]], h[1], h[2])) for key, h in self._histograms.items())
+        for (name, labels), value in counters:
+            header(name, "counter", self._help.get(name, ("", name))[1])
+            lines.append(f"{name}{_label_text(labels)} {value}")
+        for (name, labels), (counts, total, count) in histograms:
+            header(name, "histogram", self._help.get(name, ("", name))[1])
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_label_text(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_bucket{_label_text(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_label_text(labels)} {total}")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+        for collector in self._collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, kind, help_text, labels, value in samples:
+                header(name, kind, help_text)
+                lines.append(f"{name}{_label_text(tuple(sorted(labels.items())))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.describe("http_requests_total", "counter", "HTTP requests by endpoint and status")
+registry.describe("http_request_duration_seconds", "histogram", "Time to handle an HTTP request")
+registry.describe("agent_node_duration_seconds", "histogram", "Time spent in each LangGraph node")
+registry.describe("llm_call_duration_seconds", "histogram", "Chat model call latency")
+registry.describe("tool_call_duration_seconds", "histogram", "Tool invocation latency")
+registry.describe("tool_calls_total", "counter", "Tool invocations by tool and status")
+registry.describe("translation_duration_seconds", "histogram", "Translation batch latency")
+registry.describe("llm_tokens_total", "counter", "Tokens sent to and generated by the chat model")
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def new_request_id(header_value=None):
+    return header_value or uuid.uuid4().hex[:16]
+
+
+class RequestTrace(BaseCallbackHandler):
+    """Timing spans for one request: graph nodes, LLM calls, tools and manual spans.
+
+    Pass it in config["callbacks"]; every span feeds the registry histograms
+    and, when TRACE_LOG is set, the JSON trace written by finish().
+    """
+
+    def __init__(self, request_id=None, endpoint=None):
+        self.request_id = new_request_id(request_id)
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.spans = []
+        # Token usage summary (token_budget.TokenUsageTracker) set by the handler
+        self.usage = None
+        self._open = {}
+        self._lock = threading.Lock()
+        self._token = None
+
+    def activate(self):
+        """Make this the trace that span() records into (for this thread/task)."""
+        self._token = _current_trace.set(self)
+        return self
+
+    def _start(self, run_id, kind, name, parent_run_id=None):
+        with self._lock:
+            self._open[run_id] = (kind, name, time.perf_counter(), parent_run_id)
+
+    def _end(self, run_id, status="ok", **attributes):
+        ended = time.perf_counter()
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+        if opened is None:
+            return None
+        kind, name, started, parent_run_id = opened
+        self.record(kind, name, started, ended, status, str(run_id), str(parent_run_id) if parent_run_id else None, **attributes)
+        return ended - started
+
+    def record(self, kind, name, started, ended, status="ok", span_id=None, parent_id=None, **attributes):
+        duration = ended - started
+        if kind == "node":
+            registry.observe("agent_node_duration_seconds", duration, node=name)
+        elif kind == "llm":
+            registry.observe("llm_call_duration_seconds", duration, model=name)
+        elif kind == "tool":
+            registry.observe("tool_call_duration_seconds", duration, tool=name)
+            registry.inc("tool_calls_total", tool=name, status=status)
+        elif kind == "translation":
+            registry.observe("translation_duration_seconds", duration)
+        if TRACE_LOG:
+            span = {
+                "kind": kind,
+                "name": name,
+                "start_ms": round((started - self.started) * 1000, 2),
+                "duration_ms": round(duration * 1000, 2),
+                "status": status,
+                "id": span_id,
+                "parent_id": parent_id,
+            }
+            span.update(attributes)
+            with self._lock:
+                self.spans.append(span)
+
+    # LangChain callbacks
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Only the node runnables themselves, not the chains nested inside them
+        if node and kwargs.get("name") == node:
+            self._start(run_id, "node", node, parent_run_id)
+        elif parent_run_id is None:
+            self._start(run_id, "graph", kwargs.get("name") or "graph", parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, status="error", error=str(error))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        model = ((kwargs.get("invocation_params") or {}).get("model_name")
+                 or (kwargs.get("invocation_params") or {}).get("model")
+                 or (kwargs.get("metadata") or {}).get("ls_model_name")
+                 or "chat_model")
+        self._start(run_id, "llm", model, parent_run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        message = getattr(response.generations[0][0], "message", None) if response.generations else None
+        usage = getattr(message, "usage_metadata", None) or {}
+        self._end(run_id, input_tokens=usage.get("input_tokens"), output_tokens=usage.get("output_tokens"))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, status="error", error=str(error))
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, "tool", (serialized or {}).get("name") or kwargs.get("name", "tool"), parent_run_id)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, status="error", error=str(error))
+
+    def finish(self, status="ok", usage=None):
+        """Close the request: request metrics, token counters and the JSON trace log."""
+        usage = usage or self.usage
+        duration = time.perf_counter() - self.started
+        if self._token is not None:
+            try:
+                _current_trace.reset(self._token)
+            except ValueError:
+                # Reset from a different context (e.g. a finished stream)
+                _current_trace.set(None)
+            self._token = None
+        if self.endpoint:
+            registry.inc("http_requests_total", endpoint=self.endpoint, status=status)
+            registry.observe("http_request_duration_seconds", duration, endpoint=self.endpoint)
+        if usage:
+            registry.inc("llm_tokens_total", usage.get("prompt_tokens", 0), type="prompt")
+            registry.inc("llm_tokens_total", usage.get("completion_tokens", 0), type="completion")
+        if TRACE_LOG:
+            write_trace({
+                "request_id": self.request_id,
+                "endpoint": self.endpoint,
+                "status": status,
+                "duration_ms": round(duration * 1000, 2),
+                "usage": usage,
+                "spans": sorted(self.spans, key=lambda span: span["start_ms"]),
+            })
+        return duration
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def span(kind, name, **attributes):
+    """Time a block of code as a span of the current request (metrics only outside one)."""
+    trace = current_trace()
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        ended = time.perf_counter()
+        if trace is not None:
+            trace.record(kind, name, started, ended, status, **attributes)
+        elif kind == "translation":
+            registry.observe("translation_duration_seconds", ended - started)
+
+
+def register_stats(prefix, get_stats, kinds):
+    """Expose numeric entries of a get_stats() dict, e.g. cache hit counts.
+
+    kinds maps stat name -> "counter" or "gauge"; counters get a _total suffix.
+    """
+    def collect():
+        stats = get_stats()
+        return [
+            (f"{prefix}_{key}_total" if kind == "counter" else f"{prefix}_{key}", kind, f"{prefix} {key}", {}, stats[key])
+            for key, kind in kinds.items() if isinstance(stats.get(key), (int, float))
+        ]
+
+    registry.register_collector(collect)
+
+
+_trace_file_lock = threading.Lock()
+
+
+def write_trace(trace):
+    line = json.dumps(trace, default=str)
+    if TRACE_LOG in ("1", "true", "yes"):
+        trace_logger.info(line)
+        return
+    with _trace_file_lock, open(TRACE_LOG, "a") as f:
+        f.write(line + "\n")
+
+
+def install_flask(app, endpoints=("/query", "/query/stream")):
+    """Request ids, request timing and a /metrics route for a Flask app.
+
+    Handlers get the request's trace from current_trace() (also g.trace) and
+    pass it in config["callbacks"]. The trace is finished on teardown, i.e.
+    after a streamed response has been fully sent.
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_trace():
+        # endpoints may name URL rules ("/assistants/<assistant_id>/query") as well as paths
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        if rule in endpoints or request.path in endpoints:
+            g.trace = RequestTrace(request.headers.get("X-Request-ID"), endpoint=rule).activate()
+
+    @app.after_request
+    def _request_id_header(response):
+        trace = g.get("trace")
+        if trace is not None:
+            response.headers["X-Request-ID"] = trace.request_id
+            g.trace_status = str(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _finish_trace(error=None):
+        trace = g.pop("trace", None)
+        if trace is not None:
+            trace.finish("500" if error else g.get("trace_status", "200"))
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(registry.render(), mimetype=METRICS_CONTENT_TYPE.split(";")[0],
+                        headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+    return app
+
+
+def install_fastapi(app, endpoints=("/query", "/query/stream")):
+    """FastAPI/Starlette counterpart of install_flask.
+
+    As there, the trace is finished once the body has been sent: call_next
+    returns before a StreamingResponse has produced anything.
+    """
+    from fastapi import Request
+    from fastapi.responses import Response
+
+    async def _finish_after(body, trace, status):
+        try:
+            async for chunk in body:
+                yield chunk
+        except BaseException:
+            status = "500"
+            raise
+        finally:
+            trace.finish(status)
+
+    @app.middleware("http")
+    async def _trace_requests(request: Request, call_next):
+        if request.url.path not in endpoints:
+            return await call_next(request)
+        trace = RequestTrace(request.headers.get("X-Request-ID"), endpoint=request.url.path).activate()
+        request.state.trace = trace
+        try:
+            response = await call_next(request)
+        except BaseException:
+            trace.finish("500")
+            raise
+        response.headers["X-Request-ID"] = trace.request_id
+        response.body_iterator = _finish_after(response.body_iterator, trace, str(response.status_code))
+        return response
+
+    @app.get("/metrics")
+    async def metrics():
+        return Response(registry.render(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+    return app
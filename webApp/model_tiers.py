@@ -0,0 +1,176 @@
+"""Tiered chat model for the ReAct graphs: a small, fast router model picks
+the tools, the main model writes the final (bilingual) answer.
+
+Every step goes to the router first, with one extra tool bound: escalate.
+Its reply, tool calls or a direct answer, is used as is unless the step is
+escalated to the main model:
+
+    declined         the router called escalate: it is not confident it can
+                     handle the step (ambiguous question, hard reasoning)
+    parse_failure    the router's tool call arguments did not parse
+    unknown_tool     the router called a tool that is not bound
+    repeated_call    the router repeated a call already made this turn (it is stuck)
+
+So the main model only runs when the router asks for it or gets the step wrong.
+
+Steps that follow tool results skip the router: the next reply is then
+usually the final answer, which the main model would write anyway, so asking
+the router first would only add its latency (counted as direct_answers).
+
+TieredChatModel.get_stats() has per-tier call counts, latency and tokens plus
+escalation counts; each step is tagged tier:router / tier:answer for
+per-request accounting.
+"""
+import logging
+import threading
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import merge_configs
+from langchain_core.tools import tool
+from langgraph.constants import TAG_NOSTREAM
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("router", "answer")
+ESCALATION_REASONS = ("declined", "parse_failure", "unknown_tool", "repeated_call")
+STAT_KEYS = ([f"escalations_{reason}" for reason in ESCALATION_REASONS] + ["direct_answers"]
+             + [f"{tier}_{stat}" for tier in TIERS
+                for stat in ("calls", "latency_ms", "prompt_tokens", "completion_tokens")])
+
+
+@tool
+def escalate(reason: str) -> str:
+    """Hand this step to a stronger model. Call it instead of answering or
+    calling other tools when the question is ambiguous, needs careful
+    reasoning, or you are not confident which tools to call."""
+    return reason
+
+
+class TierStats:
+    """Counters of one TieredChatModel, shared with its bind_tools() copies."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(STAT_KEYS, 0)
+
+    def count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def record(self, tier, started, response):
+        usage = getattr(response, "usage_metadata", None) or {}
+        with self._lock:
+            self._stats[f"{tier}_calls"] += 1
+            self._stats[f"{tier}_latency_ms"] += (time.perf_counter() - started) * 1000
+            self._stats[f"{tier}_prompt_tokens"] += usage.get("input_tokens", 0)
+            self._stats[f"{tier}_completion_tokens"] += usage.get("output_tokens", 0)
+
+    def get(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+def get_stats(model):
+    """A model's tier stats; empty unless it is a TieredChatModel."""
+    return model.get_stats() if isinstance(model, TieredChatModel) else {}
+
+
+def _messages(input):
+    # The prompt runnable hands over a PromptValue or a list of messages
+    return input.to_messages() if hasattr(input, "to_messages") else list(input)
+
+
+def _call_key(call):
+    return call["name"], repr(sorted(call["args"].items()))
+
+
+class TieredChatModel(Runnable):
+    """Drop-in for the chat model passed to create_react_agent (see module docstring)."""
+
+    def __init__(self, router, answerer, tool_names=None, route_after_tools=False, stats=None):
+        self.router = router
+        self.answerer = answerer
+        self.tool_names = tool_names
+        self.route_after_tools = route_after_tools
+        self.stats = stats or TierStats()
+
+    def bind_tools(self, tools, **kwargs):
+        names = {getattr(tool, "name", None) or getattr(tool, "__name__", None) for tool in tools}
+        return TieredChatModel(self.router.bind_tools(list(tools) + [escalate], **kwargs),
+                               self.answerer.bind_tools(tools, **kwargs), names, self.route_after_tools,
+                               self.stats)
+
+    def get_stats(self):
+        return self.stats.get()
+
+    def _skip_router(self, input):
+        """True when tool results just came in, so the step goes straight to the main model."""
+        if self.route_after_tools:
+            return False
+        messages = _messages(input)
+        if messages and isinstance(messages[-1], ToolMessage):
+            self.stats.count("direct_answers")
+            return True
+        return False
+
+    def escalation_reason(self, input, response):
+        """Why the router's reply cannot be used, or None if it can."""
+        if any(call["name"] == escalate.name for call in response.tool_calls):
+            return "declined"
+        if getattr(response, "invalid_tool_calls", None):
+            return "parse_failure"
+        if not response.tool_calls:
+            # The router answered the step itself
+            return None
+        if self.tool_names is not None and any(call["name"] not in self.tool_names for call in response.tool_calls):
+            return "unknown_tool"
+        # Calls made since the user's last message
+        made = set()
+        for message in reversed(_messages(input)):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage):
+                made.update(_call_key(call) for call in message.tool_calls)
+        if any(_call_key(call) in made for call in response.tool_calls):
+            return "repeated_call"
+        return None
+
+    def _config(self, config, tier):
+        # Router runs are left out of stream_mode="messages" so a reply that
+        # gets escalated never reaches the client
+        tags = [f"tier:{tier}"] + ([TAG_NOSTREAM] if tier == "router" else [])
+        return merge_configs(config, {"tags": tags})
+
+    def _escalate(self, reason):
+        self.stats.count(f"escalations_{reason}")
+        logger.info(f"Escalating step to the main model: {reason}")
+
+    def invoke(self, input, config=None, **kwargs):
+        if not self._skip_router(input):
+            started = time.perf_counter()
+            response = self.router.invoke(input, self._config(config, "router"), **kwargs)
+            self.stats.record("router", started, response)
+            reason = self.escalation_reason(input, response)
+            if reason is None:
+                return response
+            self._escalate(reason)
+        started = time.perf_counter()
+        response = self.answerer.invoke(input, self._config(config, "answer"), **kwargs)
+        self.stats.record("answer", started, response)
+        return response
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        if not self._skip_router(input):
+            started = time.perf_counter()
+            response = await self.router.ainvoke(input, self._config(config, "router"), **kwargs)
+            self.stats.record("router", started, response)
+            reason = self.escalation_reason(input, response)
+            if reason is None:
+                return response
+            self._escalate(reason)
+        started = time.perf_counter()
+        response = await self.answerer.ainvoke(input, self._config(config, "answer"), **kwargs)
+        self.stats.record("answer", started, response)
+        return response
@@ -0,0 +1,135 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables.config import get_config_list
+from langgraph.prebuilt import ToolNode
+from langgraph.types import Command
+
+logger = logging.getLogger(__name__)
+
+# At most this many tool calls from one model turn run at once, and the whole
+# step must finish within TOOL_STEP_DEADLINE seconds
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+TOOL_STEP_DEADLINE = float(os.getenv("TOOL_STEP_DEADLINE", "30"))
+
+# Shared by every step in the process; separate from fanout's pool because a
+# tool may itself fan out. A sync tool call that misses the step deadline
+# cannot be stopped: it keeps its thread until it returns, so size the pool
+# for the calls in flight plus the ones that may hang (give tools their own
+# timeouts, as the HTTP transport does)
+MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "32"))
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="tools")
+
+
+def _split(input, messages_key):
+    """One ToolNode input per tool call of the last AI message, with the rest of the state as is."""
+    messages = input if isinstance(input, list) else input.get(messages_key, [])
+    message = messages[-1] if messages else None
+    calls = getattr(message, "tool_calls", None) or []
+
+    def single(call):
+        one = messages[:-1] + [message.model_copy(update={"tool_calls": [call]})]
+        return one if isinstance(input, list) else dict(input, **{messages_key: one})
+
+    return calls, [single(call) for call in calls]
+
+
+class ParallelToolNode(ToolNode):
+    """ToolNode that runs all tool calls of one model turn concurrently.
+
+    Each call is sent on its own, with its own config, through a plain
+    ToolNode over the same tools, so parsing, error handling, injected
+    state/store and Command outputs are ToolNode's. Sync calls run on a
+    shared thread pool, async calls are gathered. At most max_concurrency
+    calls of a step are in flight, and calls still running (or not yet
+    started) at the step deadline are answered with an error ToolMessage so
+    the model can go on without them. Sync calls abandoned at the deadline
+    still hold a pool thread until they return (see MAX_WORKERS). Tool
+    messages keep the order of the model's tool calls.
+
+    It is a ToolNode itself only so create_react_agent accepts it; invoke()
+    and ainvoke() are the whole node.
+    """
+
+    def __init__(self, tools, max_concurrency=TOOL_MAX_CONCURRENCY, deadline=TOOL_STEP_DEADLINE, **kwargs):
+        super().__init__(tools, **kwargs)
+        self.tool_node = ToolNode(tools, **kwargs)
+        self.max_concurrency = max_concurrency
+        self.deadline = deadline
+
+    def _timed_out(self, call):
+        return ToolMessage(
+            content=f"{call['name']} did not finish within {self.deadline:g}s; answer without it or try again later.",
+            name=call["name"],
+            tool_call_id=call["id"],
+            status="error",
+        )
+
+    def invoke(self, input, config=None, **kwargs):
+        calls, inputs = _split(input, self.messages_key)
+        configs = get_config_list(config, len(calls))
+        outputs = [None] * len(calls)
+        queue = list(range(len(calls)))
+        pending = {}
+        deadline = time.monotonic() + self.deadline
+
+        while queue or pending:
+            while queue and len(pending) < self.max_concurrency:
+                index = queue.pop(0)
+                # Each call gets a copy of the context so request tracing follows it
+                context = contextvars.copy_context()
+                future = _executor.submit(context.run, self.tool_node.invoke, inputs[index], configs[index])
+                pending[future] = index
+            done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when="FIRST_COMPLETED")
+            for future in done:
+                # ToolNode turns tool errors into error messages; what it raises must propagate
+                outputs[pending.pop(future)] = future.result()
+            if time.monotonic() >= deadline:
+                break
+
+        # Past the deadline: calls not started are cancelled, running ones finish on their own
+        running = [future for future in pending if not future.cancel()]
+        if running:
+            logger.warning(f"{len(running)} tool calls still running after {self.deadline:g}s; "
+                           f"they hold pool threads (of {MAX_WORKERS}) until they return")
+        for index in queue + list(pending.values()):
+            outputs[index] = [self._timed_out(calls[index])]
+        return self._combine(outputs, input)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        calls, inputs = _split(input, self.messages_key)
+        if not calls:
+            # asyncio.wait() refuses an empty set
+            return self._combine([], input)
+        configs = get_config_list(config, len(calls))
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(one, one_config):
+            async with semaphore:
+                return await self.tool_node.ainvoke(one, one_config)
+
+        tasks = [asyncio.ensure_future(run(one, one_config)) for one, one_config in zip(inputs, configs)]
+        _, late = await asyncio.wait(tasks, timeout=self.deadline)
+        for task in late:
+            task.cancel()
+        await asyncio.gather(*late, return_exceptions=True)
+        outputs = [[self._timed_out(call)] if task in late else task.result() for call, task in zip(calls, tasks)]
+        return self._combine(outputs, input)
+
+    def _combine(self, outputs, input):
+        # Merge the single-call outputs into what ToolNode returns for the whole turn,
+        # Command outputs included
+        outputs = [item for output in outputs
+                   for item in (output.get(self.messages_key, []) if isinstance(output, dict) else output)]
+        if not any(isinstance(output, Command) for output in outputs):
+            return outputs if isinstance(input, list) else {self.messages_key: outputs}
+        return [
+            output if isinstance(output, Command)
+            else [output] if isinstance(input, list) else {self.messages_key: [output]}
+            for output in outputs
+        ]
@@ -0,0 +1,175 @@
+"""The /query, /query/stream and /translate request handling every app shares.
+
+The Flask apps, the FastAPI app and agent_server.py only parse the HTTP
+request and wrap the result; what a query does is here, once:
+
+    try:
+        query = parse_query(request.json)        # ValueError -> 400
+    except ValueError as e:
+        ...
+    body = answer_query(get_graph(), query, get_answer_cache())
+    frames = stream_answer(get_graph(), query, get_answer_cache())
+
+A request names its reply language ("language"), the languages to translate
+the answer into ("alternates") and, to continue a conversation, the
+"thread_id" of the previous response. New conversations are looked up in and
+stored to the semantic answer cache; every run reports its token usage.
+"""
+import asyncio
+import logging
+from typing import NamedTuple, Optional
+
+from book_agent import translate_alternates
+from checkpointer import thread_config
+from languages import normalize_language, set_language
+from metrics import current_trace
+from streaming import astream_query, stream_query
+from token_budget import TokenUsageTracker
+
+logger = logging.getLogger(__name__)
+
+
+class Query(NamedTuple):
+    message: str
+    thread_id: str
+    config: dict
+    language: Optional[str]
+    alternates: list
+    usage: TokenUsageTracker
+    trace: object
+    # False when the request continues an earlier conversation
+    new_thread: bool
+
+    @property
+    def inputs(self):
+        return {"messages": [("user", self.message)]}
+
+    @property
+    def namespace(self):
+        # Answers in different reply languages are cached apart
+        return self.language or ""
+
+
+def parse_query(data):
+    """Query for a /query or /query/stream body; ValueError for an unsupported language."""
+    data = data or {}
+    language = normalize_language(data.get('language'))
+    # Multi-turn chats pass back the thread_id from the previous response
+    thread_id, config = thread_config(data.get('thread_id'))
+    set_language(config, language)
+    usage = TokenUsageTracker()
+    trace = current_trace()
+    # No trace outside a request (scripts, tests)
+    config["callbacks"] = [usage, trace] if trace is not None else [usage]
+    return Query(data.get('message', ''), thread_id, config, language, data.get('alternates') or [],
+                 usage, trace, not data.get('thread_id'))
+
+
+def _cache_for(query, answer_cache):
+    # Only opening questions go through the answer cache
+    return answer_cache if query.new_thread else None
+
+
+def message_to_response(message):
+    if isinstance(message, tuple):
+        return {'role': message[0], 'content': message[1]}
+    return {'role': 'assistant', 'content': message.content}
+
+
+def _thread_id(graph, query):
+    # Graphs without a checkpointer do not remember earlier turns
+    return query.thread_id if graph.checkpointer is not None else None
+
+
+def _cached_body(graph, query, answer):
+    return {'responses': [{'role': 'assistant', 'content': answer}], 'cached': True,
+            'thread_id': _thread_id(graph, query), 'language': query.language}
+
+
+def _body(graph, query, responses):
+    usage = query.usage.report()
+    if query.trace is not None:
+        query.trace.usage = usage
+    thread_id = _thread_id(graph, query)
+    return {'responses': responses, 'thread_id': thread_id, 'usage': usage, 'language': query.language}
+
+
+def _final_answer(responses):
+    return responses[-1]['content'] if responses and responses[-1]['content'] else None
+
+
+def answer_query(graph, query, answer_cache=None):
+    """Run a query to completion and return the /query response body."""
+    answer_cache = _cache_for(query, answer_cache)
+    answer = answer_cache.lookup(query.message, namespace=query.namespace) if answer_cache else None
+    if answer is not None:
+        logger.info("Answered from semantic cache")
+        if graph.checkpointer is not None:
+            graph.update_state(query.config, {"messages": [("user", query.message), ("assistant", answer)]},
+                               as_node="agent")
+        body = _cached_body(graph, query, answer)
+    else:
+        responses = [message_to_response(response["messages"][-1])
+                     for response in graph.stream(query.inputs, query.config, stream_mode="values")]
+        answer = _final_answer(responses)
+        if answer_cache and answer:
+            answer_cache.store(query.message, answer, namespace=query.namespace)
+        body = _body(graph, query, responses)
+    if query.alternates and answer:
+        body['alternates'] = translate_alternates(answer, query.language, query.alternates)
+    return body
+
+
+async def aanswer_query(graph, query, answer_cache=None):
+    """answer_query on graph.astream; the cache and translations run on a thread."""
+    answer_cache = _cache_for(query, answer_cache)
+    answer = None
+    if answer_cache:
+        answer = await asyncio.to_thread(answer_cache.lookup, query.message, namespace=query.namespace)
+    if answer is not None:
+        logger.info("Answered from semantic cache")
+        if graph.checkpointer is not None:
+            await graph.aupdate_state(query.config, {"messages": [("user", query.message), ("assistant", answer)]},
+                                      as_node="agent")
+        body = _cached_body(graph, query, answer)
+    else:
+        responses = [message_to_response(response["messages"][-1])
+                     async for response in graph.astream(query.inputs, query.config, stream_mode="values")]
+        answer = _final_answer(responses)
+        if answer_cache and answer:
+            await asyncio.to_thread(answer_cache.store, query.message, answer, namespace=query.namespace)
+        body = _body(graph, query, responses)
+    if query.alternates and answer:
+        body['alternates'] = await asyncio.to_thread(translate_alternates, answer, query.language, query.alternates)
+    return body
+
+
+def _translate(query):
+    # Requested translations follow the streamed answer as `translation` events
+    if not query.alternates:
+        return None
+    return lambda answer: translate_alternates(answer, query.language, query.alternates)
+
+
+def stream_answer(graph, query, answer_cache=None):
+    """SSE frames for /query/stream (see streaming.stream_query)."""
+    return stream_query(graph, query.inputs, query.config, translate=_translate(query),
+                        answer_cache=_cache_for(query, answer_cache), namespace=query.namespace,
+                        usage=query.usage, trace=query.trace)
+
+
+def astream_answer(graph, query, answer_cache=None):
+    """Async SSE frames for /query/stream (see streaming.astream_query)."""
+    return astream_query(graph, query.inputs, query.config, translate=_translate(query),
+                         answer_cache=_cache_for(query, answer_cache), namespace=query.namespace,
+                         usage=query.usage, trace=query.trace)
+
+
+def translate_body(data):
+    """/translate: an answer in other languages, on demand: {"text", "language", "targets": ["ny", "fr"]}.
+
+    ValueError for an unsupported language.
+    """
+    data = data or {}
+    language = normalize_language(data.get('language'))
+    return {'alternates': translate_alternates(data.get('text', ''), language, data.get('targets') or [])}
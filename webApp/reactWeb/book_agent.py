@@ -3,9 +3,11 @@ from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 from langchain_core.tools import tool
 from langchain_google_community import GoogleSearchAPIWrapper
-from googletrans import Translator
 import os
 
+import webapp_path  # noqa: F401  (the translation layer is shared with the main web app in webApp/)
+from translation import TranslationService, print_stream
+
 # Load environment variables (for API keys)
 load_dotenv()
 
@@ -15,7 +17,8 @@ search = GoogleSearchAPIWrapper(
     google_cse_id=os.getenv("GOOGLE_CSE_ID")
 )
 
-translator = Translator()
+# Memoized translation; TRANSLATION_BACKEND=phrases runs it offline
+translator = TranslationService()
 
 # Define system prompt for multilingual responses
 system_prompt = """
@@ -93,18 +96,7 @@ graph = create_react_agent(model, tools=tools, prompt=system_prompt)
 
 # Function to handle language translation
 def translate_text(text, target_lang):
-    return translator.translate(text, dest=target_lang).text
-
-# Function to stream and print responses
-def print_stream(stream, target_lang='en'):
-    for s in stream:
-        message = s["messages"][-1]
-        if isinstance(message, tuple):
-            translated_message = translate_text(message[1], target_lang)
-            print((message[0], translated_message))
-        else:
-            translated_message = translate_text(message.content, target_lang)
-            print(translated_message)
+    return translator.translate(text, target_lang)
 
 # Example usage demonstrating multilingual support
 if __name__ == "__main__":
@@ -113,10 +105,10 @@ if __name__ == "__main__":
 
     print("Example 1: Search Trending Books")
     inputs = {"messages": [("user", "what trending books are available?")]}
-    print_stream(graph.stream(inputs, stream_mode="values"), target_language)
+    print_stream(graph.stream(inputs, stream_mode="values"), translator, target_language)
 
     print(f"\n\n{'==='*20}\n\n")
 
     print("Example 2: Check Specific Book Availability")
     inputs = {"messages": [("user", "is Tomorrow and Tomorrow available?")]}
-    print_stream(graph.stream(inputs, stream_mode="values"), target_language)
\ No newline at end of file
+    print_stream(graph.stream(inputs, stream_mode="values"), translator, target_language)
\ No newline at end of file
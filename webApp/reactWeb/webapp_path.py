@@ -0,0 +1,14 @@
+"""Puts webApp/ on the import path.
+
+The React app's backend runs from webApp/reactWeb/ and shares the main web
+app's modules (translation, ...); like the agents in the repository root
+(see the root webapp_path.py), it imports this module first instead of
+editing sys.path itself.
+"""
+import os
+import sys
+
+WEBAPP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if WEBAPP_DIR not in sys.path:
+    sys.path.append(WEBAPP_DIR)
@@ -0,0 +1,248 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Seconds between refreshes of each job, and how old a value may get before a
+# request stops accepting it and recomputes inline
+REFRESH_INTERVAL = float(os.getenv("REFRESH_INTERVAL", str(15 * 60)))
+REFRESH_MAX_STALE = float(os.getenv("REFRESH_MAX_STALE", str(6 * 60 * 60)))
+# Jobs nobody has read for this long are left alone until the next read, so
+# the scheduler does not spend search quota on results nobody asks for
+REFRESH_IDLE_AFTER = float(os.getenv("REFRESH_IDLE_AFTER", str(60 * 60)))
+# A failed refresh is retried after this many seconds; the old value keeps being served
+REFRESH_RETRY_AFTER = float(os.getenv("REFRESH_RETRY_AFTER", "60"))
+# How long one worker may hold a job before another is allowed to take it over
+LEASE_SECONDS = 120
+LEASE_POLL_SECONDS = 5
+# How often a cold miss checks for the value another worker is computing
+COLD_POLL_SECONDS = 0.1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS refreshed (
+    name TEXT PRIMARY KEY,
+    value TEXT,
+    refreshed_at REAL NOT NULL DEFAULT 0,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+class _Job:
+    def __init__(self, name, func, interval):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.retry_at = 0.0
+        self.last_read = 0.0
+
+
+class BackgroundRefresher:
+    """Precompute results that are the same for every user on a schedule.
+
+    Each job is a zero-argument function returning a JSON-serializable value.
+    A daemon thread recomputes jobs every `interval` seconds and stores the
+    value in a SQLite table shared by all worker processes; a lease makes sure
+    only one worker refreshes (or, on a cold miss, first computes) a job at a
+    time. get() always answers from the
+    stored value, even when it is older than the interval (stale-while-
+    revalidate: a late value also wakes the scheduler). Only a job that has
+    never been computed, or is older than max_stale, is computed inline.
+    Jobs this process has not served for `idle_after` seconds are not
+    refreshed until they are read again.
+    """
+
+    def __init__(self, path=None, max_stale=REFRESH_MAX_STALE, idle_after=REFRESH_IDLE_AFTER):
+        self.path = path
+        self.max_stale = max_stale
+        self.idle_after = idle_after
+        self.jobs = {}
+        self._memory = {}
+        self._flights = SingleFlight()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_failures": 0}
+        if self.path:
+            self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, name, func, interval=REFRESH_INTERVAL):
+        self.jobs[name] = _Job(name, func, interval)
+
+    def _read(self, name):
+        # (value, refreshed_at) or None
+        if not self.path:
+            return self._memory.get(name)
+        row = self._connect().execute(
+            "SELECT value, refreshed_at FROM refreshed WHERE name = ? AND value IS NOT NULL", (name,)
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row is not None else None
+
+    def _write(self, name, value, refreshed_at):
+        self._memory[name] = (value, refreshed_at)
+        if self.path:
+            self._connect().execute(
+                "INSERT INTO refreshed (name, value, refreshed_at, lease_until) VALUES (?, ?, ?, 0)"
+                " ON CONFLICT(name) DO UPDATE SET value = excluded.value,"
+                " refreshed_at = excluded.refreshed_at, lease_until = 0",
+                (name, json.dumps(value), refreshed_at)
+            )
+
+    def _acquire_lease(self, name):
+        if not self.path:
+            return True
+        now = time.time()
+        conn = self._connect()
+        conn.execute("INSERT OR IGNORE INTO refreshed (name) VALUES (?)", (name,))
+        cursor = conn.execute(
+            "UPDATE refreshed SET lease_until = ? WHERE name = ? AND lease_until < ?",
+            (now + LEASE_SECONDS, name, now)
+        )
+        return cursor.rowcount == 1
+
+    def _release_lease(self, name):
+        if self.path:
+            self._connect().execute("UPDATE refreshed SET lease_until = 0 WHERE name = ?", (name,))
+
+    def _compute(self, job):
+        value = job.func()
+        self._write(job.name, value, time.time())
+        with self._lock:
+            self.stats["refreshes"] += 1
+        return value
+
+    def refresh(self, name):
+        """Recompute one job now unless another worker holds its lease; returns True if it ran."""
+        job = self.jobs[name]
+        if not self._acquire_lease(name):
+            return False
+        try:
+            # A request that misses meanwhile waits on the lease for this value
+            self._compute(job)
+        except Exception as error:
+            job.retry_at = time.time() + REFRESH_RETRY_AFTER
+            with self._lock:
+                self.stats["refresh_failures"] += 1
+            logger.warning(f"Refreshing {name} failed, serving the previous value: {error!r}")
+            self._release_lease(name)
+            return False
+        return True
+
+    def _compute_missing(self, name):
+        # Cold miss: the worker that gets the lease computes, the others wait for its value
+        while True:
+            leased = self._acquire_lease(name)
+            # The lease is also free right after another worker wrote the value
+            stored = self._read(name)
+            if stored is not None and time.time() - stored[1] <= self.max_stale:
+                if leased:
+                    self._release_lease(name)
+                return stored[0]
+            if leased:
+                break
+            time.sleep(COLD_POLL_SECONDS)
+        try:
+            return self._compute(self.jobs[name])
+        except Exception:
+            self._release_lease(name)
+            raise
+
+    def get(self, name):
+        """The job's latest value, computing it inline only if there is none (or it is too old)."""
+        self._ensure_started()
+        self.jobs[name].last_read = time.time()
+        stored = self._read(name)
+        if stored is not None:
+            value, refreshed_at = stored
+            age = time.time() - refreshed_at
+            if age <= self.max_stale:
+                with self._lock:
+                    if age <= self.jobs[name].interval:
+                        self.stats["hits"] += 1
+                    else:
+                        self.stats["stale_hits"] += 1
+                if age > self.jobs[name].interval:
+                    # Late refresh: serve what we have and nudge the scheduler
+                    self._wake.set()
+                return value
+
+        with self._lock:
+            self.stats["misses"] += 1
+        # Concurrent cold misses in this process share one computation, and
+        # the lease makes other workers wait for it instead of computing too
+        return self._flights.do(name, lambda: self._compute_missing(name))
+
+    async def aget(self, name):
+        # Even a hit reads SQLite, so the whole get() runs off the event loop
+        return await asyncio.to_thread(self.get, name)
+
+    def warm(self):
+        """Make sure every job has a value (e.g. in preload) without starting the scheduler."""
+        for name, job in self.jobs.items():
+            if self._read(name) is None:
+                try:
+                    self._compute(job)
+                except Exception as error:
+                    logger.warning(f"Could not precompute {name}: {error!r}")
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="refresher", daemon=True)
+                    self._thread.start()
+
+    def run_pending(self):
+        """Refresh the due jobs that were read recently; returns when to run again."""
+        now = time.time()
+        next_run = now + REFRESH_INTERVAL
+        for name, job in self.jobs.items():
+            if now - job.last_read > self.idle_after:
+                # The next get() wakes the scheduler if the value has gone stale
+                continue
+            stored = self._read(name)
+            due = max((stored[1] if stored else 0.0) + job.interval, job.retry_at)
+            if due <= now:
+                if self.refresh(name):
+                    due = time.time() + job.interval
+                else:
+                    # Another worker holds the lease (poll for its result), or the refresh failed
+                    job.retry_at = max(job.retry_at, now + LEASE_POLL_SECONDS)
+                    due = job.retry_at
+            next_run = min(next_run, due)
+        return next_run
+
+    def _run(self):
+        while True:
+            next_run = self.run_pending()
+            self._wake.wait(timeout=max(1.0, next_run - time.time()))
+            self._wake.clear()
+
+    def after_fork(self):
+        # The scheduler thread and SQLite connection do not survive a fork
+        self._thread = None
+        self._local = threading.local()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        now = time.time()
+        ages = [now - stored[1] for stored in map(self._read, self.jobs) if stored is not None]
+        stats["max_age_seconds"] = max(ages) if ages else 0.0
+        return stats
@@ -0,0 +1,395 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+
+import transport
+from singleflight import SingleFlight
+
+# Default time-to-live (seconds) for cached search results, per tool name
+DEFAULT_TTLS = {
+    "search_trending_books": 60 * 60,
+    "get_all_available_books": 30 * 60,
+    "get_book_club_suggestions": 6 * 60 * 60,
+    "search_books_by_genre": 60 * 60,
+    "check_book_availability": 15 * 60,
+    "compare_book_prices": 15 * 60,
+    "get_author_info": 24 * 60 * 60,
+    "find_similar_books": 24 * 60 * 60,
+}
+DEFAULT_TTL = 30 * 60
+NEGATIVE_TTL = 5 * 60
+# Expired rows stay on disk this long as a fallback for upstream outages
+# (get_stale), and the file holds at most SEARCH_CACHE_MAX_ROWS rows
+STALE_TTL = 24 * 60 * 60
+MAX_DISK_ROWS = int(os.getenv("SEARCH_CACHE_MAX_ROWS", "50000"))
+# Writes between two purges of the SQLite file
+PURGE_EVERY = 500
+
+# Text GoogleSearchAPIWrapper returns when nothing matched the query
+NO_RESULT_MARKERS = ("No good Google Search Result was found",)
+
+# Custom Search JSON API endpoints, called over the shared "google_cse" transport
+CSE_URL = "https://www.googleapis.com/customsearch/v1"
+CSE_SITERESTRICT_URL = "https://www.googleapis.com/customsearch/v1/siterestrict"
+
+
+def normalize_query(query):
+    """Normalize a query so trivially different strings share one cache entry."""
+    query = query.lower().strip()
+    query = re.sub(r"[\"'`]", "", query)
+    return re.sub(r"\s+", " ", query)
+
+
+def is_negative(result):
+    """Return True if a search result means 'nothing found'."""
+    if not result or not result.strip():
+        return True
+    return any(result.startswith(marker) for marker in NO_RESULT_MARKERS)
+
+
+class SearchCache:
+    """Two-level cache: an in-process LRU in front of a shared SQLite table.
+
+    The SQLite file is opened in WAL mode so several Flask workers can read
+    and write it at the same time and entries survive restarts. Every
+    `purge_every` writes, rows expired for longer than `stale_ttl` are
+    deleted and the file is cut back to `max_disk_rows`.
+    """
+
+    def __init__(self, path=None, max_entries=1024, ttls=None,
+                 default_ttl=DEFAULT_TTL, negative_ttl=NEGATIVE_TTL, stale_ttl=STALE_TTL,
+                 max_disk_rows=MAX_DISK_ROWS, purge_every=PURGE_EVERY):
+        self.path = path or os.getenv("SEARCH_CACHE_PATH", "search_cache.sqlite3")
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.max_disk_rows = max_disk_rows
+        self.purge_every = purge_every
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"hits": 0, "misses": 0, "disk_hits": 0,
+                      "negative_hits": 0, "evictions": 0, "writes": 0, "stale_hits": 0, "purged": 0}
+        if self.path:
+            conn = self._connect()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                " key TEXT PRIMARY KEY, query TEXT, result TEXT,"
+                " negative INTEGER, expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS search_cache_expires ON search_cache (expires_at)")
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def after_fork(self):
+        # A forked worker must not reuse the parent's connection
+        self._local = threading.local()
+
+    @staticmethod
+    def make_key(query, tool=None):
+        raw = f"{tool or ''}\x00{normalize_query(query)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, tool, negative=False):
+        if negative:
+            return self.negative_ttl
+        return self.ttls.get(tool, self.default_ttl)
+
+    def _remember(self, key, result, expires_at):
+        self._memory[key] = (result, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, query, tool=None):
+        """Return the cached result for a query, or None on a miss."""
+        key = self.make_key(query, tool)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self._count_hit(entry[0])
+                    return entry[0]
+                del self._memory[key]
+
+        if self.path:
+            row = self._connect().execute(
+                "SELECT result, expires_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[1] > now:
+                with self._lock:
+                    self._remember(key, row[0], row[1])
+                    self.stats["disk_hits"] += 1
+                    self._count_hit(row[0])
+                return row[0]
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def get_stale(self, query, tool=None):
+        """Return a cached result even if it has expired, or None. Used when the upstream is down."""
+        key = self.make_key(query, tool)
+        with self._lock:
+            entry = self._memory.get(key)
+        result = entry[0] if entry is not None else None
+        if result is None and self.path:
+            row = self._connect().execute(
+                "SELECT result FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            result = row[0] if row is not None else None
+        if result is not None:
+            with self._lock:
+                self.stats["stale_hits"] += 1
+        return result
+
+    def _count_hit(self, result):
+        self.stats["hits"] += 1
+        if is_negative(result):
+            self.stats["negative_hits"] += 1
+
+    def set(self, query, result, tool=None, ttl=None):
+        """Store a result. Empty / 'no result' answers get the negative TTL."""
+        key = self.make_key(query, tool)
+        result = result or ""
+        negative = is_negative(result)
+        if ttl is None:
+            ttl = self.ttl_for(tool, negative)
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, result, expires_at)
+            self.stats["writes"] += 1
+            purge = self.purge_every and self.stats["writes"] % self.purge_every == 0
+        if self.path:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?, ?)",
+                (key, normalize_query(query), result, int(negative), expires_at),
+            )
+            if purge:
+                self.purge_expired()
+
+    def purge_expired(self):
+        """Drop rows expired for longer than stale_ttl, then the soonest-expiring
+        rows beyond max_disk_rows, from the SQLite file."""
+        if not self.path:
+            return
+        conn = self._connect()
+        purged = conn.execute(
+            "DELETE FROM search_cache WHERE expires_at <= ?", (time.time() - self.stale_ttl,)
+        ).rowcount
+        if self.max_disk_rows:
+            purged += conn.execute(
+                "DELETE FROM search_cache WHERE rowid IN (SELECT rowid FROM search_cache"
+                " ORDER BY expires_at DESC LIMIT -1 OFFSET ?)", (self.max_disk_rows,)
+            ).rowcount
+        with self._lock:
+            self.stats["purged"] += purged
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.path:
+            self._connect().execute("DELETE FROM search_cache")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+class CachedSearch:
+    """Drop-in replacement for GoogleSearchAPIWrapper that caches run().
+
+    The wrapper's own run()/results() go through googleapiclient, which is
+    blocking, unpooled and has no async API. So on a cache miss this class
+    sends the same Custom Search REST request itself (_request) over the
+    shared "google_cse" transport (pooled connections, retries, circuit
+    breaker) and maps the items the way the wrapper does (_snippets,
+    _records); the wrapper only supplies the key, engine id, siterestrict and
+    k. Two deliberate differences: results() returns [] rather than the
+    wrapper's [{"Result": "No good ..."}] placeholder when nothing matched,
+    and every record has a "snippet" key. test_search_cache.py checks the
+    mapping against a recorded API response. arun()/aresults() are native
+    async variants for the ASGI server. Concurrent identical misses are coalesced
+    into one upstream call. When the upstream fails or its circuit is open,
+    an expired cache entry is served if there is one.
+    Pass wrapper_factory instead of wrapper to build the wrapper on first use.
+    """
+
+    def __init__(self, wrapper=None, cache=None, wrapper_factory=None):
+        self._wrapper = wrapper
+        self._wrapper_factory = wrapper_factory
+        self._wrapper_lock = threading.Lock()
+        self.cache = cache or SearchCache()
+        self.flights = SingleFlight()
+
+    @property
+    def wrapper(self):
+        if self._wrapper is None:
+            with self._wrapper_lock:
+                if self._wrapper is None:
+                    self._wrapper = self._wrapper_factory()
+        return self._wrapper
+
+    @wrapper.setter
+    def wrapper(self, wrapper):
+        self._wrapper = wrapper
+
+    def after_fork(self):
+        self.cache.after_fork()
+
+    @staticmethod
+    def _snippets(items):
+        # Same text GoogleSearchAPIWrapper.run() builds
+        if not items:
+            return NO_RESULT_MARKERS[0]
+        return " ".join(item["snippet"] for item in items if "snippet" in item)
+
+    @staticmethod
+    def _records(items):
+        return [
+            {"title": item["title"], "link": item["link"], "snippet": item.get("snippet", "")}
+            for item in items if "title" in item
+        ]
+
+    def _store_results(self, query, namespace, tool, results):
+        ttl = self.cache.ttl_for(tool, negative=not results)
+        self.cache.set(query, json.dumps(results) if results else "", namespace, ttl=ttl)
+
+    # Identical concurrent misses (same tool and normalized query) share one
+    # upstream call through self.flights instead of each sending their own.
+
+    def run(self, query, tool=None):
+        cached = self.cache.get(query, tool)
+        if cached is not None:
+            return cached
+        return self.flights.do(self.cache.make_key(query, tool), lambda: self._run(query, tool))
+
+    def _run(self, query, tool):
+        try:
+            items = self._fetch(query, self.wrapper.k)
+        except httpx.HTTPError:
+            stale = self.cache.get_stale(query, tool)
+            if stale is None:
+                raise
+            return stale
+        result = self._snippets(items)
+        self.cache.set(query, result, tool)
+        return result
+
+    def results(self, query, num_results, tool=None):
+        """Cached version of GoogleSearchAPIWrapper.results (title/link/snippet dicts)."""
+        namespace = f"{tool or ''}:results:{num_results}"
+        cached = self.cache.get(query, namespace)
+        if cached is not None:
+            return json.loads(cached) if cached else []
+        return self.flights.do(self.cache.make_key(query, namespace),
+                               lambda: self._results(query, num_results, namespace, tool))
+
+    def _results(self, query, num_results, namespace, tool):
+        try:
+            items = self._fetch(query, num_results)
+        except httpx.HTTPError:
+            stale = self.cache.get_stale(query, namespace)
+            if stale is None:
+                raise
+            return json.loads(stale) if stale else []
+        results = self._records(items)
+        self._store_results(query, namespace, tool, results)
+        return results
+
+    async def arun(self, query, tool=None):
+        """Async run(): cache lookup, then a non-blocking call to the CSE REST API."""
+        cached = self.cache.get(query, tool)
+        if cached is not None:
+            return cached
+        return await self.flights.ado(self.cache.make_key(query, tool), lambda: self._arun(query, tool))
+
+    async def _arun(self, query, tool):
+        try:
+            items = await self._afetch(query, self.wrapper.k)
+        except httpx.HTTPError:
+            stale = self.cache.get_stale(query, tool)
+            if stale is None:
+                raise
+            return stale
+        result = self._snippets(items)
+        self.cache.set(query, result, tool)
+        return result
+
+    async def aresults(self, query, num_results, tool=None):
+        """Async version of results()."""
+        namespace = f"{tool or ''}:results:{num_results}"
+        cached = self.cache.get(query, namespace)
+        if cached is not None:
+            return json.loads(cached) if cached else []
+        return await self.flights.ado(self.cache.make_key(query, namespace),
+                                      lambda: self._aresults(query, num_results, namespace, tool))
+
+    async def _aresults(self, query, num_results, namespace, tool):
+        try:
+            items = await self._afetch(query, num_results)
+        except httpx.HTTPError:
+            stale = self.cache.get_stale(query, namespace)
+            if stale is None:
+                raise
+            return json.loads(stale) if stale else []
+        results = self._records(items)
+        self._store_results(query, namespace, tool, results)
+        return results
+
+    def _request(self, query, num):
+        # The request GoogleSearchAPIWrapper makes through googleapiclient
+        params = {
+            "key": self.wrapper.google_api_key,
+            "cx": self.wrapper.google_cse_id,
+            "q": query,
+            "num": min(num, 10)
+        }
+        return (CSE_SITERESTRICT_URL if self.wrapper.siterestrict else CSE_URL), params
+
+    def _fetch(self, query, num):
+        url, params = self._request(query, num)
+        response = transport.get_client("google_cse").get(url, params=params)
+        response.raise_for_status()
+        return response.json().get("items", [])
+
+    async def _afetch(self, query, num):
+        url, params = self._request(query, num)
+        response = await transport.get_async_client("google_cse").get(url, params=params)
+        response.raise_for_status()
+        return response.json().get("items", [])
+
+    def get_stats(self):
+        return self.cache.get_stats()
+
+    def __getattr__(self, name):
+        # Private names and the wrapper property itself are never forwarded:
+        # while _wrapper is unset (copy, unpickling) they would land back here forever
+        if name.startswith("_") or name == "wrapper":
+            raise AttributeError(name)
+        # Anything else (k, siterestrict, ...) goes straight to the wrapper
+        return getattr(self.wrapper, name)
@@ -0,0 +1,367 @@
+import contextlib
+import functools
+import hashlib
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: syncs are not serialized between processes
+    fcntl = None
+
+from book_catalog import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Above this many books search is approximate (IVF), below it exact
+IVF_MIN_ITEMS = int(os.getenv("SIMILARITY_IVF_MIN_ITEMS", "20000"))
+# Centroid lists scanned per query; more is slower and closer to exact
+IVF_NPROBE = int(os.getenv("SIMILARITY_IVF_NPROBE", "16"))
+# Rows scored per matrix product in brute-force search (bounds peak memory)
+CHUNK_ROWS = 65536
+WORD = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+@functools.lru_cache(maxsize=1 << 20)
+def _bucket(feature, dim):
+    digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dim, (1.0 if (digest >> 63) & 1 else -1.0)
+
+
+class BookEmbedder:
+    """Deterministic CPU embedding of a catalog book via signed feature hashing.
+
+    Genres and author are strong, whole-value features; description and title
+    contribute words and word pairs. Needs no model download, so results are
+    reproducible offline.
+    """
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def features(self, book):
+        features = []
+        for genre in book.get("genres") or []:
+            features += [f"g:{genre.lower()}"] * 3
+        for author in (book.get("author") or "").split(","):
+            if author.strip():
+                features.append(f"a:{author.strip().lower()}")
+        words = WORD.findall(f"{book.get('title', '')} {book.get('description', '')}".lower())
+        features += words
+        features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        return features
+
+    def embed(self, book):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(book):
+            index, sign = _bucket(feature, self.dim)
+            vector[index] += sign
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_batch(self, books):
+        return np.stack([self.embed(book) for book in books]) if books else np.zeros((0, self.dim), np.float32)
+
+
+class TextModelEmbedder:
+    """Any text embedder with embed(text) (e.g. answer_cache.SentenceTransformerEmbedder)."""
+
+    def __init__(self, model):
+        self.model = model
+        self.dim = model.dim
+
+    @staticmethod
+    def text(book):
+        return f"{book.get('title', '')}. {', '.join(book.get('genres') or [])}. {book.get('description', '')}"
+
+    def embed(self, book):
+        return self.model.embed(self.text(book))
+
+    def embed_batch(self, books):
+        return np.stack([self.embed(book) for book in books]) if books else np.zeros((0, self.dim), np.float32)
+
+
+def make_book_embedder(name=None):
+    """SIMILARITY_EMBEDDER=hashing (default) or sentence-transformers[:model]."""
+    name = name or os.getenv("SIMILARITY_EMBEDDER", "hashing")
+    if name.startswith("sentence-transformers"):
+        from answer_cache import make_embedder
+        return TextModelEmbedder(make_embedder(name))
+    return BookEmbedder()
+
+
+def exact_search(vectors, queries, k):
+    """Top-k rows of `vectors` by inner product for each query (ties by position)."""
+    k = min(k, len(vectors))
+    best_pos = np.zeros((len(queries), 0), dtype=np.int64)
+    best_sim = np.zeros((len(queries), 0), dtype=np.float32)
+    for start in range(0, len(vectors), CHUNK_ROWS):
+        sims = queries @ vectors[start:start + CHUNK_ROWS].T
+        kk = min(k, sims.shape[1])
+        top = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+        best_pos = np.concatenate([best_pos, top + start], axis=1)
+        best_sim = np.concatenate([best_sim, np.take_along_axis(sims, top, axis=1)], axis=1)
+    order = np.lexsort((best_pos, -best_sim), axis=1)[:, :k]
+    return np.take_along_axis(best_pos, order, axis=1), np.take_along_axis(best_sim, order, axis=1)
+
+
+def _assign(vectors, centroids):
+    return np.concatenate([
+        np.argmax(vectors[start:start + CHUNK_ROWS] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), CHUNK_ROWS)
+    ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+
+def _lists(assignments, n_lists):
+    order = np.argsort(assignments, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))])
+    return order, offsets
+
+
+def build_ivf(vectors, n_lists=None, iterations=8, sample=20000, seed=0):
+    """Inverted-file ANN index: spherical k-means centroids + per-centroid row lists.
+
+    Seeded, so the same vectors always give the same index.
+    """
+    n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+    rng = np.random.RandomState(seed)
+    train = vectors[rng.choice(len(vectors), min(sample, len(vectors)), replace=False)]
+    centroids = train[rng.choice(len(train), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _assign(train, centroids)
+        for c in range(n_lists):
+            members = train[assignments == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+    assignments = _assign(vectors, centroids)
+    order, offsets = _lists(assignments, n_lists)
+    return {"centroids": centroids, "assignments": assignments, "order": order, "offsets": offsets}
+
+
+def extend_ivf(ivf, vectors):
+    """Assign rows appended since the index was built, keeping the centroids."""
+    centroids = ivf["centroids"]
+    assignments = np.concatenate([ivf["assignments"], _assign(vectors[ivf["assignments"].size:], centroids)])
+    order, offsets = _lists(assignments, len(centroids))
+    return {"centroids": centroids, "assignments": assignments, "order": order, "offsets": offsets}
+
+
+class SimilarityIndex:
+    """Nearest-neighbour search over embeddings of the books in a BookCatalog.
+
+    Vectors are appended to <catalog>/vectors-<dim>.f32 (doc ids alongside),
+    so only books added since the last sync are embedded. Small catalogs are
+    searched exactly with one matrix product; larger ones through an IVF index
+    (k-means centroids, scanning only the lists nearest to the query).
+    Replaced and removed books are filtered with the catalog's tombstones.
+    Worker processes sharing a catalog take turns to sync (an flock on
+    <catalog>/vectors-*.lock) and pick up the rows the others appended.
+    """
+
+    def __init__(self, catalog, embedder=None, ivf_min_items=IVF_MIN_ITEMS, nprobe=IVF_NPROBE):
+        self.catalog = catalog
+        self.embedder = embedder or make_book_embedder()
+        self.ivf_min_items = ivf_min_items
+        self.nprobe = nprobe
+        name = type(self.embedder).__name__.lower()
+        self._vectors_path = os.path.join(catalog.path, f"vectors-{name}-{self.embedder.dim}.f32")
+        self._ids_path = os.path.join(catalog.path, f"vectors-{name}-{self.embedder.dim}.ids")
+        self._lock_path = os.path.join(catalog.path, f"vectors-{name}-{self.embedder.dim}.lock")
+        self._vectors = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._positions = {}
+        self._ivf = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        # Rows appended to the files since they were last read (all of them at first)
+        if not os.path.exists(self._ids_path):
+            return
+        dim = self.embedder.dim
+        start = self._ids.size
+        ids = np.fromfile(self._ids_path, dtype=np.int64, offset=start * 8)
+        vectors = np.fromfile(self._vectors_path, dtype=np.float32, offset=start * dim * 4)
+        # A crash (or another process) mid-append can leave one side longer; take the complete rows
+        rows = min(ids.size, vectors.size // dim)
+        if not rows:
+            return
+        with self._lock:
+            self._vectors = np.concatenate([self._vectors, vectors[:rows * dim].reshape(rows, dim)])
+            self._ids = np.concatenate([self._ids, ids[:rows]])
+            self._positions.update((int(doc_id), start + i) for i, doc_id in enumerate(ids[:rows]))
+
+    @contextlib.contextmanager
+    def _sync_lock(self):
+        # Held from reading the files to the last append; closing the file releases it
+        with open(self._lock_path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def sync(self, batch_size=2000):
+        """Embed catalog books added since the last sync; returns how many."""
+        added = 0
+        with self._sync_lock():
+            self._load()
+            # Drop a partial row left by a crashed append so the two files stay aligned
+            rows = self._ids.size
+            for path, row_bytes in ((self._ids_path, 8), (self._vectors_path, self.embedder.dim * 4)):
+                if os.path.exists(path) and os.path.getsize(path) > rows * row_bytes:
+                    os.truncate(path, rows * row_bytes)
+            after = int(self._ids[-1]) if rows else 0
+            batch = []
+            for book in self.catalog.iter_docs(after=after, batch_size=batch_size):
+                batch.append(book)
+                if len(batch) >= batch_size:
+                    added += self._append(batch)
+                    batch = []
+            if batch:
+                added += self._append(batch)
+        if added:
+            logger.info(f"Similarity index: embedded {added} books ({self._ids.size} total)")
+        # Build or extend the IVF lists now rather than on the first query
+        with self._lock:
+            self._ivf_index()
+        return added
+
+    def _append(self, books):
+        vectors = np.asarray(self.embedder.embed_batch(books), dtype=np.float32)
+        ids = np.asarray([book["doc_id"] for book in books], dtype=np.int64)
+        with open(self._vectors_path, "ab") as f:
+            vectors.tofile(f)
+        with open(self._ids_path, "ab") as f:
+            ids.tofile(f)
+        with self._lock:
+            start = self._ids.size
+            self._vectors = np.concatenate([self._vectors, vectors])
+            self._ids = np.concatenate([self._ids, ids])
+            self._positions.update((int(doc_id), start + i) for i, doc_id in enumerate(ids))
+        return len(books)
+
+    def _ivf_index(self):
+        # Built lazily; books appended by sync() are assigned to the existing lists
+        if self._ids.size < self.ivf_min_items:
+            return None
+        if self._ivf is None:
+            self._ivf = build_ivf(self._vectors)
+        elif self._ivf["assignments"].size < self._ids.size:
+            self._ivf = extend_ivf(self._ivf, self._vectors)
+        return self._ivf
+
+    def _search(self, queries, k):
+        # Returns (positions, similarities), each of shape (len(queries), k)
+        k = min(k, self._ids.size)
+        ivf = self._ivf_index()
+        if ivf is None:
+            return exact_search(self._vectors, queries, k)
+        # Probe the lists of the nearest centroids only
+        nprobe = min(self.nprobe, len(ivf["centroids"]))
+        nearest = np.argsort(-(queries @ ivf["centroids"].T), axis=1, kind="stable")[:, :nprobe]
+        positions, sims = [], []
+        for row, lists in enumerate(nearest):
+            candidates = np.concatenate([
+                ivf["order"][ivf["offsets"][c]:ivf["offsets"][c + 1]] for c in lists
+            ])
+            top_pos, top_sim = exact_search(self._vectors[candidates], queries[row:row + 1], k)
+            positions.append(np.pad(candidates[top_pos[0]], (0, k - top_pos.shape[1]), constant_values=-1))
+            sims.append(np.pad(top_sim[0], (0, k - top_sim.shape[1]), constant_values=-np.inf))
+        return np.stack(positions), np.stack(sims)
+
+    def similar_to_vectors(self, queries, limit=5, exclude=None):
+        """Top `limit` live books per query vector; exclude[i] is a doc id to skip for row i."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if not self._ids.size or not len(queries):
+            return [[] for _ in range(len(queries))]
+        self.catalog.refresh()
+        with self._lock:
+            ids = self._ids
+            # Over-fetch so tombstoned books and the query book itself can be dropped
+            positions, sims = self._search(queries, limit * 2 + 1)
+        matches = []
+        for row, (row_positions, row_sims) in enumerate(zip(positions, sims)):
+            doc_ids = ids[row_positions]
+            # Lists shorter than k are padded with -1
+            keep = (row_positions >= 0) & self.catalog.is_live(doc_ids)
+            if exclude is not None and exclude[row] is not None:
+                keep &= doc_ids != exclude[row]
+            matches.append([(int(d), float(s)) for d, s in zip(doc_ids[keep], row_sims[keep])][:limit])
+        return matches
+
+    def similar_batch(self, titles, limit=5, known_only=False):
+        """Recommendations for several titles with one matrix product.
+
+        Titles found in the catalog use their stored vector; unknown titles are
+        embedded from the title text alone, or get no results with known_only.
+        Returns one list of books per title.
+        """
+        queries, exclude, known = [], [], []
+        for title in titles:
+            found = self.catalog.find_title(title, limit=1)
+            position = self._positions.get(found[0]["doc_id"]) if found else None
+            known.append(position is not None)
+            if position is not None:
+                queries.append(self._vectors[position])
+                exclude.append(found[0]["doc_id"])
+            else:
+                queries.append(self.embedder.embed(found[0] if found else {"title": title}))
+                exclude.append(found[0]["doc_id"] if found else None)
+        results = []
+        rows = self.similar_to_vectors(np.stack(queries), limit + 2, exclude)
+        for title, row, is_known in zip(titles, rows, known):
+            if known_only and not is_known:
+                results.append([])
+                continue
+            similarity = dict(row)
+            books = []
+            for book in self.catalog.get_books([doc_id for doc_id, _ in row]):
+                # Other editions of the queried book are not recommendations
+                if tokenize(book["title"]) == tokenize(title):
+                    continue
+                book["similarity"] = round(similarity[book["doc_id"]], 4)
+                books.append(book)
+            results.append(books[:limit])
+        return results
+
+    def similar(self, title, limit=5, known_only=False):
+        return self.similar_batch([title], limit, known_only)[0]
+
+    def get_stats(self):
+        return {"vectors": int(self._ids.size), "dim": self.embedder.dim, "ivf": self._ivf is not None}
+
+
+def main(argv=None):
+    import argparse
+    import json
+    import time
+    from book_catalog import BookCatalog
+
+    parser = argparse.ArgumentParser(description="Embed the book catalog and query similar books.")
+    parser.add_argument("--catalog", default=os.getenv("BOOK_CATALOG_PATH", "book_catalog"))
+    parser.add_argument("titles", nargs="*", help="titles to find similar books for")
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    index = SimilarityIndex(BookCatalog(args.catalog))
+    started = time.perf_counter()
+    print(f"synced {index.sync()} new books in {time.perf_counter() - started:.1f}s")
+    if args.titles:
+        started = time.perf_counter()
+        results = index.similar_batch(args.titles, args.limit)
+        elapsed = (time.perf_counter() - started) * 1000
+        for title, books in zip(args.titles, results):
+            print(f"{title}:")
+            for book in books:
+                print(f"  {book['similarity']:.3f}  {book['title']} - {book['author']}")
+        print(f"{len(args.titles)} queries in {elapsed:.1f}ms")
+    print(json.dumps(index.get_stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _retrieve(task):
+    # Mark the outcome retrieved so a call every caller gave up on does not log
+    # "exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    """Coalesce identical concurrent calls into one.
+
+    The first caller for a key runs the function; callers arriving with the
+    same key while it is in flight wait for it and share its result (or its
+    exception). do() is for threads, ado() for coroutines on an event loop.
+    Nothing is remembered once the call finishes; caching is the caller's job.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["calls"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def ado(self, key, coro_func):
+        # Tasks belong to one event loop, so in-flight calls are tracked per loop
+        loop = asyncio.get_running_loop()
+        flight = (loop, key)
+        with self._lock:
+            task = self._tasks.get(flight)
+            if task is None:
+                # The call runs in a task owned by the flight, not by the first caller
+                task = self._tasks[flight] = loop.create_task(self._run_flight(flight, coro_func))
+                task.add_done_callback(_retrieve)
+                self.stats["calls"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        # shield: a cancelled caller (the first one included) only stops waiting;
+        # the others still get the result
+        return await asyncio.shield(task)
+
+    async def _run_flight(self, flight, coro_func):
+        try:
+            return await coro_func()
+        finally:
+            with self._lock:
+                del self._tasks[flight]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._calls) + len(self._tasks)
+        return stats
@@ -0,0 +1,111 @@
+"""Cold-start benchmark: how long a fresh worker takes to import the app and
+to build the agent, measured in clean subprocesses.
+
+    python startup_bench.py --app app2.py --runs 5
+    python startup_bench.py --max-import-ms 800      # exit 1 when over budget
+    python startup_bench.py --importtime             # slowest imports (-X importtime)
+
+No network calls are made: API keys default to dummy values and the agent's
+SQLite files go to a temporary directory.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in the child: import the app module, then build what the first request needs
+PROBE = """
+import importlib.util, json, sys, time
+sys.path[:0] = [{app_dir!r}, {here!r}]
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location("startup_bench_app", {path!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+import book_agent
+book_agent.get_graph()
+graph_built = time.perf_counter()
+book_agent.preload()
+preloaded = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "graph_ms": (graph_built - imported) * 1000,
+    "preload_ms": (preloaded - graph_built) * 1000,
+    "modules": len(sys.modules),
+}}))
+"""
+
+
+def child_env(workdir):
+    env = dict(os.environ)
+    for var, name in [("SEARCH_CACHE_PATH", "search_cache.sqlite3"), ("ANSWER_CACHE_PATH", "answer_cache.sqlite3"),
+                      ("CHECKPOINT_DB_PATH", "checkpoints.sqlite3")]:
+        env.setdefault(var, os.path.join(workdir, name))
+    env.setdefault("BOOK_CATALOG_PATH", os.path.join(workdir, "book_catalog"))
+    for var in ("OPENAI_API_KEY", "GOOGLE_API_KEY", "GOOGLE_CSE_ID"):
+        env.setdefault(var, "fake")
+    env.setdefault("TRANSLATION_BACKEND", "phrases")
+    return env
+
+
+def measure(path, runs):
+    """Run the probe `runs` times; returns one dict of timings per run."""
+    code = PROBE.format(here=HERE, app_dir=os.path.dirname(os.path.abspath(path)), path=os.path.abspath(path))
+    samples = []
+    with tempfile.TemporaryDirectory(prefix="startup-bench-") as workdir:
+        for _ in range(runs):
+            result = subprocess.run([sys.executable, "-c", code], cwd=HERE, env=child_env(workdir),
+                                    capture_output=True, text=True, check=True)
+            samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+def slowest_imports(path, top):
+    """Modules with the largest cumulative import time for the app (-X importtime)."""
+    app_dir = os.path.dirname(os.path.abspath(path))
+    code = f"import sys; sys.path[:0] = [{app_dir!r}, {HERE!r}]; import {os.path.splitext(os.path.basename(path))[0]}"
+    with tempfile.TemporaryDirectory(prefix="startup-bench-") as workdir:
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=HERE,
+                                env=child_env(workdir), capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1000, name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="app2.py", help="Flask/FastAPI module to import")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, help="fail when the median app import exceeds this")
+    parser.add_argument("--importtime", action="store_true", help="list the slowest imports")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    if args.importtime:
+        for ms, name in slowest_imports(args.app, args.top):
+            print(f"{ms:9.1f} ms  {name}")
+        return
+
+    samples = measure(args.app, args.runs)
+    for key in ("import_ms", "graph_ms", "preload_ms"):
+        values = [sample[key] for sample in samples]
+        print(f"{key:<11} median {statistics.median(values):8.1f}  min {min(values):8.1f}  max {max(values):8.1f}")
+    print(f"modules loaded after preload: {samples[-1]['modules']}")
+
+    median_import = statistics.median(sample["import_ms"] for sample in samples)
+    if args.max_import_ms is not None and median_import > args.max_import_ms:
+        print(f"app import took {median_import:.1f} ms, over the {args.max_import_ms:.0f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import logging
+import time
+
+from langchain_core.messages import AIMessageChunk
+
+logger = logging.getLogger(__name__)
+
+# Headers that stop proxies (nginx, gunicorn buffering) from holding chunks back
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+# Token chunks come from "messages"; finished tool calls/results from "updates"
+STREAM_MODES = ["messages", "updates"]
+
+
+def format_sse(event, data):
+    """Encode one Server-Sent-Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _text(content):
+    # Message content is a string, or a list of content blocks from some providers
+    if isinstance(content, str):
+        return content
+    return "".join(block if isinstance(block, str) else block.get("text", "")
+                   for block in content if isinstance(block, (str, dict)))
+
+
+def _events_from_chunk(mode, chunk):
+    # Map one (mode, chunk) pair from graph.stream/astream to (event, data) pairs
+    if mode == "messages":
+        message, metadata = chunk
+        if isinstance(message, AIMessageChunk) and message.content:
+            yield "token", {
+                "content": message.content,
+                "node": metadata.get("langgraph_node")
+            }
+        return
+
+    for node, update in chunk.items():
+        for message in (update or {}).get("messages", []):
+            if message.type == "ai":
+                # Text the model wrote alongside its tool calls ("Let me look that up") comes first
+                text = _text(message.content)
+                if text:
+                    yield "message", {"role": "assistant", "content": text}
+                for call in message.tool_calls:
+                    yield "tool_call", {"id": call["id"], "name": call["name"], "args": call["args"]}
+            elif message.type == "tool":
+                yield "tool_result", {
+                    "id": message.tool_call_id,
+                    "name": message.name,
+                    "content": message.content,
+                    # Structured book records, when the tool produced them
+                    "records": getattr(message, "artifact", None) or []
+                }
+
+
+def iter_agent_events(graph, inputs, config=None):
+    """Run the graph and yield (event, data) pairs as soon as they are produced.
+
+    LLM tokens arrive one chunk at a time, and tool calls / tool results
+    arrive as each node finishes.
+    """
+    for mode, chunk in graph.stream(inputs, config=config, stream_mode=STREAM_MODES):
+        yield from _events_from_chunk(mode, chunk)
+
+
+async def aiter_agent_events(graph, inputs, config=None):
+    """Async version of iter_agent_events built on graph.astream."""
+    async for mode, chunk in graph.astream(inputs, config=config, stream_mode=STREAM_MODES):
+        for event in _events_from_chunk(mode, chunk):
+            yield event
+
+
+def _question(inputs):
+    message = inputs["messages"][-1]
+    return message[1] if isinstance(message, tuple) else message.content
+
+
+def _has_checkpointer(graph):
+    return getattr(graph, "checkpointer", None) is not None
+
+
+def _finish(graph, started, ttfb_ms, config, usage, trace, cached=False):
+    # Timings (and token usage, like /query reports it) for the `done` frame
+    total_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"Streamed query: ttfb_ms={ttfb_ms} total_ms={total_ms:.1f}")
+    # Without a checkpointer the graph keeps no thread to continue
+    thread_id = (config or {}).get("configurable", {}).get("thread_id") if _has_checkpointer(graph) else None
+    done = {"ttfb_ms": ttfb_ms, "total_ms": total_ms, "thread_id": thread_id}
+    if cached:
+        done["cached"] = True
+    if usage is not None:
+        done["usage"] = usage.report()
+        if trace is not None:
+            trace.usage = done["usage"]
+    return format_sse("done", done)
+
+
+def stream_query(graph, inputs, config=None, translate=None, answer_cache=None, namespace="",
+                 usage=None, trace=None):
+    """Yield SSE frames for one query, ending with a `done` frame carrying timings.
+
+    Time-to-first-byte (first frame sent) is reported separately from total
+    completion time so the two can be tracked independently. With `translate`
+    (answer -> {language: text}), the final answer's translations follow as
+    `translation` frames once the answer itself has streamed.
+
+    Like /query, an `answer_cache` (pass it for new conversations only) is
+    checked first under `namespace`, and a hit is sent as one cached `message`
+    frame; otherwise the streamed answer is stored in it. With `usage` (a
+    TokenUsageTracker in config's callbacks) the `done` frame carries the
+    token usage, which is also set on the request's metrics `trace`.
+    """
+    started = time.perf_counter()
+    ttfb_ms = None
+    answer = None
+    cached = False
+    try:
+        if answer_cache is not None:
+            answer = answer_cache.lookup(_question(inputs), namespace=namespace)
+        if answer is not None:
+            cached = True
+            if _has_checkpointer(graph):
+                graph.update_state(config, {"messages": [("user", _question(inputs)), ("assistant", answer)]}, as_node="agent")
+            ttfb_ms = (time.perf_counter() - started) * 1000
+            yield format_sse("message", {"role": "assistant", "content": answer, "cached": True})
+        else:
+            for event, data in iter_agent_events(graph, inputs, config):
+                if ttfb_ms is None:
+                    ttfb_ms = (time.perf_counter() - started) * 1000
+                if event == "message":
+                    answer = data["content"]
+                yield format_sse(event, data)
+            if answer_cache is not None and answer:
+                answer_cache.store(_question(inputs), answer, namespace=namespace)
+        if translate and answer:
+            for language, content in translate(answer).items():
+                yield format_sse("translation", {"language": language, "content": content})
+    except Exception as e:
+        logger.error(f"Error while streaming query: {str(e)}")
+        yield format_sse("error", {"error": str(e)})
+
+    yield _finish(graph, started, ttfb_ms, config, usage, trace, cached)
+
+
+async def astream_query(graph, inputs, config=None, translate=None, answer_cache=None, namespace="",
+                        usage=None, trace=None):
+    """Async version of stream_query for the ASGI server."""
+    started = time.perf_counter()
+    ttfb_ms = None
+    answer = None
+    cached = False
+    try:
+        # The cache's embedding and SQLite work and the translation backends are blocking
+        if answer_cache is not None:
+            answer = await asyncio.to_thread(answer_cache.lookup, _question(inputs), namespace=namespace)
+        if answer is not None:
+            cached = True
+            if _has_checkpointer(graph):
+                await graph.aupdate_state(config, {"messages": [("user", _question(inputs)), ("assistant", answer)]}, as_node="agent")
+            ttfb_ms = (time.perf_counter() - started) * 1000
+            yield format_sse("message", {"role": "assistant", "content": answer, "cached": True})
+        else:
+            async for event, data in aiter_agent_events(graph, inputs, config):
+                if ttfb_ms is None:
+                    ttfb_ms = (time.perf_counter() - started) * 1000
+                if event == "message":
+                    answer = data["content"]
+                yield format_sse(event, data)
+            if answer_cache is not None and answer:
+                await asyncio.to_thread(answer_cache.store, _question(inputs), answer, namespace=namespace)
+        if translate and answer:
+            for language, content in (await asyncio.to_thread(translate, answer)).items():
+                yield format_sse("translation", {"language": language, "content": content})
+    except Exception as e:
+        logger.error(f"Error while streaming query: {str(e)}")
+        yield format_sse("error", {"error": str(e)})
+
+    yield _finish(graph, started, ttfb_ms, config, usage, trace, cached)
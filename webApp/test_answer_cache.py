@@ -0,0 +1,96 @@
+import pytest
+
+from answer_cache import AnswerCache
+
+QUESTION = "What are the best fantasy books?"
+ANSWER = "The Hobbit, Earthsea and Mistborn."
+
+
+def make_cache(**kwargs):
+    cache = AnswerCache(max_entries=16, **kwargs)
+    cache.store(QUESTION, ANSWER)
+    return cache
+
+
+def test_rephrased_question_hits():
+    cache = make_cache()
+    assert cache.lookup("what are the best fantasy books") == ANSWER
+    assert cache.lookup("What are the best fantasy book?") == ANSWER
+
+
+@pytest.mark.parametrize("question", [
+    "what books are trending?",
+    "show me trending books",
+    "Which books are trending now?",
+    "what's popular right now?",
+])
+def test_paraphrases_hit(question):
+    cache = AnswerCache(max_entries=16)
+    cache.store("trending books?", "Fourth Wing.")
+    assert cache.lookup(question) == "Fourth Wing."
+
+
+def test_synonyms_and_plurals_hit():
+    cache = make_cache()
+    assert cache.lookup("Top fantasy novels") == ANSWER
+    cache.store("Which fantasy books are good for kids?", "Narnia.")
+    assert cache.lookup("good fantasy books for children") == "Narnia."
+
+
+@pytest.mark.parametrize("question", [
+    "what books are not trending?",
+    "trending romance books",
+    "trending books by Sanderson",
+    "old trending books",
+])
+def test_contradictory_or_narrower_questions_miss(question):
+    cache = AnswerCache(max_entries=16)
+    cache.store("trending books?", "Fourth Wing.")
+    assert cache.lookup(question) is None
+
+
+@pytest.mark.parametrize("cached, question", [
+    ("price of Harry Potter 2", "price of Harry Potter 1"),
+    ("is Tomorrow available?", "is Tomorrow and Tomorrow available?"),
+    ("is Tomorrow available?", "is tomorrow and tomorrow available"),
+    ("is Dune available?", "is Emma available?"),
+])
+def test_different_numbers_or_titles_miss(cached, question):
+    cache = AnswerCache(max_entries=16, threshold=0.5)
+    cache.store(cached, "Cached answer.")
+    assert cache.lookup(question) is None
+    assert cache.lookup(cached) == "Cached answer."
+
+
+def test_opposite_superlative_misses():
+    assert make_cache().lookup("What are the worst fantasy books?") is None
+
+
+def test_added_qualifier_misses():
+    assert make_cache().lookup("What are the best fantasy books for kids?") is None
+
+
+def test_negation_misses():
+    cache = make_cache()
+    cache.store("Which fantasy books are good for kids?", "Narnia.")
+    assert cache.lookup("Which fantasy books are not good for kids?") is None
+    assert cache.lookup("fantasy books that aren't good for kids") is None
+
+
+def test_guard_holds_below_the_default_threshold():
+    # Even a permissive threshold does not let a different question through
+    assert make_cache(threshold=0.5).lookup("What are the worst fantasy books?") is None
+
+
+def test_namespaces_do_not_mix():
+    cache = make_cache()
+    assert cache.lookup(QUESTION, namespace="fr") is None
+    cache.store(QUESTION, "Bilbo le Hobbit.", namespace="fr")
+    assert cache.lookup(QUESTION, namespace="fr") == "Bilbo le Hobbit."
+    assert cache.lookup(QUESTION) == ANSWER
+
+
+def test_store_persists_for_other_workers(tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    make_cache(path=path)
+    assert AnswerCache(path=path, max_entries=16).lookup(QUESTION) == ANSWER
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import threading
+
+from fastapi.testclient import TestClient
+
+import async_app
+from loadtest import FAKE_ANSWER
+
+
+def sse_events(body):
+    events = []
+    for frame in body.strip().split("\n\n"):
+        event, data = frame.split("\n", 1)
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_lifespan_preloads_and_closes_clients(monkeypatch):
+    calls = []
+
+    async def aclose_clients():
+        calls.append("aclose_clients")
+
+    monkeypatch.setattr(async_app, "preload", lambda: calls.append("preload"))
+    monkeypatch.setattr(async_app.transport, "aclose_clients", aclose_clients)
+    with TestClient(async_app.app):
+        assert calls == ["preload"]
+    assert calls == ["preload", "aclose_clients"]
+
+
+def test_query_runs_the_tools_then_caches_the_answer(fake_agent):
+    client = TestClient(async_app.app)
+    body = client.post("/query", json={"message": "What trending books are out?"}).json()
+    responses = body["responses"]
+    assert responses[0]["content"] == "What trending books are out?"
+    assert "Fourth Wing" in responses[-2]["content"]
+    assert responses[-1] == {"role": "assistant", "content": FAKE_ANSWER}
+    assert body["usage"]["total_tokens"] > 0
+    assert fake_agent == ["trending books fantasy"]
+
+    again = client.post("/query", json={"message": "what trending books are out"}).json()
+    assert again["cached"] is True
+    assert again["responses"] == [responses[-1]]
+    assert len(fake_agent) == 1
+
+
+def test_query_rejects_unknown_language(fake_agent):
+    response = TestClient(async_app.app).post("/query", json={"message": "hi", "language": "de"})
+    assert response.status_code == 400
+
+
+def test_query_stream_sends_tool_events_then_done(fake_agent):
+    response = TestClient(async_app.app).post(
+        "/query/stream", json={"message": "What trending books are out?", "language": "en", "alternates": ["fr"]})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response.text)
+    names = [event for event, _ in events]
+    assert names == ["tool_call", "tool_result", "message", "translation", "done"]
+    assert events[0][1]["name"] == "search_trending_books"
+    assert events[1][1]["records"][0]["title"] == "Fourth Wing (The Empyrean, #1)"
+    assert events[3][1] == {"language": "fr", "content": "Voici les livres"}
+    assert events[-1][1]["thread_id"]
+
+
+def test_async_tools_run_local_lookups_off_the_event_loop():
+    import book_agent
+
+    threads = []
+
+    def local():
+        threads.append(threading.current_thread())
+        return [{"title": "Dune", "author": "Frank Herbert"}]
+
+    text, records = asyncio.run(book_agent.arun_lookup(book_agent.BookLookup(local, "dune", "find_similar_books", "Header:")))
+    assert threads[0] is not threading.main_thread()
+    assert text.startswith("Header:\n- Dune by Frank Herbert")
+    assert records[0]["sources"] == ["catalog"]
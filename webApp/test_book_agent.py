@@ -0,0 +1,23 @@
+import asyncio
+
+import book_agent
+from book_agent import arun_lookup, author_lookup, run_lookup
+
+BIO = {"title": "Gabrielle Zevin - Wikipedia", "link": "https://en.wikipedia.org/wiki/Gabrielle_Zevin",
+       "snippet": "Gabrielle Zevin is an American novelist and screenwriter, author of Tomorrow, and Tomorrow."}
+
+
+class FakeSearch:
+    def results(self, query, num_results, tool=None):
+        return [BIO]
+
+    async def aresults(self, query, num_results, tool=None):
+        return [BIO]
+
+
+def test_author_info_keeps_the_biography(monkeypatch):
+    monkeypatch.setattr(book_agent, "get_search", FakeSearch)
+    lookup = author_lookup("Gabrielle Zevin")._replace(local=None)
+    for text, records in [run_lookup(lookup), asyncio.run(arun_lookup(lookup))]:
+        assert text == "Information about Gabrielle Zevin:\n- " + BIO["snippet"]
+        assert records[0]["url"] == BIO["link"]
@@ -0,0 +1,85 @@
+import pytest
+
+from book_catalog import BookCatalog, book_key, normalize_book
+
+BOOKS = [
+    {"title": "Fourth Wing", "author": "Rebecca Yarros", "genres": "Fantasy, Romance",
+     "description": "A dragon rider war college", "isbn": "9781649374042"},
+    {"title": "Iron Flame", "author": "Rebecca Yarros", "genres": "Fantasy",
+     "description": "The second dragon rider book", "isbn": "9781649374172"},
+    {"title": "The Midnight Library", "author": "Matt Haig", "genres": "Fiction",
+     "description": "A library between life and death", "isbn": "9781786892737"},
+    {"title": "Dragon Republic", "author": "R. F. Kuang", "genres": "Fantasy",
+     "description": "War and gods"},
+]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = BookCatalog(str(tmp_path / "catalog"))
+    catalog.add_books(normalize_book(row) for row in BOOKS)
+    return catalog
+
+
+def titles(books):
+    return [book["title"] for book in books]
+
+
+@pytest.mark.parametrize("row, key", [
+    ({"title": "Fourth Wing", "isbn13": "9781649374042"}, "isbn:9781649374042"),
+    ({"name": "The Midnight Library", "authors": ["Matt Haig"]}, "tk:midnight library|matt haig"),
+])
+def test_book_key(row, key):
+    assert book_key(normalize_book(row)) == key
+
+
+def test_added_books_are_searchable(catalog):
+    assert len(catalog) == 4
+    results = catalog.search("dragon rider")
+    assert set(titles(results)[:2]) == {"Fourth Wing", "Iron Flame"}
+    assert all(result["score"] > 0 for result in results)
+    assert catalog.search("nothing matches this") == []
+
+
+def test_title_matches_outrank_description_matches(catalog):
+    # "dragon" is in Dragon Republic's title but only in the others' descriptions
+    assert titles(catalog.search("dragon"))[0] == "Dragon Republic"
+
+
+def test_fielded_search_only_matches_that_field(catalog):
+    assert titles(catalog.search("library", field="title")) == ["The Midnight Library"]
+    assert set(titles(catalog.search("yarros", field="author"))) == {"Fourth Wing", "Iron Flame"}
+    assert set(titles(catalog.search("fantasy", field="genre"))) == {"Fourth Wing", "Iron Flame", "Dragon Republic"}
+    # "war" is in descriptions only
+    assert catalog.search("war", field="title") == []
+    assert titles(catalog.find_author("rebecca yarros", limit=1)) in (["Fourth Wing"], ["Iron Flame"])
+
+
+def test_update_tombstones_the_old_version(catalog):
+    catalog.add_books([normalize_book({**BOOKS[0], "description": "A griffin flier academy"})])
+    assert len(catalog) == 4
+    assert catalog.get_stats()["tombstones"] == 1
+    assert "Fourth Wing" not in titles(catalog.search("dragon rider"))
+    [book] = catalog.search("griffin")
+    assert book["title"] == "Fourth Wing"
+
+
+def test_remove_hides_the_book(catalog):
+    assert catalog.remove(normalize_book(BOOKS[2]))
+    assert not catalog.remove(normalize_book(BOOKS[2]))
+    assert catalog.search("library") == []
+    assert len(catalog) == 3
+
+
+def test_compact_merges_segments_and_drops_tombstones(catalog, tmp_path):
+    catalog.add_books([normalize_book({**BOOKS[0], "description": "A griffin flier academy"})])
+    before = titles(catalog.search("fantasy yarros"))
+    assert catalog.get_stats() == {"documents": 4, "segments": 2, "tombstones": 1}
+
+    catalog.compact()
+    assert catalog.get_stats() == {"documents": 4, "segments": 1, "tombstones": 0}
+    # Document frequencies stop counting the dropped postings, so only the ranking is stable
+    assert titles(catalog.search("fantasy yarros")) == before
+    assert titles(catalog.search("griffin")) == ["Fourth Wing"]
+    # A second process opening the same files sees the compacted index
+    assert titles(BookCatalog(str(tmp_path / "catalog")).search("griffin")) == ["Fourth Wing"]
@@ -0,0 +1,118 @@
+import pytest
+
+from book_records import clean_title, extract_record, extract_records, format_records, retailer_for
+
+AMAZON = {
+    "title": "Amazon.com: Fourth Wing (The Empyrean, 1): 9781649374042: Yarros, Rebecca: Books",
+    "link": "https://www.amazon.com/Fourth-Wing-Empyrean-Rebecca-Yarros/dp/1649374046",
+    "snippet": "Fourth Wing (The Empyrean, 1) · Hardcover. $17.99 $29.99",
+}
+GOODREADS = {
+    "title": "Fourth Wing (The Empyrean, #1) by Rebecca Yarros | Goodreads",
+    "link": "https://www.goodreads.com/book/show/61431922-fourth-wing",
+    "snippet": "Twenty-year-old Violet Sorrengail was supposed to enter the Scribe Quadrant.",
+}
+BARNES_AND_NOBLE = {
+    "title": "Fourth Wing (Empyrean Series #1) by Rebecca Yarros, Hardcover | Barnes & Noble®",
+    "link": "https://www.barnesandnoble.com/w/fourth-wing-rebecca-yarros/1142283213",
+    "snippet": "Hardcover $19.79 $29.99",
+}
+AMAZON_IRON_FLAME = {
+    "title": "Amazon.com: Iron Flame (The Empyrean, 2): 9781649374172: Yarros, Rebecca: Books",
+    "link": "https://www.amazon.com/Iron-Flame-Empyrean-Rebecca-Yarros/dp/1649374178",
+    "snippet": "Iron Flame (The Empyrean, 2) · Hardcover. $18.00",
+}
+
+
+@pytest.mark.parametrize("raw, title", [
+    ("Amazon.com: Fourth Wing (The Empyrean, 1): 9781649374042: Yarros, Rebecca: Books",
+     "Fourth Wing (The Empyrean, 1)"),
+    ("Tomorrow, and Tomorrow, and Tomorrow: A novel: Zevin, Gabrielle: 9780593321201: Amazon.com: Books",
+     "Tomorrow, and Tomorrow, and Tomorrow"),
+    ("Amazon.co.uk : The Midnight Library: Haig, Matt: 9781786892737: Books", "The Midnight Library"),
+    ("Fourth Wing (The Empyrean, #1) by Rebecca Yarros | Goodreads", "Fourth Wing (The Empyrean, #1) by Rebecca Yarros"),
+    ("Project Hail Mary - Andy Weir", "Project Hail Mary"),
+    ("Fourth Wing (Empyrean Series #1) by Rebecca Yarros, Hardcover | Barnes & Noble®",
+     "Fourth Wing (Empyrean Series #1) by Rebecca Yarros, Hardcover"),
+    # Only Amazon's ISBN titles lose their subtitle
+    ("Harry Potter: The Chamber of Secrets | Goodreads", "Harry Potter: The Chamber of Secrets"),
+])
+def test_clean_title(raw, title):
+    assert clean_title(raw) == title
+
+
+@pytest.mark.parametrize("result, title, author, prices, source", [
+    (AMAZON, "Fourth Wing (The Empyrean, 1)", "Rebecca Yarros", {"Amazon": "$17.99"}, "Amazon"),
+    (GOODREADS, "Fourth Wing (The Empyrean, #1)", "Rebecca Yarros", {}, "Goodreads"),
+    (BARNES_AND_NOBLE, "Fourth Wing (Empyrean Series #1)", "Rebecca Yarros",
+     {"Barnes & Noble": "$19.79"}, "Barnes & Noble"),
+    ({"title": "Tomorrow, and Tomorrow, and Tomorrow: A novel: Zevin, Gabrielle: 9780593321201: Amazon.com: Books",
+      "link": "https://www.amazon.co.uk/dp/0593321200", "snippet": "Paperback £9.99"},
+     "Tomorrow, and Tomorrow, and Tomorrow", "Gabrielle Zevin", {"Amazon": "£9.99"}, "Amazon"),
+    ({"title": "The Midnight Library by Matt Haig - Waterstones",
+      "link": "https://www.waterstones.com/book/the-midnight-library/matt-haig/9781786892737",
+      "snippet": "Paperback £9.99"},
+     "The Midnight Library", "Matt Haig", {"Waterstones": "£9.99"}, "Waterstones"),
+])
+def test_extract_record(result, title, author, prices, source):
+    record = extract_record(result)
+    assert (record["title"], record["author"], record["prices"], record["sources"]) == (title, author, prices, [source])
+
+
+@pytest.mark.parametrize("url, retailer", [
+    ("https://www.amazon.com/dp/1649374046", "Amazon"),
+    ("https://www.barnesandnoble.com/w/x/1", "Barnes & Noble"),
+    ("https://bookshop.org/p/books/x", "Bookshop.org"),
+    ("https://example.org/books", "example.org"),
+    (None, None),
+])
+def test_retailer_for(url, retailer):
+    assert retailer_for(url) == retailer
+
+
+def test_amazon_titles_are_not_merged_into_one_book():
+    records = extract_records([AMAZON, AMAZON_IRON_FLAME])
+    assert [record["title"] for record in records] == ["Fourth Wing (The Empyrean, 1)", "Iron Flame (The Empyrean, 2)"]
+
+
+def test_same_book_from_several_sites_is_merged():
+    records = extract_records([AMAZON_IRON_FLAME, GOODREADS, AMAZON, BARNES_AND_NOBLE])
+    fourth_wing = records[0]
+    assert fourth_wing["hits"] == 3
+    assert fourth_wing["author"] == "Rebecca Yarros"
+    assert fourth_wing["sources"] == ["Goodreads", "Amazon", "Barnes & Noble"]
+    assert fourth_wing["prices"] == {"Amazon": "$17.99", "Barnes & Noble": "$19.79"}
+    assert records[1]["title"] == "Iron Flame (The Empyrean, 2)"
+
+
+def test_format_records():
+    text = format_records(extract_records([AMAZON_IRON_FLAME]))
+    assert text == ("- Iron Flame (The Empyrean, 2) by Rebecca Yarros | Amazon $18.00 | "
+                    "Iron Flame (The Empyrean, 2) · Hardcover. $18.00 <" + AMAZON_IRON_FLAME["link"] + ">")
+
+
+@pytest.mark.parametrize("title", [
+    "The 10 Best Books of 2024",
+    "Fantasy Books | Waterstones",
+    "Books Like Fourth Wing - Goodreads",
+    "New York Times Best Sellers",
+])
+def test_list_pages_are_not_books(title):
+    result = {"title": title, "link": "https://www.nytimes.com/x", "snippet": "James by Percival Everett, $18.00"}
+    assert extract_record(result) is None
+
+
+def test_author_comes_from_the_snippet_only_right_after_the_title():
+    result = {"title": "James | Goodreads", "link": "https://www.goodreads.com/book/show/1",
+              "snippet": "James by Percival Everett. A retelling of Huckleberry Finn."}
+    assert extract_record(result)["author"] == "Percival Everett"
+    result["snippet"] = "Readers of James also liked Demon Copperhead by Barbara Kingsolver."
+    assert extract_record(result)["author"] is None
+
+
+def test_subtitles_keep_books_apart():
+    records = extract_records([
+        {"title": "Harry Potter: The Chamber of Secrets | Goodreads", "link": "https://www.goodreads.com/1"},
+        {"title": "Harry Potter: The Prisoner of Azkaban | Goodreads", "link": "https://www.goodreads.com/2"},
+    ])
+    assert len(records) == 2
@@ -0,0 +1,131 @@
+import asyncio
+
+from langchain_core.messages import AIMessage
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from checkpointer import SqliteCheckpointSaver, thread_config
+
+
+def echo(state):
+    return {"messages": [AIMessage(content=f"echo: {state['messages'][-1].content}")]}
+
+
+def make_graph(saver):
+    builder = StateGraph(MessagesState)
+    builder.add_node("echo", echo)
+    builder.add_edge(START, "echo")
+    builder.add_edge("echo", END)
+    return builder.compile(checkpointer=saver)
+
+
+def stored_bytes(saver, thread_id):
+    conn = saver._connect()
+    return sum(conn.execute(f"SELECT COALESCE(SUM(LENGTH(blob)), 0) FROM {table} WHERE thread_id = ?",
+                            (thread_id,)).fetchone()[0] for table in ("blobs", "list_items"))
+
+
+def count(saver, table, thread_id):
+    return saver._connect().execute(f"SELECT COUNT(*) FROM {table} WHERE thread_id = ?", (thread_id,)).fetchone()[0]
+
+
+def test_conversation_survives_a_new_saver(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite3")
+    thread_id, config = thread_config()
+    make_graph(SqliteCheckpointSaver(path)).invoke({"messages": [("user", "hi")]}, config)
+    state = make_graph(SqliteCheckpointSaver(path)).invoke({"messages": [("user", "again")]}, config)
+    assert [m.content for m in state["messages"]] == ["hi", "echo: hi", "again", "echo: again"]
+
+
+def test_old_checkpoints_and_blobs_are_pruned(tmp_path):
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.sqlite3"), keep=3)
+    graph = make_graph(saver)
+    thread_id, config = thread_config()
+    for turn in range(20):
+        state = graph.invoke({"messages": [("user", f"turn {turn}")]}, config)
+    assert len(state["messages"]) == 40
+    assert count(saver, "checkpoints", thread_id) == 3
+    # One messages version per kept checkpoint at most, not one per step
+    messages_blobs = saver._connect().execute(
+        "SELECT COUNT(*) FROM blobs WHERE thread_id = ? AND channel = 'messages'", (thread_id,)
+    ).fetchone()[0]
+    assert messages_blobs <= 3
+    # Every kept checkpoint still loads in full
+    history = list(graph.get_state_history(config))
+    assert len(history) == 3
+    assert len(history[0].values["messages"]) == 40
+
+
+def test_keep_none_keeps_every_checkpoint(tmp_path):
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.sqlite3"), keep=None)
+    graph = make_graph(saver)
+    thread_id, config = thread_config()
+    for turn in range(5):
+        graph.invoke({"messages": [("user", f"turn {turn}")]}, config)
+    assert count(saver, "checkpoints", thread_id) == 5 * 3
+
+
+def test_async_methods(tmp_path):
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.sqlite3"), keep=3)
+    graph = make_graph(saver)
+    _, config = thread_config()
+
+    async def main():
+        for turn in range(4):
+            state = await graph.ainvoke({"messages": [("user", f"turn {turn}")]}, config)
+        history = [item async for item in saver.alist(config)]
+        return state, history, await saver.aget_tuple(config)
+
+    state, history, latest = asyncio.run(main())
+    assert len(state["messages"]) == 8
+    assert len(history) == 3
+    assert len(latest.checkpoint["channel_values"]["messages"]) == 8
+
+
+def test_each_turn_writes_only_its_own_messages(tmp_path):
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.sqlite3"), keep=None)
+    graph = make_graph(saver)
+    thread_id, config = thread_config()
+    written = []
+    for turn in range(30):
+        before = stored_bytes(saver, thread_id)
+        graph.invoke({"messages": [("user", f"turn {turn:03}")]}, config)
+        written.append(stored_bytes(saver, thread_id) - before)
+    # Rewriting the whole list each step would add two messages' worth per turn
+    message_bytes = written[0] // 2
+    assert max(written[1:]) - min(written[1:]) < message_bytes
+    # Only the new messages' rows: two per turn, nothing copied from earlier turns
+    assert count(saver, "list_items", thread_id) == 60
+
+
+def test_edited_message_is_stored_as_a_new_version(tmp_path):
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.sqlite3"), keep=None)
+    graph = make_graph(saver)
+    _, config = thread_config()
+    graph.invoke({"messages": [("user", "first")]}, config)
+    graph.invoke({"messages": [("user", "second")]}, config)
+    first_answer = graph.get_state(config).values["messages"][1]
+    graph.update_state(config, {"messages": [AIMessage(content="edited", id=first_answer.id)]})
+
+    contents = [m.content for m in graph.get_state(config).values["messages"]]
+    assert contents == ["first", "edited", "second", "echo: second"]
+    # Earlier checkpoints still read the messages they had
+    older = [[m.content for m in state.values.get("messages", [])] for state in graph.get_state_history(config)]
+    assert ["first", "echo: first", "second", "echo: second"] in older
+    # A new saver (another worker) sees the same thing
+    reloaded = SqliteCheckpointSaver(saver.path).get_tuple(config).checkpoint["channel_values"]["messages"]
+    assert [m.content for m in reloaded] == contents
+
+
+def test_forking_an_old_checkpoint_leaves_the_other_branch_intact(tmp_path):
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.sqlite3"), keep=None)
+    graph = make_graph(saver)
+    _, config = thread_config()
+    graph.invoke({"messages": [("user", "first")]}, config)
+    after_first = graph.get_state(config).config
+    graph.invoke({"messages": [("user", "second")]}, config)
+    original = graph.get_state(config).config
+
+    graph.invoke({"messages": [("user", "other")]}, after_first)
+    contents = lambda state: [m.content for m in state.values["messages"]]
+    assert contents(graph.get_state(config)) == ["first", "echo: first", "other", "echo: other"]
+    assert contents(graph.get_state(original)) == ["first", "echo: first", "second", "echo: second"]
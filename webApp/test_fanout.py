@@ -0,0 +1,76 @@
+import contextvars
+import logging
+import threading
+import time
+
+from fanout import fan_out
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def test_results_keep_the_order_of_the_arguments():
+    assert fan_out(lambda n: n * 2, [(1,), (2,), (3,)], max_concurrency=2) == [2, 4, 6]
+
+
+def test_failed_source_is_none_and_logged(caplog):
+    def search(source):
+        if source == "Goodreads":
+            raise ConnectionError("upstream down")
+        return [source]
+
+    sources = ["Oprah", "Goodreads", "NY Times"]
+    with caplog.at_level(logging.WARNING, logger="fanout"):
+        results = fan_out(search, [(source,) for source in sources], names=sources)
+    assert results == [["Oprah"], None, ["NY Times"]]
+    assert "Goodreads failed: ConnectionError('upstream down')" in caplog.text
+
+
+def test_late_source_is_dropped_at_its_deadline(caplog):
+    release = threading.Event()
+
+    def search(source):
+        if source == "slow":
+            release.wait(5)
+        return source
+
+    started = time.monotonic()
+    with caplog.at_level(logging.WARNING, logger="fanout"):
+        results = fan_out(search, [("fast",), ("slow",)], deadline=0.2, names=["fast", "slow"])
+    release.set()
+    assert results == ["fast", None]
+    assert time.monotonic() - started < 1
+    assert "slow did not finish within 0.2s" in caplog.text
+
+
+def test_abandoned_call_keeps_its_slot_until_it_returns():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def search(seconds):
+        with lock:
+            running.append(seconds)
+            peak.append(len(running))
+        time.sleep(seconds)
+        with lock:
+            running.remove(seconds)
+        return seconds
+
+    results = fan_out(search, [(0.3,), (0.01,)], max_concurrency=1, deadline=0.2)
+    assert results == [None, 0.01]
+    assert max(peak) == 1
+
+
+def test_calls_without_a_slot_are_skipped_once_time_is_up():
+    release = threading.Event()
+    results = fan_out(lambda n: release.wait(5) or n, [(1,), (2,)], max_concurrency=1, deadline=0.1)
+    release.set()
+    assert results == [None, None]
+
+
+def test_context_variables_follow_the_calls():
+    token = request_id.set("req-1")
+    try:
+        assert fan_out(lambda: request_id.get(), [(), ()]) == ["req-1", "req-1"]
+    finally:
+        request_id.reset(token)
@@ -0,0 +1,25 @@
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import metrics
+
+
+def test_fastapi_trace_finishes_after_the_streamed_body(monkeypatch):
+    events = []
+    monkeypatch.setattr(metrics.RequestTrace, "finish", lambda self, status="ok", usage=None: events.append(f"finish {status}"))
+    app = FastAPI()
+
+    @app.post("/query/stream")
+    async def stream():
+        async def body():
+            for n in range(3):
+                events.append(f"chunk {n}")
+                yield f"data: {n}\n\n"
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    metrics.install_fastapi(app)
+    response = TestClient(app).post("/query/stream")
+    assert response.status_code == 200
+    assert response.headers["X-Request-ID"]
+    assert events == ["chunk 0", "chunk 1", "chunk 2", "finish 200"]
@@ -0,0 +1,58 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from loadtest import make_fake_model
+from model_tiers import TieredChatModel
+
+QUESTION = [HumanMessage(content="Any trending fantasy books?")]
+AFTER_TOOLS = QUESTION + [
+    AIMessage(content="", tool_calls=[{"id": "call_1", "name": "search_trending_books", "args": {"query": "fantasy"}}]),
+    ToolMessage(content="The Hobbit", tool_call_id="call_1"),
+]
+
+
+def calls(model):
+    stats = model.get_stats()
+    return {key: stats[key] for key in ("router_calls", "answer_calls", "direct_answers")}
+
+
+def test_router_picks_the_tools():
+    model = TieredChatModel(make_fake_model(0), make_fake_model(0))
+    response = model.invoke(QUESTION)
+    assert response.tool_calls
+    assert calls(model) == {"router_calls": 1, "answer_calls": 0, "direct_answers": 0}
+
+
+def test_tool_results_go_straight_to_the_main_model():
+    model = TieredChatModel(make_fake_model(0), make_fake_model(0))
+    response = model.invoke(AFTER_TOOLS)
+    assert not response.tool_calls and response.content
+    assert calls(model) == {"router_calls": 0, "answer_calls": 1, "direct_answers": 1}
+    response = asyncio.run(model.ainvoke(AFTER_TOOLS))
+    assert calls(model) == {"router_calls": 0, "answer_calls": 2, "direct_answers": 2}
+
+
+def test_router_answer_is_used_without_the_main_model():
+    model = TieredChatModel(make_fake_model(0), make_fake_model(0), route_after_tools=True)
+    bound = model.bind_tools([])
+    assert bound.invoke(AFTER_TOOLS).content
+    # Copies made by bind_tools count into the model's stats
+    assert calls(model) == {"router_calls": 1, "answer_calls": 0, "direct_answers": 0}
+
+
+def test_router_declining_escalates():
+    router = make_fake_model(0, tool_script=[("escalate", {"reason": "ambiguous"})])
+    model = TieredChatModel(router, make_fake_model(0)).bind_tools([])
+    response = asyncio.run(model.ainvoke(QUESTION))
+    # The main model's tool call, not the router's escalate
+    assert response.tool_calls[0]["name"] != "escalate"
+    stats = model.get_stats()
+    assert (stats["router_calls"], stats["answer_calls"], stats["escalations_declined"]) == (1, 1, 1)
+
+
+def test_stats_are_per_model():
+    first, second = (TieredChatModel(make_fake_model(0), make_fake_model(0)) for _ in range(2))
+    first.invoke(QUESTION)
+    assert calls(first)["router_calls"] == 1
+    assert calls(second)["router_calls"] == 0
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import tool
+
+from parallel_tools import ParallelToolNode
+
+release = threading.Event()
+
+
+@tool
+def echo(text: str):
+    """Return the text."""
+    return text
+
+
+@tool
+def hang(text: str):
+    """Block until the test releases it."""
+    release.wait(5)
+    return text
+
+
+@tool
+def whose(text: str, config: RunnableConfig):
+    """Return the request the call ran for."""
+    return f"{text} for {config['metadata']['request']}"
+
+
+def turn(*calls):
+    tool_calls = [{"id": f"call_{i}", "name": name, "args": {"text": text}} for i, (name, text) in enumerate(calls)]
+    return {"messages": [AIMessage(content="", tool_calls=tool_calls)]}
+
+
+def contents(output):
+    return [(message.content, message.status) for message in output["messages"]]
+
+
+def test_empty_turn():
+    node = ParallelToolNode([echo])
+    assert node.invoke(turn()) == {"messages": []}
+    assert asyncio.run(node.ainvoke(turn())) == {"messages": []}
+
+
+def test_results_keep_the_call_order():
+    node = ParallelToolNode([echo], max_concurrency=2)
+    calls = [("echo", str(n)) for n in range(5)]
+    expected = [(str(n), "success") for n in range(5)]
+    assert contents(node.invoke(turn(*calls))) == expected
+    assert contents(asyncio.run(node.ainvoke(turn(*calls)))) == expected
+
+
+def test_calls_past_the_deadline_get_an_error_message():
+    node = ParallelToolNode([echo, hang], deadline=0.2)
+    started = time.monotonic()
+    try:
+        output = contents(node.invoke(turn(("echo", "fast"), ("hang", "slow"))))
+    finally:
+        release.set()
+    assert time.monotonic() - started < 2
+    assert output[0] == ("fast", "success")
+    assert output[1][1] == "error" and "did not finish" in output[1][0]
+
+
+def test_every_call_runs_with_the_step_config():
+    node = ParallelToolNode([whose])
+    config = {"metadata": {"request": "r1"}}
+    expected = [("a for r1", "success"), ("b for r1", "success")]
+    assert contents(node.invoke(turn(("whose", "a"), ("whose", "b")), config)) == expected
+    assert contents(asyncio.run(node.ainvoke(turn(("whose", "a"), ("whose", "b")), config))) == expected
+
+
+def test_list_input_and_tool_errors():
+    node = ParallelToolNode([echo])
+    output = node.invoke(turn(("echo", "ok"), ("missing", "x"))["messages"])
+    assert [(message.content, message.status) for message in output][0] == ("ok", "success")
+    assert output[1].status == "error"
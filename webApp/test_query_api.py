@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from langgraph.prebuilt import create_react_agent
+
+import book_agent
+from answer_cache import AnswerCache
+from loadtest import FAKE_ANSWER, make_fake_model
+from query_api import aanswer_query, answer_query, parse_query, stream_answer, translate_body
+
+QUESTION = "What trending books are out?"
+
+
+@pytest.fixture
+def cache():
+    return AnswerCache(max_entries=16)
+
+
+def test_parse_query():
+    query = parse_query({"message": QUESTION, "language": "English", "alternates": ["fr"]})
+    assert (query.message, query.language, query.alternates, query.new_thread) == (QUESTION, "en", ["fr"], True)
+    assert query.config["configurable"] == {"thread_id": query.thread_id, "language": "en"}
+    assert query.usage in query.config["callbacks"]
+    assert not parse_query({"message": "again", "thread_id": query.thread_id}).new_thread
+    with pytest.raises(ValueError):
+        parse_query({"message": QUESTION, "language": "de"})
+
+
+def test_answer_then_cached_answer_with_translations(fake_agent, cache):
+    graph = book_agent.get_graph()
+    body = answer_query(graph, parse_query({"message": QUESTION}), cache)
+    assert body["responses"][-1] == {"role": "assistant", "content": FAKE_ANSWER}
+    assert body["usage"]["total_tokens"] > 0 and "cached" not in body
+
+    query = parse_query({"message": "what trending books are out", "alternates": ["fr"]})
+    again = answer_query(graph, query, cache)
+    assert again["cached"] is True and again["thread_id"] == query.thread_id
+    assert again["alternates"] == {"fr": "Voici les livres"}
+    # The cached exchange is in the thread, so a follow-up sees it
+    messages = graph.get_state(query.config).values["messages"]
+    assert [m.content for m in messages] == ["what trending books are out", FAKE_ANSWER]
+    assert fake_agent == ["trending books fantasy"]
+
+
+def test_follow_ups_skip_the_cache(fake_agent, cache):
+    graph = book_agent.get_graph()
+    first = answer_query(graph, parse_query({"message": QUESTION}), cache)
+    follow_up = answer_query(graph, parse_query({"message": QUESTION, "thread_id": first["thread_id"]}), cache)
+    assert "cached" not in follow_up
+    assert len(fake_agent) == 2
+
+
+def test_graph_without_checkpointer_returns_no_thread_id(fake_agent, cache):
+    graph = create_react_agent(make_fake_model(0), tools=book_agent.tools)
+    body = answer_query(graph, parse_query({"message": "hello"}), cache)
+    assert body["thread_id"] is None
+    assert body["responses"][-1]["content"] == FAKE_ANSWER
+    # The cache hit has no thread to be written to
+    cached = answer_query(graph, parse_query({"message": "hello"}), cache)
+    assert cached["cached"] and cached["thread_id"] is None
+
+
+def test_async_answer_matches_sync(fake_agent, cache):
+    body = asyncio.run(aanswer_query(book_agent.get_graph(), parse_query({"message": QUESTION}), cache))
+    assert body["responses"][-1]["content"] == FAKE_ANSWER
+    again = asyncio.run(aanswer_query(book_agent.get_graph(), parse_query({"message": QUESTION}), cache))
+    assert again["cached"] is True
+
+
+def test_stream_answer_uses_the_cache_for_new_threads_only(fake_agent, cache):
+    graph = book_agent.get_graph()
+    answer_query(graph, parse_query({"message": QUESTION}), cache)
+    frames = list(stream_answer(graph, parse_query({"message": QUESTION}), cache))
+    assert frames[0].startswith("event: message") and '"cached": true' in frames[0]
+    query = parse_query({"message": QUESTION, "thread_id": "earlier"})
+    assert list(stream_answer(graph, query, cache))[0].startswith("event: tool_call")
+
+
+def test_translate_body(fake_agent):
+    assert translate_body({"text": FAKE_ANSWER, "targets": ["fr"]}) == {"alternates": {"fr": "Voici les livres"}}
+    with pytest.raises(ValueError):
+        translate_body({"text": "hi", "language": "de"})
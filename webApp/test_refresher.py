@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from refresher import BackgroundRefresher
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return ["books", self.calls]
+
+
+def make_refresher(monkeypatch, path=None, **kwargs):
+    refresher = BackgroundRefresher(path=path, **kwargs)
+    # Tests drive the scheduler through run_pending() instead of the daemon thread
+    monkeypatch.setattr(refresher, "_ensure_started", lambda: None)
+    return refresher
+
+
+def age(refresher, name, seconds):
+    value, refreshed_at = refresher._read(name)
+    refresher._write(name, value, refreshed_at - seconds)
+
+
+def test_cold_miss_computes_inline_once(monkeypatch):
+    job = Counter()
+    refresher = make_refresher(monkeypatch)
+    refresher.add("trending", job, interval=60)
+    assert refresher.get("trending") == ["books", 1]
+    assert refresher.get("trending") == ["books", 1]
+    assert job.calls == 1
+    stats = refresher.get_stats()
+    assert (stats["misses"], stats["hits"]) == (1, 1)
+
+
+def test_stale_value_is_served_and_wakes_the_scheduler(monkeypatch):
+    job = Counter()
+    refresher = make_refresher(monkeypatch)
+    refresher.add("trending", job, interval=60)
+    refresher.get("trending")
+    age(refresher, "trending", 120)
+
+    assert refresher.get("trending") == ["books", 1]
+    assert refresher._wake.is_set()
+    assert refresher.get_stats()["stale_hits"] == 1
+    refresher.run_pending()
+    assert refresher.get("trending") == ["books", 2]
+
+
+def test_value_older_than_max_stale_is_recomputed_inline(monkeypatch):
+    job = Counter()
+    refresher = make_refresher(monkeypatch, max_stale=300)
+    refresher.add("trending", job, interval=60)
+    refresher.get("trending")
+    age(refresher, "trending", 600)
+    assert refresher.get("trending") == ["books", 2]
+
+
+def test_jobs_nobody_reads_are_not_refreshed(monkeypatch):
+    read, unread = Counter(), Counter()
+    refresher = make_refresher(monkeypatch, idle_after=60)
+    refresher.add("read", read, interval=1)
+    refresher.add("unread", unread, interval=1)
+    refresher.warm()
+    refresher.get("read")
+    age(refresher, "read", 10)
+    age(refresher, "unread", 10)
+
+    refresher.run_pending()
+    assert (read.calls, unread.calls) == (2, 1)
+
+
+def test_failed_refresh_keeps_serving_the_old_value(monkeypatch):
+    values = iter([["books", 1]])
+
+    def job():
+        return next(values)
+
+    refresher = make_refresher(monkeypatch)
+    refresher.add("trending", job, interval=60)
+    refresher.get("trending")
+    age(refresher, "trending", 120)
+    assert not refresher.refresh("trending")
+    assert refresher.get("trending") == ["books", 1]
+    assert refresher.get_stats()["refresh_failures"] == 1
+
+
+def test_lease_lets_one_worker_refresh_at_a_time(monkeypatch, tmp_path):
+    path = str(tmp_path / "refresh.sqlite3")
+    first, second = Counter(), Counter()
+    worker_a = make_refresher(monkeypatch, path=path)
+    worker_b = make_refresher(monkeypatch, path=path)
+    worker_a.add("trending", first, interval=60)
+    worker_b.add("trending", second, interval=60)
+
+    # Worker A holds the lease, so B neither refreshes nor blocks
+    assert worker_a._acquire_lease("trending")
+    assert not worker_b.refresh("trending")
+    assert second.calls == 0
+
+    # Writing the value releases the lease for the next refresh
+    worker_a._compute(worker_a.jobs["trending"])
+    assert worker_b.get("trending") == ["books", 1]
+    assert worker_b.refresh("trending")
+    assert worker_a.get("trending") == ["books", 1]
+    assert second.calls == 1
+
+
+def test_expired_lease_can_be_taken_over(monkeypatch, tmp_path):
+    path = str(tmp_path / "refresh.sqlite3")
+    worker_a = make_refresher(monkeypatch, path=path)
+    worker_b = make_refresher(monkeypatch, path=path)
+    worker_b.add("trending", Counter(), interval=60)
+    assert worker_a._acquire_lease("trending")
+    worker_a._connect().execute("UPDATE refreshed SET lease_until = ?", (time.time() - 1,))
+    assert worker_b.refresh("trending")
+
+
+def test_aget_computes_then_serves_stored_value(monkeypatch):
+    job = Counter()
+    refresher = make_refresher(monkeypatch)
+    refresher.add("trending", job, interval=60)
+    assert asyncio.run(refresher.aget("trending")) == ["books", 1]
+    assert asyncio.run(refresher.aget("trending")) == ["books", 1]
+    assert job.calls == 1
+
+
+def test_cold_miss_waits_for_the_worker_holding_the_lease(monkeypatch, tmp_path):
+    path = str(tmp_path / "refresh.sqlite3")
+    first, second = Counter(), Counter()
+    worker_a = make_refresher(monkeypatch, path=path)
+    worker_b = make_refresher(monkeypatch, path=path)
+    worker_a.add("trending", first, interval=60)
+    worker_b.add("trending", second, interval=60)
+    assert worker_a._acquire_lease("trending")
+
+    values = []
+    waiting = threading.Thread(target=lambda: values.append(worker_b.get("trending")))
+    waiting.start()
+    time.sleep(0.2)
+    assert values == []
+    worker_a._compute(worker_a.jobs["trending"])
+    waiting.join(timeout=5)
+    assert values == [["books", 1]]
+    assert second.calls == 0
+
+
+def test_failed_cold_miss_releases_the_lease(monkeypatch, tmp_path):
+    path = str(tmp_path / "refresh.sqlite3")
+    worker = make_refresher(monkeypatch, path=path)
+
+    def failing():
+        raise RuntimeError("search down")
+
+    worker.add("trending", failing, interval=60)
+    with pytest.raises(RuntimeError):
+        worker.get("trending")
+    assert worker._acquire_lease("trending")
@@ -0,0 +1,201 @@
+import asyncio
+import copy
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import search_cache
+import transport
+from search_cache import NO_RESULT_MARKERS, CachedSearch, SearchCache, normalize_query
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(search_cache.time, "time", clock)
+    return clock
+
+
+# A Custom Search JSON API response, trimmed to the fields the wrapper reads plus some it ignores
+CSE_RESPONSE = {
+    "kind": "customsearch#search",
+    "queries": {"request": [{"searchTerms": "fourth wing", "count": 3, "startIndex": 1}]},
+    "searchInformation": {"searchTime": 0.31, "totalResults": "2410000"},
+    "items": [
+        {"kind": "customsearch#result",
+         "title": "Fourth Wing (The Empyrean, #1) by Rebecca Yarros | Goodreads",
+         "htmlTitle": "<b>Fourth Wing</b> (The Empyrean, #1) by Rebecca Yarros | Goodreads",
+         "link": "https://www.goodreads.com/book/show/61431922-fourth-wing",
+         "displayLink": "www.goodreads.com",
+         "snippet": "Fourth Wing by Rebecca Yarros. Twenty-year-old Violet Sorrengail was supposed to...",
+         "pagemap": {"metatags": [{"og:type": "books.book"}]}},
+        {"kind": "customsearch#result",
+         "title": "Fourth Wing: Yarros, Rebecca: 9781649374042: Amazon.com: Books",
+         "link": "https://www.amazon.com/Fourth-Wing-Empyrean-Rebecca-Yarros/dp/1649374046",
+         "displayLink": "www.amazon.com"},
+        {"kind": "customsearch#result",
+         "title": "Iron Flame by Rebecca Yarros",
+         "link": "https://www.barnesandnoble.com/w/iron-flame-rebecca-yarros/1143387283",
+         "snippet": "Iron Flame, $19.79"},
+    ],
+}
+
+
+@pytest.fixture
+def cse(monkeypatch):
+    """Answers every Custom Search request with CSE_RESPONSE; yields the requests sent."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=CSE_RESPONSE)
+
+    mock = httpx.MockTransport(handler)
+    monkeypatch.setattr(transport, "get_client", lambda name: httpx.Client(transport=mock))
+    monkeypatch.setattr(transport, "get_async_client", lambda name: httpx.AsyncClient(transport=mock))
+    return requests
+
+
+def cse_wrapper():
+    return SimpleNamespace(google_api_key="api-key", google_cse_id="engine-id", siterestrict=False, k=3)
+
+
+def disk_rows(cache):
+    return cache._connect().execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+
+
+def test_writes_purge_long_expired_rows(tmp_path):
+    cache = SearchCache(path=str(tmp_path / "search.sqlite3"), stale_ttl=60, purge_every=3)
+    cache.set("old", "result", ttl=-120)
+    cache.set("recently expired", "result", ttl=-30)
+    assert disk_rows(cache) == 2
+    cache.set("fresh", "result")
+    # The row expired within stale_ttl is kept for get_stale()
+    assert disk_rows(cache) == 2
+    other_worker = SearchCache(path=cache.path)
+    assert other_worker.get_stale("recently expired") == "result"
+    assert other_worker.get_stale("old") is None
+    assert cache.get_stats()["purged"] == 1
+
+
+def test_disk_rows_are_capped(tmp_path):
+    cache = SearchCache(path=str(tmp_path / "search.sqlite3"), max_disk_rows=5, purge_every=10)
+    for n in range(20):
+        cache.set(f"query {n}", "result", ttl=60 + n)
+    assert disk_rows(cache) == 5
+    # The rows that expire last are the ones kept
+    assert SearchCache(path=cache.path).get("query 19") == "result"
+    assert SearchCache(path=cache.path).get("query 0") is None
+
+
+def test_cached_search_copies_without_recursing():
+    search = CachedSearch(wrapper_factory=lambda: None, cache=SearchCache(path=None))
+    # copy builds the new object without __init__, so _wrapper is unset while it probes attributes
+    clone = copy.copy(search)
+    assert clone.cache is search.cache
+    blank = CachedSearch.__new__(CachedSearch)
+    with pytest.raises(AttributeError):
+        blank.wrapper
+
+
+def test_entries_expire_after_their_tool_ttl(tmp_path, clock):
+    cache = SearchCache(path=str(tmp_path / "search.sqlite3"), ttls={"get_author_info": 100}, default_ttl=10)
+    cache.set("Rebecca Yarros", "author bio", tool="get_author_info")
+    cache.set("fantasy", "trending")
+    clock.now += 50
+    assert cache.get("Rebecca Yarros", tool="get_author_info") == "author bio"
+    assert cache.get("fantasy") is None
+    clock.now += 51
+    assert cache.get("Rebecca Yarros", tool="get_author_info") is None
+    # The expired row is still there for upstream outages
+    assert SearchCache(path=cache.path).get_stale("Rebecca Yarros", tool="get_author_info") == "author bio"
+
+
+def test_memory_is_lru(tmp_path):
+    cache = SearchCache(path=str(tmp_path / "search.sqlite3"), max_entries=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"
+    cache.set("c", "C")
+    assert cache.get_stats()["evictions"] == 1
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+    assert cache.get_stats()["disk_hits"] == 0
+    # "b" was the least recently used: it is only on disk now
+    assert cache.get("b") == "B"
+    assert cache.get_stats()["disk_hits"] == 1
+    assert cache.get_stats()["size"] == 2
+
+
+def test_queries_are_normalized():
+    assert normalize_query('  Fourth   "Wing" ') == "fourth wing"
+    cache = SearchCache(path=None)
+    cache.set("Fourth Wing", "result", tool="search_trending_books")
+    assert cache.get("  fourth  'wing'", tool="search_trending_books") == "result"
+    # The same query for another tool is another entry
+    assert cache.get("Fourth Wing", tool="get_author_info") is None
+
+
+@pytest.mark.parametrize("result", ["", "   ", None, NO_RESULT_MARKERS[0] + "."])
+def test_empty_results_get_the_negative_ttl(clock, result):
+    cache = SearchCache(path=None, default_ttl=600, negative_ttl=60)
+    cache.set("nothing here", result)
+    clock.now += 59
+    assert cache.get("nothing here") is not None
+    assert cache.get_stats()["negative_hits"] == 1
+    clock.now += 2
+    assert cache.get("nothing here") is None
+
+
+def test_hit_and_miss_counters(tmp_path):
+    path = str(tmp_path / "search.sqlite3")
+    SearchCache(path=path).set("on disk", "result")
+    cache = SearchCache(path=path)
+    cache.set("in memory", "result")
+    assert cache.get("in memory") == "result"
+    assert cache.get("on disk") == "result"
+    assert cache.get("on disk") == "result"
+    assert cache.get("missing") is None
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["disk_hits"], stats["misses"], stats["writes"]) == (3, 1, 1, 1)
+    assert stats["hit_rate"] == 0.75
+
+
+def test_maps_a_recorded_cse_response(tmp_path, cse):
+    search = CachedSearch(cse_wrapper(), SearchCache(path=str(tmp_path / "search.sqlite3")))
+    assert search.run("Fourth Wing", tool="search_trending_books") == (
+        "Fourth Wing by Rebecca Yarros. Twenty-year-old Violet Sorrengail was supposed to... Iron Flame, $19.79")
+    request = cse[0]
+    assert request.url.copy_with(query=None) == search_cache.CSE_URL
+    assert dict(request.url.params) == {"key": "api-key", "cx": "engine-id", "q": "Fourth Wing", "num": "3"}
+
+    records = [{"title": item["title"], "link": item["link"], "snippet": item.get("snippet", "")}
+               for item in CSE_RESPONSE["items"]]
+    assert search.results("Fourth Wing", 20, tool="search_trending_books") == records
+    # The API serves at most 10 results a request
+    assert cse[1].url.params["num"] == "10"
+    assert asyncio.run(search.aresults("Iron Flame", 3)) == records
+    assert len(cse) == 3
+    # Served from the cache from here on
+    assert search.results("fourth wing", 20, tool="search_trending_books") == records
+    assert len(cse) == 3
+
+
+def test_matches_the_wrapper_on_a_recorded_cse_response(monkeypatch, tmp_path, cse):
+    utilities = pytest.importorskip("langchain_community.utilities")
+    wrapper = utilities.GoogleSearchAPIWrapper.model_construct(google_api_key="api-key", google_cse_id="engine-id", k=3)
+    monkeypatch.setattr(type(wrapper), "_google_search_results",
+                        lambda self, query, **kwargs: CSE_RESPONSE["items"][:kwargs["num"]])
+    search = CachedSearch(wrapper, SearchCache(path=str(tmp_path / "search.sqlite3")))
+    assert search.run("Fourth Wing") == wrapper.run("Fourth Wing")
+    # Apart from the default snippet, results() is the wrapper's
+    assert search.results("Fourth Wing", 3) == [dict(record, snippet=record.get("snippet", ""))
+                                                for record in wrapper.results("Fourth Wing", 3)]
@@ -0,0 +1,63 @@
+import threading
+
+import numpy as np
+
+from book_catalog import BookCatalog
+from similarity_index import SimilarityIndex
+
+GENRES = ["fantasy", "mystery", "romance", "history"]
+
+
+def books(start, count):
+    return [
+        {"title": f"Book {n}", "author": f"Author {n % 7}", "genres": [GENRES[n % 4]],
+         "description": f"A {GENRES[n % 4]} story number {n}", "extra": {}}
+        for n in range(start, start + count)
+    ]
+
+
+def file_ids(index):
+    return np.fromfile(index._ids_path, dtype=np.int64)
+
+
+def test_concurrent_syncs_embed_each_book_once(tmp_path):
+    catalog = BookCatalog(str(tmp_path / "catalog"))
+    catalog.add_books(books(0, 300))
+    # One index per "worker process", all syncing the same files at once
+    indexes = [SimilarityIndex(catalog) for _ in range(4)]
+    threads = [threading.Thread(target=index.sync, kwargs={"batch_size": 50}) for index in indexes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ids = file_ids(indexes[0])
+    assert sorted(ids.tolist()) == list(range(1, 301))
+    assert np.fromfile(indexes[0]._vectors_path, dtype=np.float32).size == 300 * indexes[0].embedder.dim
+    # Every worker ends up with all the rows, whoever embedded them
+    for index in indexes:
+        assert index._ids.tolist() == ids.tolist()
+
+    catalog.add_books(books(300, 20))
+    assert indexes[1].sync() == 20
+    assert indexes[2].sync() == 0
+    assert indexes[2]._ids.size == 320
+
+
+def test_sync_drops_a_partial_row(tmp_path):
+    catalog = BookCatalog(str(tmp_path / "catalog"))
+    catalog.add_books(books(0, 10))
+    index = SimilarityIndex(catalog)
+    index.sync()
+    # A crash between the two appends: vectors written, ids not
+    with open(index._vectors_path, "ab") as f:
+        np.zeros(index.embedder.dim, dtype=np.float32).tofile(f)
+    catalog.add_books(books(10, 5))
+
+    index = SimilarityIndex(catalog)
+    assert index.sync() == 5
+    reloaded = SimilarityIndex(catalog)
+    assert reloaded._ids.tolist() == list(range(1, 16))
+    np.testing.assert_allclose(reloaded._vectors, index._vectors)
+    book = catalog.get_books([15])[0]
+    np.testing.assert_allclose(reloaded._vectors[14], index.embedder.embed(book), atol=1e-6)
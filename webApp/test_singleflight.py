@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_do_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("k", slow))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["result"] * 10
+    assert len(calls) == 1
+    assert flights.get_stats()["in_flight"] == 0
+
+
+def test_do_shares_the_exception():
+    flights = SingleFlight()
+
+    def fail():
+        raise ValueError("upstream down")
+
+    with pytest.raises(ValueError):
+        flights.do("k", fail)
+
+
+def test_ado_cancelled_leader_does_not_cancel_followers():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "result"
+
+    async def main():
+        leader = asyncio.create_task(flights.ado("k", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.ado("k", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "result"
+    assert len(calls) == 1
+
+
+def test_ado_shares_the_exception_and_clears_the_flight():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream down")
+
+    async def main():
+        return await asyncio.gather(flights.ado("k", fail), flights.ado("k", fail), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    stats = flights.get_stats()
+    assert stats["calls"] == 1 and stats["coalesced"] == 1 and stats["in_flight"] == 0
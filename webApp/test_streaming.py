@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langgraph.prebuilt import create_react_agent
+
+import book_agent
+from answer_cache import AnswerCache
+from checkpointer import thread_config
+from loadtest import FAKE_ANSWER
+from streaming import astream_query, stream_query
+from token_budget import TokenUsageTracker
+
+QUESTION = "What trending books are out?"
+
+
+def parse(frames):
+    events = []
+    for frame in frames:
+        event, data = frame.rstrip("\n").split("\n", 1)
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def run(answer_cache=None, usage=None, translate=None):
+    _, config = thread_config(None)
+    if usage is not None:
+        config["callbacks"] = [usage]
+    inputs = {"messages": [("user", QUESTION)]}
+    return parse(stream_query(book_agent.get_graph(), inputs, config, translate=translate,
+                              answer_cache=answer_cache, usage=usage))
+
+
+class BrokenModel(BaseChatModel):
+    @property
+    def _llm_type(self):
+        return "broken"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise RuntimeError("model unavailable")
+
+
+def test_events_arrive_in_order(fake_agent):
+    events = run()
+    assert [event for event, _ in events] == ["tool_call", "tool_result", "message", "done"]
+    tool_call, tool_result, message, done = (data for _, data in events)
+    assert tool_call["name"] == "search_trending_books" and tool_call["args"] == {"query": "fantasy"}
+    assert tool_result["id"] == tool_call["id"]
+    assert message == {"role": "assistant", "content": FAKE_ANSWER}
+    assert done["thread_id"] and done["total_ms"] >= done["ttfb_ms"] > 0
+
+
+def test_tool_result_carries_book_records(fake_agent):
+    records = dict(run())["tool_result"]["records"]
+    assert records[0]["title"] == "Fourth Wing (The Empyrean, #1)"
+    assert records[0]["author"] == "Rebecca Yarros"
+    assert records[0]["sources"] == ["Goodreads"]
+
+
+def test_translations_follow_the_answer(fake_agent):
+    events = run(translate=lambda answer: {"fr": answer.upper()})
+    assert [event for event, _ in events][-3:] == ["message", "translation", "done"]
+    assert events[-2][1] == {"language": "fr", "content": FAKE_ANSWER.upper()}
+
+
+def test_model_error_becomes_an_error_event_then_done():
+    graph = create_react_agent(BrokenModel(), tools=[])
+    events = parse(stream_query(graph, {"messages": [("user", QUESTION)]}))
+    assert events[0] == ("error", {"error": "model unavailable"})
+    assert [event for event, _ in events] == ["error", "done"]
+
+
+def test_answer_cache_and_usage_match_query(fake_agent):
+    cache = AnswerCache(max_entries=16)
+    usage = TokenUsageTracker()
+    done = dict(run(answer_cache=cache, usage=usage))["done"]
+    assert done["usage"]["total_tokens"] > 0
+    assert cache.lookup(QUESTION) == FAKE_ANSWER
+
+    events = run(answer_cache=cache, usage=TokenUsageTracker())
+    assert [event for event, _ in events] == ["message", "done"]
+    assert events[0][1] == {"role": "assistant", "content": FAKE_ANSWER, "cached": True}
+    assert events[1][1]["cached"] is True
+    assert fake_agent == ["trending books fantasy"]
+
+
+def test_async_stream_matches_sync(fake_agent):
+    async def collect():
+        _, config = thread_config(None)
+        return [frame async for frame in astream_query(book_agent.get_graph(), {"messages": [("user", QUESTION)]}, config)]
+
+    assert [event for event, _ in parse(asyncio.run(collect()))] == ["tool_call", "tool_result", "message", "done"]
+
+
+class UpdatesGraph:
+    """Replays "updates" chunks; like a graph compiled without a checkpointer."""
+
+    checkpointer = None
+
+    def __init__(self, *updates):
+        self.updates = updates
+
+    def stream(self, inputs, config=None, stream_mode=None):
+        for update in self.updates:
+            yield "updates", update
+
+
+def test_text_next_to_tool_calls_is_streamed():
+    call = {"id": "call_1", "name": "search_trending_books", "args": {"query": "fantasy"}}
+    graph = UpdatesGraph({"agent": {"messages": [AIMessage(content="Let me look that up.", tool_calls=[call])]}},
+                         {"agent": {"messages": [AIMessage(content=[{"type": "text", "text": "Found them."}])]}})
+    events = parse(stream_query(graph, {"messages": [("user", QUESTION)]}))
+    assert [event for event, _ in events] == ["message", "tool_call", "message", "done"]
+    assert events[0][1]["content"] == "Let me look that up."
+    assert events[2][1]["content"] == "Found them."
+
+
+def test_no_thread_id_without_a_checkpointer():
+    _, config = thread_config(None)
+    graph = UpdatesGraph({"agent": {"messages": [AIMessage(content="Hi")]}})
+    done = dict(parse(stream_query(graph, {"messages": [("user", QUESTION)]}, config)))["done"]
+    assert done["thread_id"] is None
+
+    cache = AnswerCache(max_entries=16)
+    cache.store(QUESTION, "Hi")
+    # A cache hit is not written to a thread either
+    events = parse(stream_query(graph, {"messages": [("user", QUESTION)]}, config, answer_cache=cache))
+    assert [event for event, _ in events] == ["message", "done"] and events[1][1]["thread_id"] is None
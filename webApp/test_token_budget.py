@@ -0,0 +1,49 @@
+import threading
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+import token_budget
+from token_budget import TokenUsageTracker
+
+
+def test_encoding_is_set_up_once(monkeypatch):
+    loads = []
+
+    def fake_encoding_for_model(model):
+        loads.append(model)
+        time.sleep(0.05)
+        raise RuntimeError("offline")
+
+    import tiktoken
+    monkeypatch.setattr(tiktoken, "encoding_for_model", fake_encoding_for_model)
+    monkeypatch.setattr(token_budget, "_encodings", {})
+    threads = [threading.Thread(target=token_budget.count_tokens, args=("hello world", "test-model")) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == ["test-model"]
+
+
+def run_step(tracker, usage=None):
+    run_id = uuid.uuid4()
+    tracker.on_chat_model_start({}, [[HumanMessage(content="What are the best fantasy books?")]], run_id=run_id)
+    message = AIMessage(content="The Hobbit", usage_metadata=usage)
+    tracker.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]), run_id=run_id)
+
+
+def test_prompt_estimates_are_dropped_when_real_usage_arrives():
+    tracker = TokenUsageTracker()
+    run_step(tracker, {"input_tokens": 120, "output_tokens": 8, "total_tokens": 128})
+    assert tracker.summary()["prompt_tokens"] == 120
+    assert tracker._prompt_estimates == {}
+
+
+def test_prompt_estimate_used_without_usage():
+    tracker = TokenUsageTracker()
+    run_step(tracker)
+    assert tracker.summary()["prompt_tokens"] > 0
+    assert tracker._prompt_estimates == {}
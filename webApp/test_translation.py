@@ -0,0 +1,121 @@
+import asyncio
+import sys
+import threading
+import types
+
+from translation import GoogletransBackend, PhraseTableBackend, TranslationService, make_backend, print_stream, same_language
+
+PHRASES = {"ny": {"Hello": "Moni", "Thank you": "Zikomo"}, "fr": {"Hello": "Bonjour"}}
+
+
+class CountingBackend(PhraseTableBackend):
+    def __init__(self, table=PHRASES, source=None):
+        super().__init__(table)
+        self.source = source
+        self.calls = []
+
+    def translate_batch(self, texts, target_lang):
+        self.calls.append(list(texts))
+        return [(text, self.source) for text, _ in super().translate_batch(texts, target_lang)]
+
+
+def test_phrase_table_is_case_insensitive_and_passes_unknown_text_through():
+    backend = PhraseTableBackend(PHRASES)
+    assert backend.translate_batch([" hello ", "Good night"], "ny") == [("Moni", None), ("Good night", None)]
+    assert backend.translate_batch(["Hello"], "de") == [("Hello", None)]
+
+
+def test_phrase_table_from_file(tmp_path, monkeypatch):
+    path = tmp_path / "phrases.json"
+    path.write_text('{"ny": {"Hello": "Moni"}}', encoding="utf-8")
+    monkeypatch.setenv("TRANSLATION_PHRASES_PATH", str(path))
+    backend = make_backend("phrases")
+    assert isinstance(backend, PhraseTableBackend)
+    assert backend.translate_batch(["hello"], "ny") == [("Moni", None)]
+
+
+def test_repeated_text_is_memoized():
+    backend = CountingBackend()
+    service = TranslationService(backend)
+    assert service.translate("Hello", "ny") == "Moni"
+    assert service.translate("Hello", "ny") == "Moni"
+    assert service.translate("Hello", "fr") == "Bonjour"
+    assert backend.calls == [["Hello"], ["Hello"]]
+    assert service.get_stats() == {"hits": 1, "misses": 2, "skipped": 0, "backend_calls": 2, "size": 2}
+
+
+def test_batch_sends_each_missing_text_once():
+    backend = CountingBackend()
+    service = TranslationService(backend)
+    service.translate("Hello", "ny")
+    texts = ["Hello", "Thank you", "", "Thank you"]
+    assert service.translate_batch(texts, "ny") == ["Moni", "Zikomo", "", "Zikomo"]
+    assert backend.calls == [["Hello"], ["Thank you"]]
+
+
+def test_text_already_in_the_target_language_is_skipped():
+    backend = CountingBackend(source="en")
+    service = TranslationService(backend)
+    service.translate("Hello", "ny")
+    # The backend said "Hello" is English, so translating it to English needs no call
+    assert service.translate("Hello", "en") == "Hello"
+    assert service.translate("Thank you", "ny", source_lang="ny") == "Thank you"
+    assert len(backend.calls) == 1
+    assert service.get_stats()["skipped"] == 2
+
+
+def test_known_source_language_skips_the_backend_before_detection():
+    backend = CountingBackend()
+    service = TranslationService(backend)
+    assert service.translate_batch(["Hello", "Thank you"], "en", source_lang="EN-us") == ["Hello", "Thank you"]
+    assert service.translate("Hello", "en-GB", source_lang="en") == "Hello"
+    assert backend.calls == []
+    assert service.translate("Hello", "ny", source_lang="en") == "Moni"
+    assert backend.calls == [["Hello"]]
+
+
+def test_same_language():
+    assert same_language("en", "EN") and same_language("en_US", "en") and same_language("zh-CN", "zh-cn")
+    assert not same_language("zh-cn", "zh-tw")
+    assert not same_language("en", "ny") and not same_language(None, "en")
+
+
+def test_print_stream_translates_the_final_answer(capsys):
+    backend = CountingBackend()
+    service = TranslationService(backend)
+    states = [{"messages": [("user", "Hello")]}, {"messages": [("user", "Hello"), ("assistant", "Hello")]}]
+    print_stream(iter(states), service, "ny")
+    assert capsys.readouterr().out.splitlines() == ["('user', 'Hello')", "('assistant', 'Moni')"]
+    print_stream(iter(states), service, "en", source_lang="en")
+    assert len(backend.calls) == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    backend = CountingBackend()
+    service = TranslationService(backend, max_entries=1)
+    service.translate("Hello", "ny")
+    service.translate("Thank you", "ny")
+    service.translate("Hello", "ny")
+    assert len(backend.calls) == 3
+
+
+def test_googletrans_coroutines_share_one_event_loop(monkeypatch):
+    loops = []
+
+    class Result:
+        def __init__(self, text):
+            self.text, self.src = text.upper(), "en"
+
+    class Translator:
+        async def translate(self, texts, dest):
+            loops.append(asyncio.get_running_loop())
+            return [Result(text) for text in texts]
+
+    monkeypatch.setitem(sys.modules, "googletrans", types.SimpleNamespace(Translator=Translator))
+    backend = GoogletransBackend()
+    assert backend.translate_batch(["hi"], "ny") == [("HI", "en")]
+    # Called from another thread (and another running loop) it still uses the same loop
+    thread = threading.Thread(target=lambda: asyncio.run(asyncio.to_thread(backend.translate_batch, ["yo"], "ny")))
+    thread.start()
+    thread.join()
+    assert len(loops) == 2 and loops[0] is loops[1]
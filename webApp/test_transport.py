@@ -0,0 +1,153 @@
+import asyncio
+
+import httpx
+import pytest
+import tenacity
+
+import transport
+from transport import AsyncResilientTransport, CircuitBreaker, CircuitOpenError, ResilientTransport, Upstream
+
+
+class Script:
+    """MockTransport handler answering with the given status codes in turn (then 200)."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def __call__(self, request):
+        self.calls += 1
+        response = self.responses.pop(0) if self.responses else 200
+        if isinstance(response, int):
+            response = httpx.Response(response, json={"ok": response == 200})
+        return response
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Retry waits, recorded instead of slept."""
+    sleeps = []
+    monkeypatch.setattr(tenacity.nap.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def client_for(script, upstream=None):
+    upstream = upstream or Upstream("google_cse")
+    return httpx.Client(transport=ResilientTransport(upstream, lambda: httpx.MockTransport(script))), upstream
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    breaker._opened_at -= breaker.reset_timeout
+    assert breaker.state == "open"
+
+
+def test_one_probe_at_a_time_when_half_open():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.before_call() is False
+
+
+def test_probe_failing_with_an_unexpected_error_frees_the_next_probe():
+    def handler(request):
+        raise ValueError("bug in a hook")
+
+    upstream = Upstream("google_cse")
+    open_breaker(upstream.breaker)
+    client = httpx.Client(transport=ResilientTransport(upstream, lambda: httpx.MockTransport(handler)))
+    with pytest.raises(ValueError):
+        client.get("https://example.test/")
+    # Neither success nor failure was recorded, so the circuit stays half-open with a free probe slot
+    assert upstream.breaker.state == "half_open"
+    assert upstream.breaker.before_call() is True
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_retryable_status_is_retried(sleeps, status):
+    script = Script(status, status)
+    client, upstream = client_for(script)
+    assert client.get("https://example.test/").status_code == 200
+    assert script.calls == 3
+    stats = upstream.get_stats()
+    assert (stats["requests"], stats["attempts"], stats["retries"], stats["failures"]) == (1, 3, 2, 2)
+    assert len(sleeps) == 2
+
+
+def test_last_error_response_is_returned_after_the_last_attempt(sleeps):
+    script = Script(503, 503, 503, 503)
+    client, upstream = client_for(script)
+    assert client.get("https://example.test/").status_code == 503
+    assert script.calls == upstream.attempts == 3
+
+
+def test_client_errors_are_not_retried(sleeps):
+    script = Script(404)
+    client, _ = client_for(script)
+    assert client.get("https://example.test/").status_code == 404
+    assert script.calls == 1 and sleeps == []
+
+
+def test_retry_after_stretches_the_wait(monkeypatch, sleeps):
+    monkeypatch.setattr(transport, "RETRY_WAIT_MAX", 10.0)
+    script = Script(httpx.Response(429, headers={"Retry-After": "3"}))
+    client, _ = client_for(script)
+    assert client.get("https://example.test/").status_code == 200
+    assert sleeps == [3.0]
+
+
+def test_retry_after_is_capped(monkeypatch, sleeps):
+    monkeypatch.setattr(transport, "RETRY_WAIT_MAX", 2.0)
+    script = Script(httpx.Response(503, headers={"Retry-After": "120"}))
+    client, _ = client_for(script)
+    client.get("https://example.test/")
+    assert sleeps == [2.0]
+
+
+def test_breaker_opens_then_closes_after_a_good_probe(sleeps):
+    upstream = Upstream("google_cse")
+    upstream.breaker.failure_threshold = 3
+    script = Script(*[500] * 3)
+    client, _ = client_for(script, upstream)
+    assert client.get("https://example.test/").status_code == 500
+    assert upstream.breaker.state == "open"
+    # Open: no request reaches the upstream
+    with pytest.raises(CircuitOpenError):
+        client.get("https://example.test/")
+    assert script.calls == 3
+    assert upstream.get_stats()["short_circuits"] == 1
+
+    upstream.breaker._opened_at -= upstream.breaker.reset_timeout
+    assert client.get("https://example.test/").status_code == 200
+    assert upstream.breaker.state == "closed"
+    assert upstream.get_stats()["breaker_state"] == 0
+
+
+def test_failed_probe_reopens_the_breaker(sleeps):
+    upstream = Upstream("google_cse")
+    open_breaker(upstream.breaker)
+    script = Script(httpx.Response(500))
+    client = httpx.AsyncClient(transport=AsyncResilientTransport(upstream, lambda: httpx.MockTransport(script)))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client.get("https://example.test/"))
+    # The probe failed, so the retry found the circuit open again
+    assert script.calls == 1
+    assert upstream.breaker.state == "open"
+
+
+def test_after_fork_builds_new_clients_and_pools(monkeypatch):
+    monkeypatch.setattr(transport, "_clients", {})
+    monkeypatch.setattr(transport, "_transports", [])
+    monkeypatch.setattr(transport, "_inner_transports", {"google_cse": lambda: httpx.MockTransport(Script())})
+    before = transport.get_client("google_cse")
+    pool = transport._transports[0].inner
+    transport.after_fork()
+    assert transport.get_client("google_cse") is not before
+    # The client handed out before the fork has a new pool too
+    assert transport._transports[0].inner is not pool
+    assert before.get("https://example.test/").status_code == 200
@@ -0,0 +1,231 @@
+import functools
+import logging
+import os
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import trim_messages
+
+from languages import requested_language, system_messages
+
+logger = logging.getLogger(__name__)
+
+# Max tokens of a single tool result that reaches the model
+TOOL_OUTPUT_TOKEN_BUDGET = int(os.getenv("TOOL_OUTPUT_TOKEN_BUDGET", "600"))
+# Max tokens of conversation history (excluding the system prompt) sent per step
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def get_encoding(model="gpt-4"):
+    """tiktoken encoding for a model, or None when it can't be loaded (e.g. offline)."""
+    if model not in _encodings:
+        # Loaded once: concurrent first requests would each download it (and log the failure)
+        with _encodings_lock:
+            if model not in _encodings:
+                try:
+                    import tiktoken
+                    try:
+                        _encodings[model] = tiktoken.encoding_for_model(model)
+                    except KeyError:
+                        _encodings[model] = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    logger.warning(f"tiktoken unavailable, estimating token counts: {str(e)}")
+                    _encodings[model] = None
+    return _encodings[model]
+
+
+def count_tokens(text, model="gpt-4"):
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Roughly four characters per token for English text
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages, model="gpt-4"):
+    """Approximate prompt tokens for a list of messages (content + per-message overhead)."""
+    total = 0
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        total += count_tokens(content, model) + 4
+        for call in getattr(message, "tool_calls", None) or []:
+            total += count_tokens(f"{call['name']}{call['args']}", model)
+    return total + 2
+
+
+def truncate_to_tokens(text, max_tokens, model="gpt-4"):
+    """Cut text to at most max_tokens, preferring to stop at a line or sentence end."""
+    total = count_tokens(text, model)
+    if total <= max_tokens:
+        return text
+    encoding = get_encoding(model)
+    if encoding is None:
+        cut = text[:max_tokens * 4]
+    else:
+        cut = encoding.decode(encoding.encode(text)[:max_tokens])
+    boundary = max(cut.rfind("\n"), cut.rfind(". "))
+    if boundary > len(cut) // 2:
+        cut = cut[:boundary + 1]
+    return f"{cut.rstrip()}\n[... truncated, {total - count_tokens(cut, model)} more tokens]"
+
+
+def _limit_output(output, max_tokens):
+    # content_and_artifact tools return (content, artifact); only content reaches the model
+    if isinstance(output, tuple):
+        return (truncate_to_tokens(output[0], max_tokens),) + output[1:]
+    return truncate_to_tokens(output, max_tokens)
+
+
+def limit_tool_output(tool, max_tokens=TOOL_OUTPUT_TOKEN_BUDGET):
+    """Wrap a tool's sync and async functions so their output fits the budget."""
+    if tool.func is not None:
+        func = tool.func
+
+        @functools.wraps(func)
+        def limited(*args, **kwargs):
+            return _limit_output(func(*args, **kwargs), max_tokens)
+
+        tool.func = limited
+    if tool.coroutine is not None:
+        coroutine = tool.coroutine
+
+        @functools.wraps(coroutine)
+        async def alimited(*args, **kwargs):
+            return _limit_output(await coroutine(*args, **kwargs), max_tokens)
+
+        tool.coroutine = alimited
+    return tool
+
+
+def make_prompt(system_prompt, max_tokens=HISTORY_TOKEN_BUDGET):
+    """create_react_agent prompt that keeps only the most recent history within budget.
+
+    The system prompt and the current turn (latest user message onwards) are
+    always sent; earlier turns are dropped oldest first, whole, so tool calls
+    are never separated from their results. The system prompt follows the
+    request's reply language (languages.set_language).
+    """
+    system_by_language = system_messages(system_prompt)
+
+    def prompt(state, config):
+        system_message = system_by_language.get(requested_language(config), system_by_language[None])
+        messages = state["messages"]
+        last_human = max((i for i, m in enumerate(messages) if m.type == "human"), default=0)
+        current = messages[last_human:]
+        budget = max_tokens - count_message_tokens(current)
+        earlier = []
+        if last_human and budget > 0:
+            earlier = trim_messages(
+                messages[:last_human],
+                max_tokens=budget,
+                token_counter=count_message_tokens,
+                strategy="last",
+                start_on="human",
+                allow_partial=False,
+            )
+        return [system_message] + earlier + current
+
+    return prompt
+
+
+class TokenUsageTracker(BaseCallbackHandler):
+    """Per-request token accounting, passed in config["callbacks"].
+
+    Prompt/completion tokens come from the provider's usage data when present
+    and are counted locally with tiktoken otherwise. Steps run by a tiered
+    model (model_tiers.py) are also totalled per tier, with their latency.
+    """
+
+    def __init__(self, model="gpt-4"):
+        self.model = model
+        self.steps = []
+        self.tools = {}
+        self._prompt_estimates = {}
+        self._started = {}
+        self._tool_names = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, **kwargs):
+        tier = next((tag[len("tier:"):] for tag in tags or () if tag.startswith("tier:")), None)
+        with self._lock:
+            self._prompt_estimates[run_id] = count_message_tokens(messages[0], self.model)
+            self._started[run_id] = (time.perf_counter(), tier)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        message = getattr(response.generations[0][0], "message", None)
+        usage = getattr(message, "usage_metadata", None) or {}
+        with self._lock:
+            # The estimate is dropped either way; it only stands in when the provider reports nothing
+            estimate = self._prompt_estimates.pop(run_id, 0)
+            prompt_tokens = usage.get("input_tokens") or estimate
+            completion_tokens = usage.get("output_tokens")
+            if completion_tokens is None:
+                completion_tokens = count_message_tokens([message], self.model) if message else 0
+            started, tier = self._started.pop(run_id, (None, None))
+            step = {
+                "step": len(self.steps) + 1,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens
+            }
+            if tier is not None:
+                step["tier"] = tier
+                step["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self.steps.append(step)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._prompt_estimates.pop(run_id, None)
+            self._started.pop(run_id, None)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        with self._lock:
+            self._tool_names[run_id] = (serialized or {}).get("name") or kwargs.get("name", "tool")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        content = getattr(output, "content", output)
+        tokens = count_tokens(content if isinstance(content, str) else str(content), self.model)
+        with self._lock:
+            name = self._tool_names.pop(run_id, "tool")
+            entry = self.tools.setdefault(name, {"calls": 0, "output_tokens": 0})
+            entry["calls"] += 1
+            entry["output_tokens"] += tokens
+
+    def summary(self):
+        with self._lock:
+            steps = [dict(step) for step in self.steps]
+            tools = {name: dict(entry) for name, entry in self.tools.items()}
+        prompt_tokens = sum(step["prompt_tokens"] for step in steps)
+        completion_tokens = sum(step["completion_tokens"] for step in steps)
+        summary = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "steps": steps,
+            "tools": tools
+        }
+        tiers = {}
+        for step in steps:
+            if "tier" in step:
+                entry = tiers.setdefault(step["tier"], {"steps": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_ms": 0.0})
+                entry["steps"] += 1
+                entry["prompt_tokens"] += step["prompt_tokens"]
+                entry["completion_tokens"] += step["completion_tokens"]
+                entry["latency_ms"] += step["latency_ms"]
+        if tiers:
+            summary["tiers"] = tiers
+        return summary
+
+    def report(self):
+        """Log the summary and return it."""
+        summary = self.summary()
+        logger.info(
+            f"Token usage: prompt={summary['prompt_tokens']} completion={summary['completion_tokens']}"
+            f" steps={len(summary['steps'])} tools={summary['tools']}"
+            + (f" tiers={summary['tiers']}" if "tiers" in summary else "")
+        )
+        return summary
@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from metrics import span
+
+
+class GoogletransBackend:
+    """Translate through googletrans. One call handles a whole batch.
+
+    googletrans 4.x is async and its Translator keeps one httpx.AsyncClient,
+    which must stay on the event loop it was first used on. Its coroutines
+    therefore all run on one dedicated loop thread rather than a new
+    asyncio.run() loop per call.
+    """
+
+    def __init__(self):
+        from googletrans import Translator
+        self.translator = Translator()
+        self._loop = None
+        self._loop_pid = None
+        self._loop_lock = threading.Lock()
+
+    def _run(self, coroutine):
+        with self._loop_lock:
+            # The loop thread does not survive a fork; start a new one in the child
+            if self._loop is None or self._loop_pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._loop_pid = os.getpid()
+                threading.Thread(target=self._loop.run_forever, name="googletrans", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def translate_batch(self, texts, target_lang):
+        """Return [(translated_text, detected_source_lang), ...] for texts."""
+        results = self.translator.translate(texts, dest=target_lang)
+        # googletrans 4.x made translate() a coroutine; older releases are sync
+        if inspect.isawaitable(results):
+            results = self._run(results)
+        return [(result.text, result.src) for result in results]
+
+
+class PhraseTableBackend:
+    """Offline backend: exact phrase lookups from a {lang: {text: translation}} table.
+
+    Unknown phrases come back unchanged, so it never needs network access.
+    """
+
+    def __init__(self, table=None, path=None):
+        self.table = {}
+        if path:
+            with open(path, encoding="utf-8") as f:
+                table = json.load(f)
+        for lang, phrases in (table or {}).items():
+            self.table[lang] = {key.strip().lower(): value for key, value in phrases.items()}
+
+    def translate_batch(self, texts, target_lang):
+        phrases = self.table.get(target_lang, {})
+        return [(phrases.get(text.strip().lower(), text), None) for text in texts]
+
+
+def same_language(source_lang, target_lang):
+    """True if text in source_lang needs no translation into target_lang ("EN", "en-US" and "en" match)."""
+    if not source_lang or not target_lang:
+        return False
+    source, target = (lang.strip().lower().replace("_", "-") for lang in (source_lang, target_lang))
+    if source == target:
+        return True
+    # A bare code matches any region of it; two different regions (zh-cn, zh-tw) do not
+    return ("-" not in source or "-" not in target) and source.split("-")[0] == target.split("-")[0]
+
+
+def make_backend(name=None):
+    name = name or os.getenv("TRANSLATION_BACKEND", "googletrans")
+    if name == "phrases":
+        return PhraseTableBackend(path=os.getenv("TRANSLATION_PHRASES_PATH"))
+    return GoogletransBackend()
+
+
+class TranslationService:
+    """Memoized, batched translation in front of a pluggable backend.
+
+    Results are kept in an LRU keyed by (text hash, target language). Text
+    whose source language is already known to be the target's, because the
+    caller passed source_lang or the backend reported it for that text
+    earlier, is returned as is without a backend call.
+    """
+
+    def __init__(self, backend=None, max_entries=2048):
+        self._backend = backend
+        self.max_entries = max_entries
+        self._memo = OrderedDict()
+        self._source_lang = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "skipped": 0, "backend_calls": 0}
+
+    @property
+    def backend(self):
+        # Built on the first cache miss; importing googletrans is not free
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = make_backend()
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend):
+        self._backend = backend
+
+    @staticmethod
+    def _hash(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _remember(self, store, key, value):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def _lookup(self, text, target_lang, source_lang):
+        digest = self._hash(text)
+        if not text.strip() or same_language(source_lang or self._source_lang.get(digest), target_lang):
+            self.stats["skipped"] += 1
+            return text
+        cached = self._memo.get((digest, target_lang))
+        if cached is not None:
+            self._memo.move_to_end((digest, target_lang))
+            self.stats["hits"] += 1
+        return cached
+
+    def translate_batch(self, texts, target_lang, source_lang=None):
+        """Translate many segments with at most one backend call.
+
+        Pass source_lang when the texts' language is known (e.g. the reply
+        language the user asked for) so a same-language request skips the backend.
+        """
+        translated = [None] * len(texts)
+        missing = OrderedDict()
+        with self._lock:
+            for index, text in enumerate(texts):
+                translated[index] = self._lookup(text, target_lang, source_lang)
+                if translated[index] is None:
+                    missing.setdefault(text, []).append(index)
+
+        if missing:
+            with span("translation", type(self.backend).__name__, segments=len(missing), target_lang=target_lang):
+                results = self.backend.translate_batch(list(missing), target_lang)
+            with self._lock:
+                self.stats["backend_calls"] += 1
+                self.stats["misses"] += len(missing)
+                for (text, indexes), (result, detected) in zip(missing.items(), results):
+                    digest = self._hash(text)
+                    self._remember(self._memo, (digest, target_lang), result)
+                    if detected:
+                        self._remember(self._source_lang, digest, detected)
+                    for index in indexes:
+                        translated[index] = result
+        return translated
+
+    def translate(self, text, target_lang, source_lang=None):
+        return self.translate_batch([text], target_lang, source_lang)[0]
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, size=len(self._memo))
+
+
+def print_stream(stream, translator, target_lang='en', translate_all=False, source_lang=None):
+    """Print a graph's stream_mode="values" states with the answer in target_lang.
+
+    Only the final assistant message is translated unless translate_all is
+    set; either way the turn's segments go to the translator as one batch.
+    """
+    segments = []
+    for s in stream:
+        message = s["messages"][-1]
+        if isinstance(message, tuple):
+            segments.append((message[0], message[1]))
+        else:
+            segments.append((None, message.content))
+        if not translate_all:
+            # Intermediate states are printed as they arrive, untranslated
+            if len(segments) > 1:
+                _print_segment(*segments[-2])
+
+    if not segments:
+        return
+    if translate_all:
+        texts = translator.translate_batch([text for _, text in segments], target_lang, source_lang)
+        for (role, _), text in zip(segments, texts):
+            _print_segment(role, text)
+    else:
+        role, text = segments[-1]
+        _print_segment(role, translator.translate(text, target_lang, source_lang))
+
+
+def _print_segment(role, text):
+    print((role, text) if role else text)
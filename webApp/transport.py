@@ -0,0 +1,368 @@
+"""Shared HTTP transport for the upstream APIs (OpenAI, Google Custom Search).
+
+One pooled keep-alive httpx client per upstream and process, with per-upstream
+timeouts, jittered retries on retryable errors and a circuit breaker that
+fails fast while the upstream is unhealthy.
+
+    client = get_client("google_cse")            # httpx.Client
+    client = get_async_client("openai")          # httpx.AsyncClient
+    get_stats("openai")                          # reuse, retries, breaker state
+"""
+import email.utils
+import logging
+import os
+import threading
+import time
+
+import httpx
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+logger = logging.getLogger(__name__)
+
+# Per-upstream policy; timeouts are seconds, UPSTREAM_<NAME>_<SETTING> overrides any of them
+UPSTREAMS = {
+    "openai": {
+        "timeout": 60.0, "connect_timeout": 5.0, "max_connections": 100, "max_keepalive": 20,
+        "attempts": 3, "failure_threshold": 5, "reset_timeout": 30.0,
+    },
+    "google_cse": {
+        "timeout": 10.0, "connect_timeout": 3.0, "max_connections": 200, "max_keepalive": 20,
+        "attempts": 3, "failure_threshold": 5, "reset_timeout": 30.0,
+    },
+}
+KEEPALIVE_EXPIRY = 30.0
+RETRY_WAIT_MAX = float(os.getenv("UPSTREAM_RETRY_WAIT_MAX", "4"))
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def setting(name, key):
+    default = UPSTREAMS[name][key]
+    value = os.getenv(f"UPSTREAM_{name.upper()}_{key.upper()}")
+    return type(default)(value) if value is not None else default
+
+
+def timeout_for(name):
+    return httpx.Timeout(setting(name, "timeout"), connect=setting(name, "connect_timeout"))
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; after `reset_timeout`
+    seconds one probe request is let through (half-open) and its outcome closes
+    or re-opens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "short_circuits": 0}
+
+    def before_call(self):
+        """Raise CircuitOpenError unless the call may go ahead; True if it is the half-open probe."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "closed" or (self.state == "half_open" and not self._probing):
+                self._probing = self.state == "half_open"
+                return self._probing
+            self.stats["short_circuits"] += 1
+        raise CircuitOpenError(f"{self.name} is unavailable (circuit open); try again shortly")
+
+    def end_probe(self):
+        # Called when the probe returns, whatever happened: one that ended without a
+        # recorded outcome (cancelled, unexpected error) must not block the next probe
+        with self._lock:
+            if self.state == "half_open":
+                self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.stats["opened"] += 1
+                    logger.warning(f"Circuit for {self.name} opened after {self._failures} failures")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class _RetryableResponse(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def is_retryable(error):
+    if isinstance(error, CircuitOpenError):
+        return False
+    return isinstance(error, (_RetryableResponse, httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+
+def _retry_after(error):
+    # Honour Retry-After (seconds or an HTTP date) on 429/503 responses
+    if not isinstance(error, _RetryableResponse):
+        return 0.0
+    value = error.response.headers.get("retry-after")
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else 0.0
+
+
+class Upstream:
+    """Policy, breaker and counters shared by the sync and async transports of one upstream."""
+
+    def __init__(self, name):
+        self.name = name
+        self.attempts = setting(name, "attempts")
+        self.breaker = CircuitBreaker(name, setting(name, "failure_threshold"), setting(name, "reset_timeout"))
+        self._jitter = wait_random_exponential(multiplier=0.25, max=RETRY_WAIT_MAX)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "attempts": 0, "retries": 0, "failures": 0, "connections_opened": 0}
+
+    def count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def retry_options(self):
+        return dict(
+            stop=stop_after_attempt(self.attempts),
+            wait=self._wait,
+            retry=retry_if_exception(is_retryable),
+            before_sleep=self._before_sleep,
+            reraise=True,
+        )
+
+    def _wait(self, retry_state):
+        # Full jitter, stretched to the server's Retry-After when it asks for longer
+        retry_after = _retry_after(retry_state.outcome.exception())
+        return min(max(self._jitter(retry_state), retry_after), RETRY_WAIT_MAX)
+
+    def _before_sleep(self, retry_state):
+        self.count("retries")
+        logger.info(f"Retrying {self.name} after {retry_state.outcome.exception()!r} "
+                    f"(attempt {retry_state.attempt_number} of {self.attempts})")
+
+    def check(self, response):
+        """Classify a response: raises _RetryableResponse for 429/5xx, else records success."""
+        if response.status_code in RETRYABLE_STATUS:
+            self.count("failures")
+            self.breaker.record_failure()
+            raise _RetryableResponse(response)
+        self.breaker.record_success()
+        return response
+
+    def failed(self):
+        self.count("failures")
+        self.breaker.record_failure()
+
+    def trace(self, event, info):
+        # httpcore trace hook: a TCP connect means the pool had no idle connection
+        if event == "connection.connect_tcp.complete":
+            self.count("connections_opened")
+
+    async def atrace(self, event, info):
+        self.trace(event, info)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["connections_reused"] = max(0, stats["attempts"] - stats["connections_opened"])
+        stats.update(self.breaker.stats)
+        stats["breaker_state"] = BREAKER_STATES[self.breaker.state]
+        return stats
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """Retries and circuit breaking around a pooled httpx.HTTPTransport."""
+
+    def __init__(self, upstream, make_inner):
+        self.upstream = upstream
+        self.make_inner = make_inner
+        self.inner = make_inner()
+
+    def reset(self):
+        """Start a new connection pool; the old one is dropped without closing its sockets."""
+        self.inner = self.make_inner()
+
+    def handle_request(self, request):
+        upstream = self.upstream
+        upstream.count("requests")
+        request.extensions = dict(request.extensions, trace=upstream.trace)
+        try:
+            for attempt in Retrying(**upstream.retry_options()):
+                with attempt:
+                    probe = upstream.breaker.before_call()
+                    try:
+                        upstream.count("attempts")
+                        try:
+                            response = self.inner.handle_request(request)
+                        except httpx.TransportError:
+                            upstream.failed()
+                            raise
+                        try:
+                            return upstream.check(response)
+                        except _RetryableResponse:
+                            response.read()
+                            raise
+                    finally:
+                        if probe:
+                            upstream.breaker.end_probe()
+        except _RetryableResponse as error:
+            # Out of attempts: hand the last error response to the caller as-is
+            return error.response
+
+    def close(self):
+        self.inner.close()
+
+
+class AsyncResilientTransport(httpx.AsyncBaseTransport):
+    def __init__(self, upstream, make_inner):
+        self.upstream = upstream
+        self.make_inner = make_inner
+        self.inner = make_inner()
+
+    def reset(self):
+        self.inner = self.make_inner()
+
+    async def handle_async_request(self, request):
+        upstream = self.upstream
+        upstream.count("requests")
+        request.extensions = dict(request.extensions, trace=upstream.atrace)
+        try:
+            async for attempt in AsyncRetrying(**upstream.retry_options()):
+                with attempt:
+                    probe = upstream.breaker.before_call()
+                    try:
+                        upstream.count("attempts")
+                        try:
+                            response = await self.inner.handle_async_request(request)
+                        except httpx.TransportError:
+                            upstream.failed()
+                            raise
+                        try:
+                            return upstream.check(response)
+                        except _RetryableResponse:
+                            await response.aread()
+                            raise
+                    finally:
+                        if probe:
+                            upstream.breaker.end_probe()
+        except _RetryableResponse as error:
+            return error.response
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+_upstreams = {}
+_clients = {}
+# Every resilient transport built in this process, for after_fork()
+_transports = []
+_inner_transports = {}
+_lock = threading.Lock()
+
+
+def get_upstream(name):
+    with _lock:
+        if name not in _upstreams:
+            _upstreams[name] = Upstream(name)
+        return _upstreams[name]
+
+
+def use_transport(name, transport):
+    """Send an upstream's requests through `transport` (e.g. httpx.MockTransport in load tests).
+
+    Must be called before the upstream's first client is created.
+    """
+    _inner_transports[name] = lambda: transport
+
+
+def _limits(name):
+    return httpx.Limits(max_connections=setting(name, "max_connections"),
+                        max_keepalive_connections=setting(name, "max_keepalive"),
+                        keepalive_expiry=KEEPALIVE_EXPIRY)
+
+
+def get_client(name):
+    """The process-wide pooled httpx.Client for an upstream."""
+    key = (name, "sync")
+    client = _clients.get(key)
+    if client is None:
+        upstream = get_upstream(name)
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                make_inner = _inner_transports.get(name) or (lambda: httpx.HTTPTransport(limits=_limits(name)))
+                resilient = ResilientTransport(upstream, make_inner)
+                _transports.append(resilient)
+                client = httpx.Client(transport=resilient, timeout=timeout_for(name))
+                _clients[key] = client
+    return client
+
+
+def get_async_client(name):
+    """The process-wide pooled httpx.AsyncClient for an upstream."""
+    key = (name, "async")
+    client = _clients.get(key)
+    if client is None:
+        upstream = get_upstream(name)
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                make_inner = _inner_transports.get(name) or (lambda: httpx.AsyncHTTPTransport(limits=_limits(name)))
+                resilient = AsyncResilientTransport(upstream, make_inner)
+                _transports.append(resilient)
+                client = httpx.AsyncClient(transport=resilient, timeout=timeout_for(name))
+                _clients[key] = client
+    return client
+
+
+def get_stats(name):
+    return get_upstream(name).get_stats()
+
+
+def after_fork():
+    """Give a forked worker its own connections.
+
+    Pooled sockets belong to the parent, so get_client()/get_async_client()
+    build new clients from here on. Clients handed out before the fork (the
+    chat models hold theirs) keep working: each transport built in the parent
+    starts a fresh pool. The parent's pools are not closed.
+    """
+    with _lock:
+        _clients.clear()
+        for resilient in _transports:
+            resilient.reset()
+
+
+async def aclose_clients():
+    with _lock:
+        clients = list(_clients.items())
+        _clients.clear()
+    for (_, kind), client in clients:
+        if kind == "async":
+            await client.aclose()
+        else:
+            client.close()
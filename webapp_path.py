@@ -0,0 +1,13 @@
+"""Puts webApp/ on the import path.
+
+The agents and servers in the repository root share the web apps' modules
+(clients, languages, the catalog, ...). They import this module first instead
+of each editing sys.path.
+"""
+import os
+import sys
+
+WEBAPP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "webApp")
+
+if WEBAPP_DIR not in sys.path:
+    sys.path.append(WEBAPP_DIR)